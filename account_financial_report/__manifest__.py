@@ -6,7 +6,7 @@
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 {
     "name": "Account Financial Reports",
-    "version": "18.0.1.4.1",
+    "version": "18.0.1.5.0",
     "category": "Reporting",
     "summary": "OCA Financial Reports",
     "author": "Camptocamp,"
@@ -19,6 +19,7 @@
     "data": [
         "security/ir.model.access.csv",
         "security/security.xml",
+        "data/ir_cron.xml",
         "wizard/aged_partner_balance_wizard_view.xml",
         "wizard/general_ledger_wizard_view.xml",
         "wizard/journal_ledger_wizard_view.xml",
@@ -26,6 +27,7 @@
         "wizard/trial_balance_wizard_view.xml",
         "wizard/vat_report_wizard_view.xml",
         "view/account_age_report_configuration_views.xml",
+        "view/account_financial_report_job_views.xml",
         "menuitems.xml",
         "reports.xml",
         "report/templates/layouts.xml",
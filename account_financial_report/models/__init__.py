@@ -1,6 +1,10 @@
 from . import account_age_report_configuration
+from . import account_balance_snapshot
+from . import account_financial_report_job
 from . import account_group
 from . import account
+from . import account_move
 from . import account_move_line
 from . import ir_actions_report
+from . import res_company
 from . import res_config_settings
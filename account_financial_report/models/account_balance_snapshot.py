@@ -0,0 +1,332 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import datetime
+from collections import defaultdict
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+
+class AccountBalanceSnapshot(models.Model):
+    """Monthly sums of the posted move lines, by company, account, partner
+    and currency, for the months covered by the lock dates of the company.
+
+    The reports add up these sums instead of the move lines for the whole
+    months of the dates they cover, and only read the move lines for the
+    remaining days. A company is snapshotted up to its
+    ``balance_snapshot_date``: the cron extends it up to the lock date, a
+    lock date moved back shrinks it at once, and the moves posted or reset to
+    draft before it refresh the months they touch."""
+
+    _name = "account.balance.snapshot"
+    _description = "Account Balance Snapshot"
+    _log_access = False
+
+    company_id = fields.Many2one(
+        "res.company", required=True, readonly=True, ondelete="cascade"
+    )
+    account_id = fields.Many2one(
+        "account.account", required=True, readonly=True, ondelete="cascade"
+    )
+    partner_id = fields.Many2one("res.partner", readonly=True, ondelete="cascade")
+    currency_id = fields.Many2one("res.currency", readonly=True)
+    period = fields.Date(
+        required=True, readonly=True, help="First day of the month summed."
+    )
+    debit = fields.Float(readonly=True)
+    credit = fields.Float(readonly=True)
+    balance = fields.Float(readonly=True)
+    amount_currency = fields.Float(readonly=True)
+
+    def init(self):
+        self._cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS account_balance_snapshot_company_period_index
+            ON account_balance_snapshot (company_id, period, account_id)
+            """
+        )
+
+    @api.model
+    def _get_snapshot_limit(self, company):
+        """Return the first day of the month following the last month fully
+        locked for ``company``, False when nothing is locked."""
+        lock_dates = [
+            lock_date
+            for lock_date in [company.fiscalyear_lock_date, company.hard_lock_date]
+            if lock_date
+        ]
+        if not lock_dates:
+            return False
+        return (max(lock_dates) + relativedelta(days=1)).replace(day=1)
+
+    @api.model
+    def _insert_sums(self, company, condition):
+        self.env.cr.execute(
+            SQL(
+                """
+                INSERT INTO account_balance_snapshot (
+                    company_id, account_id, partner_id, currency_id, period,
+                    debit, credit, balance, amount_currency
+                )
+                SELECT aml.company_id, aml.account_id, aml.partner_id,
+                    aml.currency_id, date_trunc('month', aml.date)::date,
+                    SUM(aml.debit), SUM(aml.credit), SUM(aml.balance),
+                    SUM(aml.amount_currency)
+                FROM account_move_line aml
+                WHERE aml.company_id = %s
+                    AND aml.parent_state = 'posted'
+                    AND aml.account_id IS NOT NULL
+                    AND %s
+                GROUP BY aml.company_id, aml.account_id, aml.partner_id,
+                    aml.currency_id, date_trunc('month', aml.date)
+                """,
+                company.id,
+                condition,
+            )
+        )
+
+    @api.model
+    def _refresh_company(self, company, extend=True):
+        """Align the snapshot of ``company`` on its lock dates: the months no
+        longer locked are dropped and, if ``extend``, the newly locked months
+        are summed."""
+        self.env.flush_all()
+        current = company.balance_snapshot_date
+        limit = self._get_snapshot_limit(company)
+        if current and (not limit or limit < current):
+            self.env.cr.execute(
+                SQL(
+                    "DELETE FROM account_balance_snapshot "
+                    "WHERE company_id = %s AND period >= %s",
+                    company.id,
+                    limit or datetime.date.min,
+                )
+            )
+            current = limit
+        elif extend and limit and (not current or limit > current):
+            condition = SQL("aml.date < %s", limit)
+            if current:
+                condition = SQL("%s AND aml.date >= %s", condition, current)
+            self._insert_sums(company, condition)
+            current = limit
+        if current != company.balance_snapshot_date:
+            company.sudo().balance_snapshot_date = current
+
+    @api.model
+    def _refresh_move_lines(self, move_lines):
+        """Sum again the snapshotted months of ``move_lines``, whose moves were
+        just posted or reset to draft."""
+        to_refresh = defaultdict(lambda: (set(), set()))
+        for line in move_lines.sudo():
+            limit = line.company_id.balance_snapshot_date
+            if line.account_id and limit and line.date < limit:
+                account_ids, periods = to_refresh[line.company_id]
+                account_ids.add(line.account_id.id)
+                periods.add(line.date.replace(day=1))
+        if not to_refresh:
+            return
+        self.env.flush_all()
+        for company, (account_ids, periods) in to_refresh.items():
+            self.env.cr.execute(
+                SQL(
+                    """
+                    DELETE FROM account_balance_snapshot
+                    WHERE company_id = %s AND account_id = ANY(%s)
+                        AND period = ANY(%s)
+                    """,
+                    company.id,
+                    list(account_ids),
+                    list(periods),
+                )
+            )
+            self._insert_sums(
+                company,
+                SQL(
+                    "aml.account_id = ANY(%s) "
+                    "AND date_trunc('month', aml.date)::date = ANY(%s)",
+                    list(account_ids),
+                    list(periods),
+                ),
+            )
+
+    @api.model
+    def _cron_refresh(self):
+        for company in self.env["res.company"].search([]):
+            self._refresh_company(company)
+
+    @api.model
+    def _parse_domain(self, domain):
+        """Return the company, accounts, partners and dates filtered by
+        ``domain`` on the move lines, or None if it filters on anything the
+        snapshot does not know."""
+        res = {
+            "company_id": False,
+            "account_ids": None,
+            "partner_ids": None,
+            "date_from": None,
+            "date_to": None,
+        }
+        posted = False
+        accounts_domain = []
+        for leaf in domain:
+            if not isinstance(leaf, (list, tuple)) or len(leaf) != 3:
+                return None
+            name, operator, value = leaf
+            if name == "company_id" and operator in ("=", "in"):
+                company_ids = [value] if operator == "=" else list(value)
+                if len(company_ids) != 1 or res["company_id"] not in (
+                    False,
+                    company_ids[0],
+                ):
+                    return None
+                res["company_id"] = company_ids[0]
+            elif name == "account_id" and operator == "in":
+                accounts_domain.append(("id", "in", list(value)))
+            elif name in ("account_type", "account_id.account_type") and operator in (
+                "in",
+                "not in",
+            ):
+                accounts_domain.append(("account_type", operator, list(value)))
+            elif name == "partner_id" and operator == "in":
+                partner_ids = set(value)
+                if res["partner_ids"] is not None:
+                    partner_ids &= set(res["partner_ids"])
+                res["partner_ids"] = list(partner_ids)
+            elif name in ("move_id.state", "parent_state") and (operator, value) == (
+                "=",
+                "posted",
+            ):
+                posted = True
+            elif (
+                name == "display_type"
+                and operator == "not in"
+                and set(value) <= {"line_note", "line_section"}
+            ):
+                # notes and sections have no account
+                continue
+            elif name == "date" and operator in ("<", "<=", ">", ">="):
+                date = fields.Date.to_date(value)
+                if operator in ("<=", ">"):
+                    date += relativedelta(days=1)
+                if operator in ("<", "<="):
+                    res["date_to"] = min(res["date_to"] or date, date)
+                else:
+                    res["date_from"] = max(res["date_from"] or date, date)
+            else:
+                return None
+        if not posted or not res["company_id"]:
+            return None
+        if accounts_domain:
+            res["account_ids"] = (
+                self.env["account.account"]
+                .with_context(active_test=False)
+                .search(accounts_domain)
+                .ids
+            )
+        return res
+
+    @api.model
+    def _get_domain_sums(self, domain, group_partner=False):
+        """Sum the debit, credit, balance and amount in currency of the move
+        lines matching ``domain``, per account and, if ``group_partner``, per
+        account and partner, using the snapshot for the whole months it
+        covers. Return ``{(account_id, partner_id): sums}``, where the partner
+        is None on the sums per account and 0 for the lines without partner,
+        or None if the snapshot can't serve ``domain``."""
+        args = self._parse_domain(domain)
+        if args is None:
+            return None
+        company = self.env["res.company"].browse(args["company_id"])
+        date_from, date_to = args["date_from"], args["date_to"]
+        snapshot_to = company.balance_snapshot_date
+        if date_to and snapshot_to:
+            snapshot_to = min(snapshot_to, date_to.replace(day=1))
+        snapshot_from = date_from
+        if date_from and date_from.day != 1:
+            snapshot_from = date_from.replace(day=1) + relativedelta(months=1)
+        if not snapshot_to or (snapshot_from and snapshot_from >= snapshot_to):
+            return None
+        snapshot_conditions = [
+            SQL("snapshot.company_id = %s", company.id),
+            SQL("snapshot.period < %s", snapshot_to),
+        ]
+        line_conditions = [
+            SQL("aml.company_id = %s", company.id),
+            SQL("aml.parent_state = 'posted'"),
+        ]
+        if snapshot_from:
+            snapshot_conditions.append(SQL("snapshot.period >= %s", snapshot_from))
+        for column, ids in [
+            ("account_id", args["account_ids"]),
+            ("partner_id", args["partner_ids"]),
+        ]:
+            if ids is not None:
+                snapshot_conditions.append(
+                    SQL("%s = ANY(%s)", SQL.identifier("snapshot", column), ids)
+                )
+                line_conditions.append(
+                    SQL("%s = ANY(%s)", SQL.identifier("aml", column), ids)
+                )
+        # the days out of the snapshot are read from the move lines
+        date_conditions = []
+        if snapshot_from and snapshot_from != date_from:
+            date_conditions.append(
+                SQL("(aml.date >= %s AND aml.date < %s)", date_from, snapshot_from)
+            )
+        if date_to:
+            if date_to > snapshot_to:
+                date_conditions.append(
+                    SQL("(aml.date >= %s AND aml.date < %s)", snapshot_to, date_to)
+                )
+        else:
+            date_conditions.append(SQL("aml.date >= %s", snapshot_to))
+        line_conditions.append(
+            SQL("(%s)", SQL(" OR ").join(date_conditions))
+            if date_conditions
+            else SQL("FALSE")
+        )
+        grouping_sets = [SQL("(sums.account_id)")]
+        # GROUPING() only takes the expressions of the grouping sets
+        partner = SQL("NULL::int")
+        if group_partner:
+            grouping_sets.append(SQL("(sums.account_id, sums.partner_id)"))
+            partner = SQL(
+                "CASE WHEN GROUPING(sums.partner_id) = 0 THEN sums.partner_id END"
+            )
+        self.env.flush_all()
+        self.env.cr.execute(
+            SQL(
+                """
+                WITH sums AS (
+                    SELECT snapshot.account_id,
+                        COALESCE(snapshot.partner_id, 0) AS partner_id,
+                        snapshot.debit, snapshot.credit, snapshot.balance,
+                        snapshot.amount_currency
+                    FROM account_balance_snapshot snapshot
+                    WHERE %(snapshot_conditions)s
+                    UNION ALL
+                    SELECT aml.account_id, COALESCE(aml.partner_id, 0),
+                        aml.debit, aml.credit, aml.balance, aml.amount_currency
+                    FROM account_move_line aml
+                    WHERE %(line_conditions)s
+                )
+                SELECT sums.account_id, %(partner)s AS partner_id,
+                    SUM(sums.debit) AS debit, SUM(sums.credit) AS credit,
+                    SUM(sums.balance) AS balance,
+                    SUM(sums.amount_currency) AS amount_currency
+                FROM sums
+                WHERE sums.account_id IS NOT NULL
+                GROUP BY GROUPING SETS (%(grouping_sets)s)
+                """,
+                snapshot_conditions=SQL(" AND ").join(snapshot_conditions),
+                line_conditions=SQL(" AND ").join(line_conditions),
+                partner=partner,
+                grouping_sets=SQL(", ").join(grouping_sets),
+            )
+        )
+        return {
+            (row["account_id"], row["partner_id"]): row
+            for row in self.env.cr.dictfetchall()
+        }
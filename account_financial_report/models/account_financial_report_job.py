@@ -0,0 +1,268 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+import base64
+import hashlib
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from odoo import _, api, fields, models
+from odoo.tools import SQL, config
+
+_logger = logging.getLogger(__name__)
+
+
+class AccountFinancialReportJob(models.Model):
+    """A report export queued from a report wizard and rendered by a cron,
+    out of the HTTP workers. The file is kept as an attachment of the job and
+    served again for an identical export, as long as the move lines of the
+    company did not change."""
+
+    _name = "account.financial.report.job"
+    _description = "Account Financial Report Job"
+    _order = "id desc"
+
+    name = fields.Char(required=True, readonly=True)
+    state = fields.Selection(
+        [
+            ("queued", "Queued"),
+            ("running", "Running"),
+            ("done", "Done"),
+            ("failed", "Failed"),
+        ],
+        default="queued",
+        required=True,
+        readonly=True,
+    )
+    user_id = fields.Many2one(
+        "res.users",
+        required=True,
+        readonly=True,
+        default=lambda self: self.env.user,
+        ondelete="cascade",
+    )
+    company_id = fields.Many2one(
+        "res.company",
+        required=True,
+        readonly=True,
+        default=lambda self: self.env.company,
+        ondelete="cascade",
+    )
+    report_id = fields.Many2one(
+        "ir.actions.report", required=True, readonly=True, ondelete="cascade"
+    )
+    report_type = fields.Selection(related="report_id.report_type")
+    data = fields.Json(readonly=True)
+    # the wizard of the export, a transient record possibly vacuumed before
+    # the job runs, is created again from its values
+    wizard_model = fields.Char(readonly=True)
+    wizard_values = fields.Json(readonly=True)
+    cache_key = fields.Char(readonly=True, index=True, copy=False)
+    attachment_id = fields.Many2one("ir.attachment", readonly=True, copy=False)
+    date_start = fields.Datetime(readonly=True, copy=False)
+    date_done = fields.Datetime(readonly=True, copy=False)
+    error = fields.Text(readonly=True, copy=False)
+
+    @api.model
+    def _get_cache_token(self, company_id):
+        """Return a token changing whenever the move lines of the company, or
+        their reconciliations, change. The counts change when any of them is
+        deleted, not only the newest."""
+        self.env.flush_all()
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT
+                    (SELECT ARRAY[COUNT(*), MAX(aml.id)]
+                        FROM account_move_line aml
+                        WHERE aml.company_id = %(company_id)s),
+                    (SELECT MAX(aml.write_date) FROM account_move_line aml
+                        WHERE aml.company_id = %(company_id)s),
+                    (SELECT COUNT(*) FROM account_move am
+                        WHERE am.company_id = %(company_id)s),
+                    (SELECT MAX(am.write_date) FROM account_move am
+                        WHERE am.company_id = %(company_id)s),
+                    (SELECT ARRAY[COUNT(*), MAX(apr.id)]
+                        FROM account_partial_reconcile apr
+                        WHERE apr.company_id = %(company_id)s)
+                """,
+                company_id=company_id,
+            )
+        )
+        return json.dumps(self.env.cr.fetchone(), default=str)
+
+    @api.model
+    def _get_cache_key(self, report, data):
+        """Return the cache key of the export of ``report`` with ``data``, the
+        result of the ``_prepare_report_data`` of a wizard."""
+        # the wizard record itself is not part of the report parameters
+        values = {key: value for key, value in data.items() if key != "wizard_id"}
+        key = json.dumps(
+            [
+                report.id,
+                self.env.uid,
+                values,
+                self._get_cache_token(data.get("company_id") or self.env.company.id),
+            ],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @api.model
+    def _get_wizard_values(self, wizard):
+        """Return the values creating a copy of ``wizard``, serialized as the
+        data of the job."""
+        values = {
+            name: wizard[name]
+            for name, field in wizard._fields.items()
+            if field.store
+            and not field.automatic
+            and not (field.compute and field.readonly)
+        }
+        return json.loads(json.dumps(wizard._convert_to_write(values), default=str))
+
+    @api.model
+    def _queue(self, report, data, name, wizard=None):
+        """Return the job exporting ``report`` with ``data``: a finished job
+        with the same cache key, else a new job queued for the cron.
+
+        :param wizard: the wizard of the export, copied when the job runs
+        """
+        cache_key = self._get_cache_key(report, data)
+        job = self.search(
+            [
+                ("cache_key", "=", cache_key),
+                ("state", "in", ["queued", "running", "done"]),
+                ("user_id", "=", self.env.uid),
+            ],
+            limit=1,
+        )
+        if job:
+            return job
+        job = self.create(
+            {
+                "name": name,
+                "report_id": report.id,
+                "company_id": data.get("company_id") or self.env.company.id,
+                # as sent back by the web client, dates as strings
+                "data": json.loads(json.dumps(data, default=str)),
+                "cache_key": cache_key,
+                "wizard_model": wizard and wizard._name,
+                "wizard_values": wizard and self._get_wizard_values(wizard),
+            }
+        )
+        self.env.ref(
+            "account_financial_report.account_financial_report_job_cron"
+        )._trigger()
+        return job
+
+    def _run(self):
+        self.ensure_one()
+        report = self.report_id
+        report_model = self.env["ir.actions.report"].with_user(self.user_id)
+        report_model = report_model.with_company(self.company_id)
+        data = dict(self.data)
+        if self.wizard_model:
+            wizard = (
+                self.env[self.wizard_model]
+                .with_user(self.user_id)
+                .with_company(self.company_id)
+                .create(self.wizard_values)
+            )
+            data["wizard_id"] = wizard.id
+        content, extension = report_model._render(
+            report.report_name, [data["wizard_id"]], data=data
+        )
+        self.attachment_id = self.env["ir.attachment"].create(
+            {
+                "name": f"{self.name}.{extension}",
+                "datas": base64.b64encode(content),
+                "res_model": self._name,
+                "res_id": self.id,
+            }
+        )
+
+    @api.model
+    def _fail_interrupted_jobs(self):
+        """Fail the jobs still running after the time limit of the cron
+        workers: their worker was killed."""
+        time_limit = config["limit_time_real_cron"]
+        if time_limit is None or time_limit < 0:
+            time_limit = config["limit_time_real"]
+        if not time_limit:
+            return
+        self.search(
+            [
+                ("state", "=", "running"),
+                (
+                    "date_start",
+                    "<",
+                    fields.Datetime.now() - timedelta(seconds=time_limit),
+                ),
+            ]
+        ).write({"state": "failed", "error": _("The export was interrupted.")})
+
+    @api.model
+    def _cron_run_jobs(self):
+        self._fail_interrupted_jobs()
+        self.env.cr.commit()
+        while True:
+            self.env.cr.execute(
+                SQL(
+                    """
+                    SELECT id FROM account_financial_report_job
+                    WHERE state = 'queued'
+                    ORDER BY id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                    """
+                )
+            )
+            row = self.env.cr.fetchone()
+            if not row:
+                break
+            job = self.browse(row[0])
+            job.write({"state": "running", "date_start": fields.Datetime.now()})
+            self.env.cr.commit()
+            try:
+                job._run()
+            except Exception:
+                self.env.cr.rollback()
+                _logger.exception("Report job %s failed", job.id)
+                job.write({"state": "failed", "error": traceback.format_exc()})
+            else:
+                job.write({"state": "done", "date_done": fields.Datetime.now()})
+            self.env.cr.commit()
+
+    def action_download(self):
+        self.ensure_one()
+        return {
+            "type": "ir.actions.act_url",
+            "url": f"/web/content/{self.attachment_id.id}?download=true",
+            "target": "self",
+        }
+
+    def action_retry(self):
+        self.filtered(lambda job: job.state == "failed").write(
+            {"state": "queued", "error": False}
+        )
+        self.env.ref(
+            "account_financial_report.account_financial_report_job_cron"
+        )._trigger()
+
+    def _get_action(self):
+        """Return the action showing the job, or downloading its file once
+        done."""
+        self.ensure_one()
+        if self.state == "done":
+            return self.action_download()
+        return {
+            "type": "ir.actions.act_window",
+            "name": _("Report Export"),
+            "res_model": self._name,
+            "res_id": self.id,
+            "view_mode": "form",
+            "target": "new",
+        }
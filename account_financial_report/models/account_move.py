@@ -0,0 +1,18 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import models
+
+
+class AccountMove(models.Model):
+    _inherit = "account.move"
+
+    def _post(self, soft=True):
+        posted = super()._post(soft=soft)
+        self.env["account.balance.snapshot"]._refresh_move_lines(posted.line_ids)
+        return posted
+
+    def button_draft(self):
+        move_lines = self.filtered(lambda move: move.state == "posted").line_ids
+        res = super().button_draft()
+        self.env["account.balance.snapshot"]._refresh_move_lines(move_lines)
+        return res
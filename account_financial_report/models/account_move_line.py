@@ -60,6 +60,13 @@ class AccountMoveLine(models.Model):
             CREATE INDEX account_move_line_account_id_partner_id_index
             ON account_move_line (account_id, partner_id)"""
             )
+        # Last change of the move lines of a company, in the cache key of the
+        # report exports run in background
+        self._cr.execute(
+            """
+            CREATE INDEX IF NOT EXISTS account_move_line_company_id_write_date_index
+            ON account_move_line (company_id, write_date)"""
+        )
 
     @api.model
     def search_count(self, domain, limit=None):
@@ -25,3 +25,11 @@ class IrActionsReport(models.Model):
         context = self._prepare_account_financial_report_context(data)
         obj = self.with_context(**context) if context else self
         return super(IrActionsReport, obj)._render_xlsx(report_ref, docids, data=data)
+
+    @api.model
+    def _render_xlsx_file(self, report_ref, docids, data=None):
+        context = self._prepare_account_financial_report_context(data)
+        obj = self.with_context(**context) if context else self
+        return super(IrActionsReport, obj)._render_xlsx_file(
+            report_ref, docids, data=data
+        )
@@ -0,0 +1,25 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from odoo import fields, models
+
+
+class ResCompany(models.Model):
+    _inherit = "res.company"
+
+    balance_snapshot_date = fields.Date(
+        readonly=True,
+        copy=False,
+        help="The account balances of the moves dated before this date are "
+        "snapshotted for the financial reports.",
+    )
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {"fiscalyear_lock_date", "hard_lock_date"} & set(vals):
+            # the months unlocked may change again, they are dropped now; the
+            # newly locked months are summed by the cron
+            for company in self:
+                self.env["account.balance.snapshot"]._refresh_company(
+                    company, extend=False
+                )
+        return res
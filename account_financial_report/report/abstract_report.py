@@ -1,7 +1,13 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import uuid
+
 from odoo import api, models
+from odoo.tools import SQL
+
+# number of rows fetched at a time by _iter_query_rows
+QUERY_ROWS_BATCH_SIZE = 10000
 
 
 class AgedPartnerBalanceReport(models.AbstractModel):
@@ -151,6 +157,59 @@ class AgedPartnerBalanceReport(models.AbstractModel):
             journals_data.update({journal.id: {"id": journal.id, "code": journal.code}})
         return journals_data
 
+    def _read_group_balances(self, domain, groupby):
+        """Same as a ``read_group`` of the debit, credit, balance and amount
+        in currency of the move lines matching ``domain`` by ``groupby``
+        (``account_id`` and optionally ``partner_id``), served from the
+        balance snapshot when ``domain`` allows it."""
+        group_partner = "partner_id" in groupby
+        sums = self.env["account.balance.snapshot"]._get_domain_sums(
+            domain, group_partner
+        )
+        if sums is None:
+            return self.env["account.move.line"].read_group(
+                domain=domain,
+                fields=groupby + ["debit", "credit", "balance", "amount_currency:sum"],
+                groupby=groupby,
+                lazy=False,
+            )
+        accounts = self.env["account.account"].browse({key[0] for key in sums})
+        partners = self.env["res.partner"].browse({key[1] for key in sums if key[1]})
+        account_names = {account.id: account.display_name for account in accounts}
+        partner_names = {partner.id: partner.display_name for partner in partners}
+        res = []
+        for (acc_id, prt_id), values in sums.items():
+            if group_partner == (prt_id is None):
+                continue
+            row = {
+                "account_id": (acc_id, account_names[acc_id]),
+                "debit": values["debit"],
+                "credit": values["credit"],
+                "balance": values["balance"],
+                "amount_currency": values["amount_currency"],
+            }
+            if group_partner:
+                row["partner_id"] = prt_id and (prt_id, partner_names[prt_id])
+            res.append(row)
+        return res
+
+    def _iter_query_rows(self, query, batch_size=QUERY_ROWS_BATCH_SIZE):
+        """Yield the rows of the SQL ``query`` as dicts, fetched by batches
+        through a server-side cursor: the result is never held in memory as
+        a whole and other queries may run while the rows are consumed."""
+        cursor_name = SQL.identifier(f"afr_{uuid.uuid4().hex}")
+        self.env.cr.execute(
+            SQL("DECLARE %s NO SCROLL CURSOR FOR %s", cursor_name, query)
+        )
+        while True:
+            self.env.cr.execute(SQL("FETCH %s FROM %s", batch_size, cursor_name))
+            rows = self.env.cr.dictfetchall()
+            if not rows:
+                break
+            yield from rows
+        # a cursor left unconsumed is closed at the end of the transaction
+        self.env.cr.execute(SQL("CLOSE %s", cursor_name))
+
     def _get_ml_fields(self):
         return self.COMMON_ML_FIELDS + [
             "amount_residual",
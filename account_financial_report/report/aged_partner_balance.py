@@ -2,11 +2,12 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-import operator
 from datetime import date, datetime, timedelta
 
 from odoo import api, models
-from odoo.tools import float_is_zero
+from odoo.tools import SQL, split_every
+
+from .abstract_report import QUERY_ROWS_BATCH_SIZE
 
 
 class AgedPartnerBalanceReport(models.AbstractModel):
@@ -45,50 +46,6 @@ class AgedPartnerBalanceReport(models.AbstractModel):
             ag_pb_data[acc_id][prt_id][interval_line] = 0.0
         return ag_pb_data
 
-    @api.model
-    def _calculate_amounts(
-        self, ag_pb_data, acc_id, prt_id, residual, due_date, date_at_object
-    ):
-        ag_pb_data[acc_id]["residual"] += residual
-        ag_pb_data[acc_id][prt_id]["residual"] += residual
-        interval_lines = self.env.context["age_partner_config"].line_ids
-        today = date_at_object
-        if not due_date or today <= due_date:
-            ag_pb_data[acc_id]["current"] += residual
-            ag_pb_data[acc_id][prt_id]["current"] += residual
-            due_date = today
-        elif today <= due_date + timedelta(days=30):
-            ag_pb_data[acc_id]["30_days"] += residual
-            ag_pb_data[acc_id][prt_id]["30_days"] += residual
-        elif today <= due_date + timedelta(days=60):
-            ag_pb_data[acc_id]["60_days"] += residual
-            ag_pb_data[acc_id][prt_id]["60_days"] += residual
-        elif today <= due_date + timedelta(days=90):
-            ag_pb_data[acc_id]["90_days"] += residual
-            ag_pb_data[acc_id][prt_id]["90_days"] += residual
-        elif today <= due_date + timedelta(days=120):
-            ag_pb_data[acc_id]["120_days"] += residual
-            ag_pb_data[acc_id][prt_id]["120_days"] += residual
-        else:
-            ag_pb_data[acc_id]["older"] += residual
-            ag_pb_data[acc_id][prt_id]["older"] += residual
-
-        days_difference = abs((today - due_date).days)
-        for index, line in enumerate(interval_lines):
-            lower_limit = 0 if not index else interval_lines[index - 1].inferior_limit
-            next_line = interval_lines[index] if index < len(interval_lines) else None
-            interval_range = self._get_values_for_range_intervals(
-                lower_limit, next_line.inferior_limit
-            )
-            if (
-                days_difference in interval_range
-                or days_difference == line.inferior_limit
-            ):
-                ag_pb_data[acc_id][line] += residual
-                ag_pb_data[acc_id][prt_id][line] += residual
-                break
-        return ag_pb_data
-
     def _get_values_for_range_intervals(self, num1, num2):
         min_num = min(num1, num2)
         max_num = max(num1, num2)
@@ -96,50 +53,125 @@ class AgedPartnerBalanceReport(models.AbstractModel):
             return [max_num]
         return list(range(min_num + 1, max_num))
 
-    def _get_account_partial_reconciled(self, company_id, date_at_object):
-        domain = [("max_date", ">", date_at_object), ("company_id", "=", company_id)]
-        fields = [
-            "debit_move_id",
-            "credit_move_id",
-            "amount",
-            "debit_amount_currency",
-            "credit_amount_currency",
-        ]
-        accounts_partial_reconcile = self.env["account.partial.reconcile"].search_read(
-            domain=domain, fields=fields
+    def _get_aged_lines_query(
+        self,
+        company_id,
+        account_ids,
+        partner_ids,
+        date_at_object,
+        date_from,
+        only_posted_moves,
+    ):
+        """Return the SQL query of the move lines open at ``date_at_object``
+        with their residual at that date and their days overdue."""
+        line_model = self.env["account.move.line"]
+        domain = self._get_move_lines_domain_not_reconciled(
+            company_id, account_ids, partner_ids, only_posted_moves, date_from
         )
-        debit_amount = {}
-        debit_amount_currency = {}
-        credit_amount = {}
-        credit_amount_currency = {}
-        for account_partial_reconcile_data in accounts_partial_reconcile:
-            debit_move_id = account_partial_reconcile_data["debit_move_id"][0]
-            credit_move_id = account_partial_reconcile_data["credit_move_id"][0]
-            if debit_move_id not in debit_amount.keys():
-                debit_amount[debit_move_id] = 0.0
-                debit_amount_currency[debit_move_id] = 0.0
-            debit_amount_currency[debit_move_id] += account_partial_reconcile_data[
-                "debit_amount_currency"
-            ]
-            debit_amount[debit_move_id] += account_partial_reconcile_data["amount"]
-            if credit_move_id not in credit_amount.keys():
-                credit_amount[credit_move_id] = 0.0
-                credit_amount_currency[credit_move_id] = 0.0
-            credit_amount[credit_move_id] += account_partial_reconcile_data["amount"]
-            credit_amount_currency[credit_move_id] += account_partial_reconcile_data[
-                "credit_amount_currency"
+        lines_condition = SQL("aml.id IN %s", line_model._search(domain).subselect())
+        partials = SQL("SELECT NULL::int AS line_id, 0 AS amount WHERE FALSE")
+        if date_at_object < date.today():
+            # the reconciliations done after date_at are undone: the lines
+            # they touch are open at date_at, even the reconciled ones
+            partial_domain = [
+                ("company_id", "=", company_id),
+                ("max_date", ">", date_at_object),
             ]
-            account_partial_reconcile_data.update(
-                {"debit_move_id": debit_move_id, "credit_move_id": credit_move_id}
+            reconciled_domain = self._get_new_move_lines_domain(
+                line_model._search(
+                    [
+                        "|",
+                        ("matched_debit_ids", "any", partial_domain),
+                        ("matched_credit_ids", "any", partial_domain),
+                    ]
+                ),
+                account_ids,
+                company_id,
+                partner_ids,
+                only_posted_moves,
+            )
+            lines_condition = SQL(
+                "(%s OR aml.id IN %s)",
+                lines_condition,
+                line_model._search(reconciled_domain).subselect(),
             )
-        return (
-            accounts_partial_reconcile,
-            debit_amount,
-            credit_amount,
-            debit_amount_currency,
-            credit_amount_currency,
+            partials = SQL(
+                """
+                SELECT moves.line_id, SUM(moves.amount) AS amount
+                FROM (
+                    SELECT apr.debit_move_id AS line_id, apr.amount
+                    FROM account_partial_reconcile apr
+                    WHERE apr.company_id = %(company_id)s
+                        AND apr.max_date > %(date_at)s
+                    UNION ALL
+                    SELECT apr.credit_move_id, -apr.amount
+                    FROM account_partial_reconcile apr
+                    WHERE apr.company_id = %(company_id)s
+                        AND apr.max_date > %(date_at)s
+                ) moves
+                GROUP BY moves.line_id
+                """,
+                company_id=company_id,
+                date_at=date_at_object,
+            )
+        return SQL(
+            """
+            WITH partials AS (%(partials)s),
+            lines AS (
+                SELECT aml.id, aml.account_id,
+                    COALESCE(aml.partner_id, 0) AS partner_id, aml.date,
+                    aml.date_maturity,
+                    aml.amount_residual + COALESCE(partials.amount, 0)
+                        AS residual,
+                    CASE WHEN aml.date_maturity IS NULL
+                        OR aml.date_maturity >= %(date_at)s THEN 0
+                        ELSE %(date_at)s - aml.date_maturity END AS days_due
+                FROM account_move_line aml
+                LEFT JOIN partials ON partials.line_id = aml.id
+                WHERE %(lines_condition)s AND aml.date <= %(date_at)s
+            )
+            SELECT lines.* FROM lines
+            WHERE ROUND(lines.residual, 2) != 0
+            """,
+            partials=partials,
+            date_at=date_at_object,
+            lines_condition=lines_condition,
         )
 
+    def _get_aged_buckets_sql(self):
+        """Return ``[(key, condition)]``: the SQL conditions on ``days_due``
+        of the aging buckets, the ones of the intervals configuration
+        included."""
+        buckets = [
+            ("current", SQL("lines.days_due = 0")),
+            ("30_days", SQL("lines.days_due BETWEEN 1 AND 30")),
+            ("60_days", SQL("lines.days_due BETWEEN 31 AND 60")),
+            ("90_days", SQL("lines.days_due BETWEEN 61 AND 90")),
+            ("120_days", SQL("lines.days_due BETWEEN 91 AND 120")),
+            ("older", SQL("lines.days_due > 120")),
+        ]
+        interval_lines = self.env.context["age_partner_config"].line_ids
+        if not interval_lines:
+            return buckets
+        # a line falls in the first interval matching its days overdue
+        interval_cases = []
+        for index, interval_line in enumerate(interval_lines):
+            lower_limit = 0 if not index else interval_lines[index - 1].inferior_limit
+            limit = interval_line.inferior_limit
+            interval_range = self._get_values_for_range_intervals(lower_limit, limit)
+            interval_cases.append(
+                SQL(
+                    "WHEN lines.days_due = %s OR lines.days_due = ANY(%s) THEN %s",
+                    limit,
+                    interval_range,
+                    index,
+                )
+            )
+        interval_index = SQL("(CASE %s END)", SQL(" ").join(interval_cases))
+        for index, interval_line in enumerate(interval_lines):
+            buckets.append((interval_line, SQL("%s = %s", interval_index, index)))
+        return buckets
+
     def _get_move_lines_data(
         self,
         company_id,
@@ -150,70 +182,88 @@ class AgedPartnerBalanceReport(models.AbstractModel):
         only_posted_moves,
         show_move_line_details,
     ):
-        domain = self._get_move_lines_domain_not_reconciled(
-            company_id, account_ids, partner_ids, only_posted_moves, date_from
+        self.env.flush_all()
+        lines_query = self._get_aged_lines_query(
+            company_id,
+            account_ids,
+            partner_ids,
+            date_at_object,
+            date_from,
+            only_posted_moves,
         )
-        ml_fields = self._get_ml_fields()
-        line_model = self.env["account.move.line"]
-        move_lines = line_model.search_read(domain=domain, fields=ml_fields)
-        journals_ids = set()
-        partners_ids = set()
-        partners_data = {}
+        buckets = self._get_aged_buckets_sql()
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT lines.account_id, lines.partner_id,
+                    SUM(lines.residual) AS residual, %s
+                FROM (%s) lines
+                GROUP BY lines.account_id, lines.partner_id
+                """,
+                SQL(", ").join(
+                    SQL(
+                        "COALESCE(SUM(lines.residual) FILTER (WHERE %s), 0) AS %s",
+                        condition,
+                        SQL.identifier(f"bucket_{index}"),
+                    )
+                    for index, (_key, condition) in enumerate(buckets)
+                ),
+                lines_query,
+            )
+        )
+        rows = self.env.cr.dictfetchall()
         ag_pb_data = {}
-        if date_at_object < date.today():
-            (
-                acc_partial_rec,
-                debit_amount,
-                credit_amount,
-                debit_amount_currency,
-                credit_amount_currency,
-            ) = self._get_account_partial_reconciled(company_id, date_at_object)
-            if acc_partial_rec:
-                ml_ids = list(map(operator.itemgetter("id"), move_lines))
-                debit_ids = list(
-                    map(operator.itemgetter("debit_move_id"), acc_partial_rec)
-                )
-                credit_ids = list(
-                    map(operator.itemgetter("credit_move_id"), acc_partial_rec)
-                )
-                move_lines = self._recalculate_move_lines(
-                    move_lines,
-                    debit_ids,
-                    credit_ids,
-                    debit_amount,
-                    credit_amount,
-                    ml_ids,
-                    account_ids,
-                    company_id,
-                    partner_ids,
-                    only_posted_moves,
-                    debit_amount_currency,
-                    credit_amount_currency,
-                )
-        move_lines = [
-            move_line
-            for move_line in move_lines
-            if move_line["date"] <= date_at_object
-            and not float_is_zero(move_line["amount_residual"], precision_digits=2)
-        ]
-        for move_line in move_lines:
-            journals_ids.add(move_line["journal_id"][0])
-            acc_id = move_line["account_id"][0]
-            if move_line["partner_id"]:
-                prt_id = move_line["partner_id"][0]
-                prt_name = move_line["partner_id"][1]
-            else:
-                prt_id = 0
-                prt_name = ""
-            if prt_id not in partners_ids:
-                partners_data.update({prt_id: {"id": prt_id, "name": prt_name}})
-                partners_ids.add(prt_id)
-            if acc_id not in ag_pb_data.keys():
+        for row in rows:
+            acc_id = row["account_id"]
+            prt_id = row["partner_id"]
+            if acc_id not in ag_pb_data:
                 ag_pb_data = self._initialize_account(ag_pb_data, acc_id)
-            if prt_id not in ag_pb_data[acc_id]:
-                ag_pb_data = self._initialize_partner(ag_pb_data, acc_id, prt_id)
-            move_line_data = {}
-            if show_move_line_details:
+            ag_pb_data = self._initialize_partner(ag_pb_data, acc_id, prt_id)
+            ag_pb_data[acc_id]["residual"] += row["residual"]
+            ag_pb_data[acc_id][prt_id]["residual"] = row["residual"]
+            for index, (key, _condition) in enumerate(buckets):
+                ag_pb_data[acc_id][key] += row[f"bucket_{index}"]
+                ag_pb_data[acc_id][prt_id][key] = row[f"bucket_{index}"]
+        partners = self.env["res.partner"].browse(
+            {row["partner_id"] for row in rows if row["partner_id"]}
+        )
+        partners_data = {0: {"id": 0, "name": ""}}
+        for partner in partners:
+            partners_data[partner.id] = {"id": partner.id, "name": partner.display_name}
+        journals_data = {}
+        if show_move_line_details:
+            journals_data = self._set_aged_move_lines(
+                ag_pb_data, partners_data, lines_query
+            )
+        # accounts by code, partners by name
+        accounts = self.env["account.account"].search([("id", "in", list(ag_pb_data))])
+        for acc_id in accounts.ids:
+            prt_ids = sorted(
+                (key for key in ag_pb_data[acc_id] if isinstance(key, int)),
+                key=lambda prt_id: partners_data[prt_id]["name"],
+            )
+            for prt_id in prt_ids:
+                ag_pb_data[acc_id][prt_id] = ag_pb_data[acc_id].pop(prt_id)
+        accounts_data = self._get_accounts_data(accounts.ids)
+        return ag_pb_data, accounts_data, partners_data, journals_data
+
+    def _set_aged_move_lines(self, ag_pb_data, partners_data, lines_query):
+        """Read the details of the move lines of ``lines_query`` into
+        ``ag_pb_data``, and return the data of their journals."""
+        line_model = self.env["account.move.line"]
+        journals_ids = set()
+        ml_fields = self._get_ml_fields()
+        for rows in split_every(
+            QUERY_ROWS_BATCH_SIZE, self._iter_query_rows(lines_query)
+        ):
+            residuals = {row["id"]: row["residual"] for row in rows}
+            move_lines = line_model.search_read(
+                domain=[("id", "in", list(residuals))], fields=ml_fields
+            )
+            for move_line in move_lines:
+                journals_ids.add(move_line["journal_id"][0])
+                acc_id = move_line["account_id"][0]
+                prt_id = move_line["partner_id"][0] if move_line["partner_id"] else 0
                 if move_line["ref"] == move_line["name"]:
                     if move_line["ref"]:
                         ref_label = move_line["ref"]
@@ -225,31 +275,21 @@ class AgedPartnerBalanceReport(models.AbstractModel):
                     ref_label = move_line["ref"]
                 else:
                     ref_label = move_line["ref"] + " - " + move_line["name"]
-                move_line_data.update(
+                ag_pb_data[acc_id][prt_id]["move_lines"].append(
                     {
                         "line_rec": line_model.browse(move_line["id"]),
                         "date": move_line["date"],
                         "entry": move_line["move_id"][1],
                         "jnl_id": move_line["journal_id"][0],
                         "acc_id": acc_id,
-                        "partner": prt_name,
+                        "partner": partners_data[prt_id]["name"],
                         "ref_label": ref_label,
                         "due_date": move_line["date_maturity"],
-                        "residual": move_line["amount_residual"],
+                        "residual": residuals[move_line["id"]],
                     }
                 )
-                ag_pb_data[acc_id][prt_id]["move_lines"].append(move_line_data)
-            ag_pb_data = self._calculate_amounts(
-                ag_pb_data,
-                acc_id,
-                prt_id,
-                move_line["amount_residual"],
-                move_line["date_maturity"],
-                date_at_object,
-            )
-        journals_data = self._get_journals_data(list(journals_ids))
-        accounts_data = self._get_accounts_data(ag_pb_data.keys())
-        return ag_pb_data, accounts_data, partners_data, journals_data
+            line_model.invalidate_model()
+        return self._get_journals_data(list(journals_ids))
 
     @api.model
     def _compute_maturity_date(self, ml, date_at_object):
@@ -355,7 +395,7 @@ class AgedPartnerBalanceReport(models.AbstractModel):
                             )
                             self._compute_maturity_date(ml, date_at_oject)
                             move_lines.append(ml)
-                        move_lines = sorted(move_lines, key=lambda k: (k["date"]))
+                        move_lines = sorted(move_lines, key=lambda k: k["date"])
                         partner.update({"move_lines": move_lines})
                     account["partners"].append(partner)
             aged_partner_data.append(account)
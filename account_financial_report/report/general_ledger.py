@@ -5,10 +5,11 @@
 
 import calendar
 import datetime
+import itertools
 import operator
 
 from odoo import _, api, models
-from odoo.tools import float_is_zero
+from odoo.tools import SQL, float_is_zero
 
 
 class GeneralLedgerReport(models.AbstractModel):
@@ -106,16 +107,8 @@ class GeneralLedgerReport(models.AbstractModel):
         return domain
 
     def _get_accounts_initial_balance(self, initial_domain_bs, initial_domain_pl):
-        gl_initial_acc_bs = self.env["account.move.line"].read_group(
-            domain=initial_domain_bs,
-            fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
-            groupby=["account_id"],
-        )
-        gl_initial_acc_pl = self.env["account.move.line"].read_group(
-            domain=initial_domain_pl,
-            fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
-            groupby=["account_id"],
-        )
+        gl_initial_acc_bs = self._read_group_balances(initial_domain_bs, ["account_id"])
+        gl_initial_acc_pl = self._read_group_balances(initial_domain_pl, ["account_id"])
         gl_initial_acc = gl_initial_acc_bs + gl_initial_acc_pl
         return gl_initial_acc
 
@@ -141,11 +134,7 @@ class GeneralLedgerReport(models.AbstractModel):
         domain = self._get_initial_balance_fy_pl_ml_domain(
             account_ids, company_id, fy_start_date, base_domain
         )
-        initial_balances = self.env["account.move.line"].read_group(
-            domain=domain,
-            fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
-            groupby=["account_id"],
-        )
+        initial_balances = self._read_group_balances(domain, ["account_id"])
         pl_initial_balance = {
             "debit": 0.0,
             "credit": 0.0,
@@ -198,18 +187,8 @@ class GeneralLedgerReport(models.AbstractModel):
         return getattr(self, method)(data, domain, grouped_by)
 
     def _prepare_gen_ld_data_group_partners(self, data, domain, grouped_by):
-        gl_initial_acc_prt = self.env["account.move.line"].read_group(
-            domain=domain,
-            fields=[
-                "account_id",
-                "partner_id",
-                "debit",
-                "credit",
-                "balance",
-                "amount_currency:sum",
-            ],
-            groupby=["account_id", "partner_id"],
-            lazy=False,
+        gl_initial_acc_prt = self._read_group_balances(
+            domain, ["account_id", "partner_id"]
         )
         if gl_initial_acc_prt:
             for gl in gl_initial_acc_prt:
@@ -415,32 +394,135 @@ class GeneralLedgerReport(models.AbstractModel):
         rec_after_date_to_ids = [i[0] for i in rec_after_date_to_ids]
         return rec_after_date_to_ids
 
-    def _prepare_ml_items(self, move_line, grouped_by):
-        res = []
+    def _get_period_ml_items_sql(self, grouped_by, acc_prt_account_ids):
+        """SQL array of the group items of each row of ``lines``: its partner
+        or its taxes on the accounts grouped by ``grouped_by``, 0 otherwise."""
         if grouped_by == "partners":
-            item_id = move_line["partner_id"][0] if move_line["partner_id"] else 0
-            item_name = (
-                move_line["partner_id"][1]
-                if move_line["partner_id"]
-                else _("Missing Partner")
-            )
-            res.append({"id": item_id, "name": item_name})
+            items = SQL("ARRAY[COALESCE(lines.partner_id, 0)]")
         elif grouped_by == "taxes":
-            if move_line["tax_line_id"]:
-                item_id = move_line["tax_line_id"][0]
-                item_name = move_line["tax_line_id"][1]
-                res.append({"id": item_id, "name": item_name})
-            elif move_line["tax_ids"]:
-                for tax_id in move_line["tax_ids"]:
-                    tax_item = self.env["account.tax"].search_fetch(
-                        [("id", "=", tax_id)], ["name"]
-                    )
-                    res.append({"id": tax_item.id, "name": tax_item.name})
-            else:
-                res.append({"id": 0, "name": "Missing Tax"})
+            items = SQL(
+                """CASE
+                WHEN lines.tax_line_id IS NOT NULL THEN ARRAY[lines.tax_line_id]
+                WHEN cardinality(lines.tax_ids) > 0 THEN lines.tax_ids
+                ELSE ARRAY[0]
+                END"""
+            )
         else:
-            res.append({"id": 0, "name": ""})
-        return res
+            items = SQL("ARRAY[0]")
+        return SQL(
+            "CASE WHEN lines.account_id = ANY(%s) THEN %s ELSE ARRAY[0] END",
+            list(acc_prt_account_ids),
+            items,
+        )
+
+    def _get_period_ml_query(self, domain, grouped_by, acc_prt_account_ids):
+        """Return the SQL of the move lines matching ``domain``, one row per
+        line and group item (a line with several taxes belongs to several tax
+        items). ``seq`` is 1 on the first row of each line."""
+        # the lines are read with plain SQL, pending ORM writes must be flushed
+        self.env.flush_all()
+        query = self.env["account.move.line"]._search(domain)
+        return SQL(
+            """
+            WITH lines AS (
+                SELECT aml.id, aml.account_id, aml.partner_id, aml.journal_id,
+                    aml.move_id, aml.move_name, aml.date, aml.ref, aml.name,
+                    aml.debit, aml.credit, aml.balance, aml.amount_currency,
+                    aml.currency_id, aml.company_currency_id, aml.tax_line_id,
+                    aml.full_reconcile_id, aml.matching_number,
+                    aml.analytic_distribution,
+                    ARRAY(
+                        SELECT rel.account_tax_id
+                        FROM account_move_line_account_tax_rel rel
+                        WHERE rel.account_move_line_id = aml.id
+                        ORDER BY rel.account_tax_id
+                    ) AS tax_ids
+                FROM account_move_line aml
+                WHERE aml.id IN %(ml_ids)s
+            )
+            SELECT lines.*, item.item_id, item.seq
+            FROM lines, unnest(%(items)s) WITH ORDINALITY AS item(item_id, seq)
+            """,
+            ml_ids=query.subselect(),
+            items=self._get_period_ml_items_sql(grouped_by, acc_prt_account_ids),
+        )
+
+    def _get_period_ml_totals(self, ml_query):
+        """Sum the period move lines per account and per account and group
+        item in one pass with GROUPING SETS. Return
+        ``{(account_id, item_id or None): {field: sum}}``.
+
+        Besides the balances, each total counts its rows and sums the
+        amounts in foreign currency, which is all the report needs to know
+        about the lines before rendering them."""
+        sums = []
+        for field_name in ["debit", "credit", "balance", "amount_currency"]:
+            sums.append(
+                SQL(
+                    """CASE WHEN GROUPING(items.item_id) = 1
+                    THEN SUM(%(field)s) FILTER (WHERE items.seq = 1)
+                    ELSE SUM(%(field)s) END AS %(alias)s""",
+                    field=SQL.identifier("items", field_name),
+                    alias=SQL.identifier(field_name),
+                )
+            )
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT items.account_id, items.item_id,
+                    GROUPING(items.item_id) = 1 AS account_total, %s,
+                    COUNT(*) AS ml_count,
+                    COALESCE(SUM(items.amount_currency) FILTER (
+                        WHERE items.currency_id != items.company_currency_id
+                    ), 0) AS foreign_bal_curr,
+                    array_agg(DISTINCT items.currency_id) FILTER (
+                        WHERE items.currency_id != items.company_currency_id
+                    ) AS foreign_currency_ids
+                FROM (%s) AS items
+                GROUP BY GROUPING SETS (
+                    (items.account_id, items.item_id), (items.account_id)
+                )
+                """,
+                SQL(", ").join(sums),
+                ml_query,
+            )
+        )
+        return {
+            (row["account_id"], None if row["account_total"] else row["item_id"]): row
+            for row in self.env.cr.dictfetchall()
+        }
+
+    def _get_period_ml_related_ids(self, ml_query):
+        """Return the distinct records the period move lines refer to."""
+        self.env.cr.execute(
+            SQL(
+                """
+                WITH items AS (%s)
+                SELECT
+                    (SELECT array_agg(DISTINCT journal_id) FROM items) AS journal_ids,
+                    (SELECT array_agg(DISTINCT partner_id) FROM items
+                     WHERE partner_id IS NOT NULL) AS partner_ids,
+                    (SELECT array_agg(DISTINCT currency_id) FROM items
+                     WHERE currency_id IS NOT NULL) AS currency_ids,
+                    (SELECT array_agg(DISTINCT tax_line_id) FROM items
+                     WHERE tax_line_id IS NOT NULL) AS tax_line_ids,
+                    (SELECT array_agg(DISTINCT tax_id)
+                     FROM items, unnest(items.tax_ids) AS tax_id) AS tax_ids,
+                    (SELECT array_agg(DISTINCT analytic_key)
+                     FROM items,
+                        jsonb_object_keys(items.analytic_distribution) AS analytic_key
+                    ) AS analytic_keys,
+                    (SELECT json_object_agg(full_reconcile_id, matching_number)
+                     FROM (
+                        SELECT DISTINCT full_reconcile_id, matching_number
+                        FROM items WHERE full_reconcile_id IS NOT NULL
+                     ) AS reconciles) AS full_reconciles
+                """,
+                ml_query,
+            )
+        )
+        related = self.env.cr.dictfetchone()
+        return {key: value or [] for key, value in related.items()}
 
     def _get_period_ml_data(
         self,
@@ -456,6 +538,10 @@ class GeneralLedgerReport(models.AbstractModel):
         extra_domain,
         grouped_by,
     ):
+        """Add the period totals of every account and group item to
+        ``gen_ld_data`` and collect the data the renderers need. The move
+        lines themselves are not loaded here: ``_iter_period_move_lines``
+        streams them in report order, given the related ids returned last."""
         domain = self._get_period_domain(
             account_ids,
             partner_ids,
@@ -467,81 +553,59 @@ class GeneralLedgerReport(models.AbstractModel):
         )
         if extra_domain:
             domain += extra_domain
-        ml_fields = self._get_ml_fields()
-        move_lines = self.env["account.move.line"].search_read(
-            domain=domain, fields=ml_fields, order="date,move_name"
-        )
-        journal_ids = set()
-        full_reconcile_ids = set()
-        taxes_ids = set()
-        analytic_ids = set()
-        full_reconcile_data = {}
         acc_prt_account_ids = self._get_acc_prt_accounts_ids(company_id, grouped_by)
-        for move_line in move_lines:
-            journal_ids.add(move_line["journal_id"][0])
-            for tax_id in move_line["tax_ids"]:
-                taxes_ids.add(tax_id)
-            for analytic_account in move_line["analytic_distribution"] or {}:
-                for analytic_account_id in analytic_account.split(","):
-                    analytic_ids.add(int(analytic_account_id))
-            if move_line["full_reconcile_id"]:
-                rec_id = move_line["full_reconcile_id"][0]
-                if rec_id not in full_reconcile_ids:
-                    full_reconcile_data.update(
-                        {
-                            rec_id: {
-                                "id": rec_id,
-                                "name": move_line["matching_number"],
-                            }
-                        }
-                    )
-                    full_reconcile_ids.add(rec_id)
-            acc_id = move_line["account_id"][0]
-            ml_id = move_line["id"]
-            if acc_id not in gen_ld_data.keys():
-                gen_ld_data[acc_id] = self._initialize_data(foreign_currency)
-                gen_ld_data[acc_id]["id"] = acc_id
-                gen_ld_data[acc_id]["mame"] = move_line["account_id"][1]
-                gen_ld_data[acc_id][grouped_by] = False
-            if acc_id in acc_prt_account_ids:
-                item_ids = self._prepare_ml_items(move_line, grouped_by)
-                for item in item_ids:
-                    item_id = item["id"]
-                    if item_id not in gen_ld_data[acc_id]:
-                        gen_ld_data[acc_id][grouped_by] = True
-                        gen_ld_data[acc_id][item_id] = self._initialize_data(
-                            foreign_currency
-                        )
-                        gen_ld_data[acc_id][item_id]["id"] = item_id
-                        gen_ld_data[acc_id][item_id]["name"] = item["name"]
-                    gen_ld_data[acc_id][item_id][ml_id] = self._get_move_line_data(
-                        move_line
+        ml_query = self._get_period_ml_query(domain, grouped_by, acc_prt_account_ids)
+        related = self._get_period_ml_related_ids(ml_query)
+        item_names = self._get_period_ml_item_names(grouped_by, related)
+        balance_fields = ["credit", "debit", "balance"]
+        if foreign_currency:
+            balance_fields.append("bal_curr")
+        totals = self._get_period_ml_totals(ml_query)
+        new_account_ids = set()
+        # accounts first, so that their items find them in gen_ld_data
+        for (acc_id, item_id), total in sorted(
+            totals.items(), key=lambda item: item[0][1] is not None
+        ):
+            if item_id is None:
+                if acc_id not in gen_ld_data:
+                    new_account_ids.add(acc_id)
+                    gen_ld_data[acc_id] = self._initialize_data(foreign_currency)
+                    gen_ld_data[acc_id]["id"] = acc_id
+                    gen_ld_data[acc_id]["mame"] = ""
+                    gen_ld_data[acc_id][grouped_by] = False
+                item = gen_ld_data[acc_id]
+            elif acc_id in acc_prt_account_ids:
+                if item_id not in gen_ld_data[acc_id]:
+                    gen_ld_data[acc_id][grouped_by] = True
+                    gen_ld_data[acc_id][item_id] = self._initialize_data(
+                        foreign_currency
                     )
-                    gen_ld_data[acc_id][item_id]["fin_bal"]["credit"] += move_line[
-                        "credit"
-                    ]
-                    gen_ld_data[acc_id][item_id]["fin_bal"]["debit"] += move_line[
-                        "debit"
-                    ]
-                    gen_ld_data[acc_id][item_id]["fin_bal"]["balance"] += move_line[
-                        "balance"
-                    ]
-                    if foreign_currency:
-                        gen_ld_data[acc_id][item_id]["fin_bal"]["bal_curr"] += (
-                            move_line["amount_currency"]
-                        )
+                    gen_ld_data[acc_id][item_id]["id"] = item_id
+                    gen_ld_data[acc_id][item_id]["name"] = item_names.get(item_id, "")
+                item = gen_ld_data[acc_id][item_id]
             else:
-                gen_ld_data[acc_id][ml_id] = self._get_move_line_data(move_line)
-            gen_ld_data[acc_id]["fin_bal"]["credit"] += move_line["credit"]
-            gen_ld_data[acc_id]["fin_bal"]["debit"] += move_line["debit"]
-            gen_ld_data[acc_id]["fin_bal"]["balance"] += move_line["balance"]
-            if foreign_currency:
-                gen_ld_data[acc_id]["fin_bal"]["bal_curr"] += move_line[
-                    "amount_currency"
+                continue
+            for field_name in balance_fields:
+                item["fin_bal"][field_name] += total[
+                    field_name if field_name != "bal_curr" else "amount_currency"
                 ]
-        journals_data = self._get_journals_data(list(journal_ids))
+            item["ml_count"] = total["ml_count"]
+            item["foreign_bal_curr"] = total["foreign_bal_curr"]
+            item["foreign_currency_ids"] = total["foreign_currency_ids"] or []
+        analytic_ids = {
+            int(analytic_id)
+            for analytic_key in related["analytic_keys"]
+            for analytic_id in analytic_key.split(",")
+        }
+        full_reconcile_data = {
+            int(rec_id): {"id": int(rec_id), "name": name}
+            for rec_id, name in dict(related["full_reconciles"]).items()
+        }
+        journals_data = self._get_journals_data(related["journal_ids"])
         accounts_data = self._get_accounts_data(gen_ld_data.keys())
-        taxes_data = self._get_taxes_data(list(taxes_ids))
+        for acc_id in new_account_ids:
+            gen_ld_data[acc_id]["mame"] = accounts_data[acc_id]["name"]
+        taxes_data = self._get_taxes_data(related["tax_ids"])
         analytic_data = self._get_analytic_data(list(analytic_ids))
         rec_after_date_to_ids = self._get_reconciled_after_date_to_ids(
             full_reconcile_data.keys(), date_to
@@ -554,8 +618,158 @@ class GeneralLedgerReport(models.AbstractModel):
             taxes_data,
             analytic_data,
             rec_after_date_to_ids,
+            related,
         )
 
+    def _get_period_ml_item_names(self, grouped_by, related):
+        if grouped_by == "partners":
+            partners = self.env["res.partner"].browse(related["partner_ids"])
+            names = {partner.id: partner.display_name for partner in partners}
+            names[0] = _("Missing Partner")
+        elif grouped_by == "taxes":
+            taxes = self.env["account.tax"].browse(
+                set(related["tax_ids"]) | set(related["tax_line_ids"])
+            )
+            names = {tax.id: tax.display_name for tax in taxes}
+            names[0] = "Missing Tax"
+        else:
+            names = {0: ""}
+        return names
+
+    def _get_period_ml_names(self, accounts_data, journals_data, related):
+        """Display names of the many2one values of the streamed move lines,
+        to give them the same shape as ``search_read`` results."""
+        taxes = self.env["account.tax"].browse(related["tax_line_ids"])
+        currencies = self.env["res.currency"].browse(related["currency_ids"])
+        partners = self.env["res.partner"].browse(related["partner_ids"])
+        return {
+            "account_id": {
+                acc_id: account["name"] for acc_id, account in accounts_data.items()
+            },
+            "journal_id": {
+                jnl_id: journal["code"] for jnl_id, journal in journals_data.items()
+            },
+            "partner_id": {partner.id: partner.display_name for partner in partners},
+            "tax_line_id": {tax.id: tax.display_name for tax in taxes},
+            "currency_id": {currency.id: currency.name for currency in currencies},
+        }
+
+    def _iter_period_move_lines(
+        self,
+        account_ids,
+        partner_ids,
+        company_id,
+        only_posted_moves,
+        date_from,
+        date_to,
+        gen_ld_data,
+        accounts_data,
+        journals_data,
+        cost_center_ids,
+        extra_domain,
+        grouped_by,
+        rec_after_date_to_ids,
+        related,
+    ):
+        """Yield ``(account_id, item_id, move_lines)`` for every account and
+        group item having period move lines, in report order (account code,
+        then item name). The cumulative balances are computed by PostgreSQL
+        with a window function and the rows are fetched by batches through a
+        server-side cursor: ``move_lines`` is an iterator, to be consumed
+        before the next block is requested. ``related`` are the related ids
+        returned by ``_get_period_ml_data``, not read again."""
+        domain = self._get_period_domain(
+            account_ids,
+            partner_ids,
+            company_id,
+            only_posted_moves,
+            date_to,
+            date_from,
+            cost_center_ids,
+        )
+        if extra_domain:
+            domain += extra_domain
+        acc_prt_account_ids = set(
+            self._get_acc_prt_accounts_ids(company_id, grouped_by)
+        )
+        ml_query = self._get_period_ml_query(domain, grouped_by, acc_prt_account_ids)
+        account_order = self._get_gl_account_order(gen_ld_data, accounts_data)
+        item_order = self._get_gl_item_order(gen_ld_data)
+        names = self._get_period_ml_names(accounts_data, journals_data, related)
+        rows = self._iter_query_rows(
+            SQL(
+                """
+                SELECT items.*, SUM(items.balance) OVER (
+                    PARTITION BY items.account_id, items.item_id
+                    ORDER BY items.date, items.move_name, items.id
+                    ROWS UNBOUNDED PRECEDING
+                ) AS cumul_balance
+                FROM (%s) AS items
+                ORDER BY array_position(%s::int[], items.account_id),
+                    array_position(%s::int[], items.item_id),
+                    items.date, items.move_name, items.id
+                """,
+                ml_query,
+                account_order,
+                item_order,
+            )
+        )
+        rec_after_date_to_ids = set(rec_after_date_to_ids)
+        for (acc_id, item_id), block_rows in itertools.groupby(
+            rows, key=operator.itemgetter("account_id", "item_id")
+        ):
+            if acc_id in acc_prt_account_ids:
+                init_balance = gen_ld_data[acc_id][item_id]["init_bal"]["balance"]
+            else:
+                init_balance = gen_ld_data[acc_id]["init_bal"]["balance"]
+            yield (
+                acc_id,
+                item_id,
+                self._iter_block_move_lines(
+                    block_rows, init_balance, names, rec_after_date_to_ids
+                ),
+            )
+
+    def _iter_block_move_lines(self, rows, init_balance, names, rec_after_date_to_ids):
+        for row in rows:
+            row["balance"] = init_balance + row["cumul_balance"]
+            move_line = self._get_move_line_data(self._prepare_period_ml(row, names))
+            if move_line["rec_id"] in rec_after_date_to_ids:
+                move_line["rec_name"] = "(" + _("future") + ") " + move_line["rec_name"]
+            yield move_line
+
+    @api.model
+    def _prepare_period_ml(self, row, names):
+        """Shape a streamed row like a ``search_read`` result."""
+        move_line = dict(row)
+        for field_name, field_names in names.items():
+            value = row[field_name]
+            move_line[field_name] = (
+                (value, field_names.get(value, "")) if value else False
+            )
+        move_line["move_id"] = (row["move_id"], row["move_name"])
+        move_line["full_reconcile_id"] = (
+            (row["full_reconcile_id"], row["matching_number"])
+            if row["full_reconcile_id"]
+            else False
+        )
+        return move_line
+
+    def _get_gl_account_order(self, gen_led_data, accounts_data):
+        return sorted(
+            gen_led_data,
+            key=lambda acc_id: (accounts_data[acc_id]["code"] or "", acc_id),
+        )
+
+    def _get_gl_item_order(self, gen_led_data):
+        """Group items sorted by name, the missing partner or tax last."""
+        items = {}
+        for account in gen_led_data.values():
+            for item_id, item in account.items():
+                if isinstance(item_id, int) and isinstance(item, dict):
+                    items[item_id] = item.get("name") or ""
+        return sorted(items, key=lambda item_id: (not item_id, items[item_id], item_id))
+
     @api.model
     def _recalculate_cumul_balance(
         self, move_lines, last_cumul_balance, rec_after_date_to_ids
@@ -567,131 +781,161 @@ class GeneralLedgerReport(models.AbstractModel):
                 move_line["rec_name"] = "(" + _("future") + ") " + move_line["rec_name"]
         return move_lines
 
-    def _create_account(self, account, acc_id, gen_led_data, rec_after_date_to_ids):
-        move_lines = []
-        for ml_id in gen_led_data[acc_id].keys():
-            if not isinstance(ml_id, int):
-                account.update({ml_id: gen_led_data[acc_id][ml_id]})
-            else:
-                move_lines += [gen_led_data[acc_id][ml_id]]
-        move_lines = sorted(move_lines, key=lambda k: (k["date"]))
-        move_lines = self._recalculate_cumul_balance(
-            move_lines,
-            gen_led_data[acc_id]["init_bal"]["balance"],
-            rec_after_date_to_ids,
+    def _is_hidden_at_0(self, item, has_move_lines, hide_account_at_0, rounding):
+        return (
+            hide_account_at_0
+            and float_is_zero(item["init_bal"]["balance"], precision_rounding=rounding)
+            and not has_move_lines
         )
-        account.update({"move_lines": move_lines})
-        return account
 
-    def _create_account_not_show_item(
-        self, account, acc_id, gen_led_data, rec_after_date_to_ids, grouped_by
-    ):
-        move_lines = []
-        for prt_id in gen_led_data[acc_id].keys():
-            if not isinstance(prt_id, int):
-                account.update({prt_id: gen_led_data[acc_id][prt_id]})
-            elif isinstance(gen_led_data[acc_id][prt_id], dict):
-                for ml_id in gen_led_data[acc_id][prt_id].keys():
-                    if isinstance(ml_id, int):
-                        move_lines += [gen_led_data[acc_id][prt_id][ml_id]]
-        move_lines = sorted(move_lines, key=lambda k: (k["date"]))
-        move_lines = self._recalculate_cumul_balance(
-            move_lines,
-            gen_led_data[acc_id]["init_bal"]["balance"],
-            rec_after_date_to_ids,
-        )
-        account.update({"move_lines": move_lines, grouped_by: False})
-        return account
+    def _iter_gl_move_lines(self, blocks, acc_id, item_id, ml_count):
+        """Yield the move lines of an account or group item, taken from the
+        shared ``blocks`` of ``_iter_period_move_lines`` when iterated. The
+        blocks of the items skipped by the renderer are passed over."""
+        if not ml_count:
+            return
+        for block_acc_id, block_item_id, move_lines in blocks:
+            if (block_acc_id, block_item_id) == (acc_id, item_id):
+                yield from move_lines
+                return
 
     def _get_list_grouped_item(
-        self, data, account, rec_after_date_to_ids, hide_account_at_0, rounding
+        self, data, item_order, blocks, hide_account_at_0, rounding
     ):
         list_grouped = []
-        for data_id in data.keys():
-            group_item = {}
-            move_lines = []
-            if not isinstance(data_id, int):
-                account.update({data_id: data[data_id]})
-            else:
-                for ml_id in data[data_id].keys():
-                    if not isinstance(ml_id, int):
-                        group_item.update({ml_id: data[data_id][ml_id]})
-                    else:
-                        move_lines += [data[data_id][ml_id]]
-                move_lines = sorted(move_lines, key=lambda k: (k["date"]))
-                move_lines = self._recalculate_cumul_balance(
-                    move_lines,
-                    data[data_id]["init_bal"]["balance"],
-                    rec_after_date_to_ids,
-                )
-                group_item.update({"move_lines": move_lines})
-                if (
-                    hide_account_at_0
-                    and float_is_zero(
-                        data[data_id]["init_bal"]["balance"],
-                        precision_rounding=rounding,
-                    )
-                    and group_item["move_lines"] == []
-                ):
-                    continue
-                list_grouped += [group_item]
-        return account, list_grouped
+        item_ids = [item_id for item_id in item_order if item_id in data]
+        for item_id in item_ids:
+            group_item = {
+                key: value
+                for key, value in data[item_id].items()
+                if not isinstance(key, int)
+            }
+            if self._is_hidden_at_0(
+                group_item, group_item.get("ml_count"), hide_account_at_0, rounding
+            ):
+                continue
+            group_item["move_lines"] = self._iter_gl_move_lines(
+                blocks, data["id"], item_id, group_item.get("ml_count")
+            )
+            list_grouped.append(group_item)
+        return list_grouped
 
-    def _create_general_ledger(
+    def _iter_general_ledger(
         self,
         gen_led_data,
         accounts_data,
         grouped_by,
-        rec_after_date_to_ids,
         hide_account_at_0,
+        period_move_lines=(),
     ):
-        general_ledger = []
+        """Yield the accounts of the report in code order. Their move lines,
+        and those of their group items, are iterators over the blocks of
+        ``period_move_lines``, which come in the same order: they must be
+        consumed in report order."""
         rounding = self.env.company.currency_id.rounding
-        for acc_id in gen_led_data.keys():
-            account = {}
+        item_order = self._get_gl_item_order(gen_led_data)
+        blocks = iter(period_move_lines)
+        for acc_id in self._get_gl_account_order(gen_led_data, accounts_data):
+            account = {
+                "code": accounts_data[acc_id]["code"],
+                "name": accounts_data[acc_id]["name"],
+                "type": "account",
+                "currency_id": accounts_data[acc_id]["currency_id"],
+                "centralized": accounts_data[acc_id]["centralized"],
+                "grouped_by": grouped_by,
+            }
             account.update(
                 {
-                    "code": accounts_data[acc_id]["code"],
-                    "name": accounts_data[acc_id]["name"],
-                    "type": "account",
-                    "currency_id": accounts_data[acc_id]["currency_id"],
-                    "centralized": accounts_data[acc_id]["centralized"],
-                    "grouped_by": grouped_by,
+                    key: value
+                    for key, value in gen_led_data[acc_id].items()
+                    if not isinstance(key, int)
                 }
             )
             if not gen_led_data[acc_id][grouped_by]:
-                account = self._create_account(
-                    account, acc_id, gen_led_data, rec_after_date_to_ids
-                )
-                if (
-                    hide_account_at_0
-                    and float_is_zero(
-                        gen_led_data[acc_id]["init_bal"]["balance"],
-                        precision_rounding=rounding,
-                    )
-                    and account["move_lines"] == []
+                if self._is_hidden_at_0(
+                    account, account.get("ml_count"), hide_account_at_0, rounding
                 ):
                     continue
+                account["move_lines"] = self._iter_gl_move_lines(
+                    blocks, acc_id, 0, account.get("ml_count")
+                )
             else:
-                account, list_grouped = self._get_list_grouped_item(
+                account["list_grouped"] = self._get_list_grouped_item(
                     gen_led_data[acc_id],
-                    account,
-                    rec_after_date_to_ids,
+                    item_order,
+                    blocks,
                     hide_account_at_0,
                     rounding,
                 )
-                account.update({"list_grouped": list_grouped})
-                if (
-                    hide_account_at_0
-                    and float_is_zero(
-                        gen_led_data[acc_id]["init_bal"]["balance"],
-                        precision_rounding=rounding,
-                    )
-                    and account["list_grouped"] == []
+                if self._is_hidden_at_0(
+                    account, account["list_grouped"], hide_account_at_0, rounding
                 ):
                     continue
-            general_ledger += [account]
-        return general_ledger
+            yield account
+
+    def _finalize_gl_account(
+        self,
+        account,
+        company,
+        foreign_currency,
+        centralize,
+        date_to,
+        grouped_by,
+        rec_after_date_to_ids,
+    ):
+        """Centralize the move lines of ``account`` if needed and set its
+        balances in foreign currency, from the totals of its lines."""
+        centralized = centralize and account["centralized"]
+        if centralized:
+            centralized_ml = self._get_centralized_ml(account, date_to, grouped_by)
+            account["move_lines"] = self._recalculate_cumul_balance(
+                centralized_ml,
+                account["init_bal"]["balance"],
+                rec_after_date_to_ids,
+            )
+            if account[grouped_by]:
+                account[grouped_by] = False
+                del account["list_grouped"]
+        # Set the bal_curr of the initial balance to 0 if it does not correspond
+        # (reducing the corresponding of the bal_curr of the initial balance).
+        if foreign_currency and (
+            not account["currency_id"]
+            or account["currency_id"] != company.currency_id.id
+        ):
+            account["fin_bal"]["bal_curr"] -= account["init_bal"]["bal_curr"]
+            account["init_bal"]["bal_curr"] = 0
+            for lg_item in account.get("list_grouped", []):
+                lg_item["fin_bal"]["bal_curr"] -= lg_item["init_bal"]["bal_curr"]
+                lg_item["init_bal"]["bal_curr"] = 0
+        # Set the fin_bal_currency_id value if the account does not have it set
+        # and there are move lines in a currency different from that of
+        # the company (USD for example).
+        fin_bal_currency_id = account["currency_id"]
+        if account["currency_id"] or not foreign_currency:
+            account["fin_bal_currency_id"] = fin_bal_currency_id
+            return account
+        account["fin_bal"]["bal_curr"] = account["init_bal"]["bal_curr"]
+        fin_bal_currency_ids = set()
+        # centralized entries have no currency
+        if "move_lines" in account and not centralized:
+            account["fin_bal"]["bal_curr"] += account.get("foreign_bal_curr", 0.0)
+            fin_bal_currency_ids.update(account.get("foreign_currency_ids", []))
+        elif "list_grouped" in account:
+            for lg_item in account["list_grouped"]:
+                foreign_bal_curr = lg_item.get("foreign_bal_curr", 0.0)
+                lg_item["fin_bal"]["bal_curr"] = (
+                    lg_item["init_bal"]["bal_curr"] + foreign_bal_curr
+                )
+                account["fin_bal"]["bal_curr"] += foreign_bal_curr
+                fin_bal_currency_ids.update(lg_item.get("foreign_currency_ids", []))
+        # If there is only 1 currency, we set that one as fin_bal_currency_id
+        # The use of different move lines with different currencies (EUR + GBP)
+        # will be excluded. We use a different field to avoid showing the initial
+        # balance and/or distorting data.
+        if len(fin_bal_currency_ids) == 1:
+            fin_bal_currency_id = fin_bal_currency_ids.pop()
+        account["fin_bal_currency_id"] = fin_bal_currency_id
+        return account
 
     @api.model
     def _calculate_centralization(self, centralized_ml, move_line, date_to):
@@ -758,8 +1002,23 @@ class GeneralLedgerReport(models.AbstractModel):
             list_centralized_ml += list(centralized_ml[jnl_id].values())
         return list_centralized_ml
 
-    # flake8: noqa: C901
     def _get_report_values(self, docids, data):
+        res = self._get_streamed_report_values(docids, data)
+        general_ledger = []
+        for account in res["general_ledger"]:
+            if "move_lines" in account:
+                account["move_lines"] = list(account["move_lines"])
+            for group_item in account.get("list_grouped", []):
+                group_item["move_lines"] = list(group_item["move_lines"])
+            general_ledger.append(account)
+        res["general_ledger"] = general_ledger
+        return res
+
+    def _get_streamed_report_values(self, docids, data):
+        """Same as ``_get_report_values``, but ``general_ledger`` is an
+        iterator over the accounts, whose move lines are iterators too: they
+        are read from the database while the report is rendered, in report
+        order, instead of being loaded all at once."""
         res = super()._get_report_values(docids, data)
         wizard_id = data["wizard_id"]
         company = self.env["res.company"].browse(data["company_id"])
@@ -798,6 +1057,7 @@ class GeneralLedgerReport(models.AbstractModel):
             taxes_data,
             analytic_data,
             rec_after_date_to_ids,
+            related,
         ) = self._get_period_ml_data(
             account_ids,
             partner_ids,
@@ -811,85 +1071,40 @@ class GeneralLedgerReport(models.AbstractModel):
             extra_domain,
             grouped_by,
         )
-        general_ledger = self._create_general_ledger(
+        period_move_lines = self._iter_period_move_lines(
+            account_ids,
+            partner_ids,
+            company_id,
+            only_posted_moves,
+            date_from,
+            date_to,
             gen_ld_data,
             accounts_data,
+            journals_data,
+            cost_center_ids,
+            extra_domain,
             grouped_by,
             rec_after_date_to_ids,
-            hide_account_at_0,
+            related,
+        )
+        general_ledger = (
+            self._finalize_gl_account(
+                account,
+                company,
+                foreign_currency,
+                centralize,
+                date_to,
+                grouped_by,
+                rec_after_date_to_ids,
+            )
+            for account in self._iter_general_ledger(
+                gen_ld_data,
+                accounts_data,
+                grouped_by,
+                hide_account_at_0,
+                period_move_lines,
+            )
         )
-        if centralize:
-            for account in general_ledger:
-                if account["centralized"]:
-                    centralized_ml = self._get_centralized_ml(
-                        account, date_to, grouped_by
-                    )
-                    account["move_lines"] = centralized_ml
-                    account["move_lines"] = self._recalculate_cumul_balance(
-                        account["move_lines"],
-                        gen_ld_data[account["id"]]["init_bal"]["balance"],
-                        rec_after_date_to_ids,
-                    )
-                    if account[grouped_by]:
-                        account[grouped_by] = False
-                        del account["list_grouped"]
-        general_ledger = sorted(general_ledger, key=lambda k: k["code"])
-        # Set the bal_curr of the initial balance to 0 if it does not correspond
-        # (reducing the corresponding of the bal_curr of the initial balance).
-        for gl_item in general_ledger:
-            if not foreign_currency:
-                continue
-            if (
-                not gl_item["currency_id"]
-                or gl_item["currency_id"] != company.currency_id.id
-            ):
-                gl_item["fin_bal"]["bal_curr"] -= gl_item["init_bal"]["bal_curr"]
-                gl_item["init_bal"]["bal_curr"] = 0
-                if "list_grouped" in gl_item:
-                    for lg_item in gl_item["list_grouped"]:
-                        lg_item["fin_bal"]["bal_curr"] -= lg_item["init_bal"][
-                            "bal_curr"
-                        ]
-                        lg_item["init_bal"]["bal_curr"] = 0
-        # Set the fin_bal_currency_id value if the account does not have it set
-        # and there are move lines in a currency different from that of
-        # the company (USD for example).
-        for gl_item in general_ledger:
-            fin_bal_currency_ids = []
-            fin_bal_currency_id = gl_item["currency_id"]
-            if gl_item["currency_id"] or not foreign_currency:
-                gl_item["fin_bal_currency_id"] = fin_bal_currency_id
-                continue
-            gl_item["fin_bal"]["bal_curr"] = gl_item["init_bal"]["bal_curr"]
-            if "move_lines" in gl_item:
-                for ml in gl_item["move_lines"]:
-                    ml_currency_id = (
-                        ml["currency_id"][0] if ml["currency_id"] else False
-                    )
-                    if ml_currency_id and ml_currency_id != company.currency_id.id:
-                        gl_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
-                        if ml_currency_id not in fin_bal_currency_ids:
-                            fin_bal_currency_ids.append(ml_currency_id)
-            elif "list_grouped" in gl_item:
-                fin_bal_currency_ids = []
-                for lg_item in gl_item["list_grouped"]:
-                    lg_item["fin_bal"]["bal_curr"] = lg_item["init_bal"]["bal_curr"]
-                    for ml in lg_item["move_lines"]:
-                        ml_currency_id = (
-                            ml["currency_id"][0] if ml["currency_id"] else False
-                        )
-                        if ml_currency_id and ml_currency_id != company.currency_id.id:
-                            lg_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
-                            gl_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
-                            if ml_currency_id not in fin_bal_currency_ids:
-                                fin_bal_currency_ids.append(ml_currency_id)
-            # If there is only 1 currency, we set that one as fin_bal_currency_id
-            # The use of different move lines with different currencies (EUR + GBP)
-            # will be excluded. We use a different field to avoid showing the initial
-            # balance and/or distorting data.
-            if not gl_item["currency_id"] and len(fin_bal_currency_ids) == 1:
-                fin_bal_currency_id = fin_bal_currency_ids[0]
-            gl_item["fin_bal_currency_id"] = fin_bal_currency_id
         res.update(
             {
                 "doc_ids": [wizard_id],
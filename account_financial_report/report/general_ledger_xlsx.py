@@ -132,9 +132,11 @@ class GeneralLedgerXslx(models.AbstractModel):
 
     # flake8: noqa: C901
     def _generate_report_content(self, workbook, report, data, report_data):
+        # the move lines are read while they are written: the sheet is written
+        # in constant memory whatever the number of lines
         res_data = self.env[
             "report.account_financial_report.general_ledger"
-        ]._get_report_values(report, data)
+        ]._get_streamed_report_values(report, data)
         general_ledger = res_data["general_ledger"]
         accounts_data = res_data["accounts_data"]
         journals_data = res_data["journals_data"]
@@ -6,6 +6,10 @@ import operator
 from collections import defaultdict
 
 from odoo import models
+from odoo.tools import SQL, split_every
+
+# number of moves whose lines are loaded at a time by _iter_report_moves
+MOVES_BATCH_SIZE = 1000
 
 
 class JournalLedgerReport(models.AbstractModel):
@@ -300,6 +304,98 @@ class JournalLedgerReport(models.AbstractModel):
                 ]
         return journals_taxes_data_2
 
+    def _get_report_moves_query(self, wizard, journal_ids, journal_order):
+        """SQL of the moves of the report, in the order of the journals of
+        ``journal_order`` first, with the auto-sequence of each move: moves
+        are numbered downwards in the default order of the moves, as the
+        lines are in ``_get_move_lines``."""
+        Move = self.env["account.move"]
+        query = Move._search(
+            self._get_moves_domain(wizard, journal_ids),
+            order=self._get_moves_order(wizard, journal_ids) or Move._order,
+        )
+        if journal_order:
+            query.order = SQL(
+                "array_position(%s::int[], %s), %s",
+                journal_order,
+                SQL.identifier(query.table, "journal_id"),
+                query.order,
+            )
+        return query.select(
+            SQL.identifier(query.table, "id"),
+            SQL.identifier(query.table, "journal_id"),
+            SQL(
+                "COUNT(*) OVER () - ROW_NUMBER() OVER (ORDER BY %s) AS auto_sequence",
+                Move._order_to_sql(Move._order, query),
+            ),
+        )
+
+    def _iter_report_moves(self, wizard, journal_ids, journal_order, res_data):
+        """Yield the moves of the report with their ``report_move_lines``,
+        loading them by batches. The accounts, partners, currencies and taxes
+        of each batch are added to the dicts of ``res_data``, whose
+        ``move_ids_data`` only holds the current batch."""
+        rows = self._iter_query_rows(
+            self._get_report_moves_query(wizard, journal_ids, journal_order)
+        )
+        for batch in split_every(MOVES_BATCH_SIZE, rows, list):
+            moves = self.env["account.move"].browse([row["id"] for row in batch])
+            (
+                _move_line_ids,
+                move_lines_data,
+                account_ids_data,
+                partner_ids_data,
+                currency_ids_data,
+                tax_line_ids_data,
+                _move_line_ids_taxes_data,
+            ) = self._get_move_lines(moves.ids, wizard, journal_ids)
+            res_data["account_ids_data"].update(account_ids_data)
+            res_data["partner_ids_data"].update(partner_ids_data)
+            res_data["currency_ids_data"].update(currency_ids_data)
+            res_data["tax_line_data"].update(tax_line_ids_data)
+            res_data["move_ids_data"].clear()
+            for move, row in zip(moves, batch):
+                move_data = self._get_moves_data(move)
+                move_data["report_move_lines"] = move_lines_data.get(move.id, [])
+                for move_line_data in move_data["report_move_lines"]:
+                    move_line_data["auto_sequence"] = str(row["auto_sequence"]).zfill(6)
+                res_data["move_ids_data"][move.id] = move_data
+                yield move_data
+            # the records of the batch are not needed anymore
+            self.env["account.move.line"].invalidate_model()
+            self.env["account.move"].invalidate_model()
+
+    def _get_journal_totals(self, wizard, journal_ids):
+        """Return ``{journal_id: {"debit", "credit", "move_count"}}``."""
+        moves_domain = self._get_moves_domain(wizard, journal_ids)
+        totals = {}
+        for journal, move_count in self.env["account.move"]._read_group(
+            moves_domain, ["journal_id"], ["__count"]
+        ):
+            totals[journal.id] = {
+                "debit": 0.0,
+                "credit": 0.0,
+                "move_count": move_count,
+            }
+        move_lines_domain = self._get_move_lines_domain(
+            self.env["account.move"]._search(moves_domain), wizard, journal_ids
+        )
+        for journal, debit, credit in self.env["account.move.line"]._read_group(
+            move_lines_domain, ["journal_id"], ["debit:sum", "credit:sum"]
+        ):
+            totals[journal.id].update({"debit": debit, "credit": credit})
+        return totals
+
+    def _iter_journal_moves(self, journal_blocks, journal_id, move_count):
+        """Yield the moves of a journal, taken from the shared
+        ``journal_blocks`` when iterated."""
+        if not move_count:
+            return
+        for block_journal_id, moves in journal_blocks:
+            if block_journal_id == journal_id:
+                yield from moves
+                return
+
     def _get_report_values(self, docids, data):
         res = super()._get_report_values(docids, data)
         wizard_id = data["wizard_id"]
@@ -378,3 +474,56 @@ class JournalLedgerReport(models.AbstractModel):
             }
         )
         return res
+
+    def _get_streamed_report_values(self, docids, data):
+        """Same as ``_get_report_values``, but ``Moves`` and the
+        ``report_moves`` of the journal ledgers are iterators over the moves,
+        read by batches while the report is rendered, in report order. Only
+        the totals of the journals are computed beforehand: their tax
+        summaries are left empty."""
+        res = super()._get_report_values(docids, data)
+        wizard_id = data["wizard_id"]
+        wizard = self.env["journal.ledger.report.wizard"].browse(wizard_id)
+        company = self.env["res.company"].browse(data["company_id"])
+        journal_ids = data["journal_ids"]
+        journal_ledgers_data = self._get_journal_ledgers(wizard, journal_ids, company)
+        res.update(
+            {
+                "doc_ids": [wizard_id],
+                "doc_model": "journal.ledger.report.wizard",
+                "docs": wizard,
+                "group_option": data["group_option"],
+                "foreign_currency": data["foreign_currency"],
+                "with_account_name": data["with_account_name"],
+                "company_name": company.display_name,
+                "currency_name": company.currency_id.name,
+                "date_from": data["date_from"],
+                "date_to": data["date_to"],
+                "move_target": data["move_target"],
+                "with_auto_sequence": data["with_auto_sequence"],
+                "account_ids_data": {},
+                "partner_ids_data": {},
+                "currency_ids_data": {},
+                "move_ids_data": {},
+                "tax_line_data": {},
+                "move_line_ids_taxes_data": {},
+                "Journal_Ledgers": journal_ledgers_data,
+            }
+        )
+        journal_order = []
+        if data["group_option"] == "journal":
+            journal_order = [ledger["id"] for ledger in journal_ledgers_data]
+        moves = self._iter_report_moves(wizard, journal_ids, journal_order, res)
+        journal_totals = self._get_journal_totals(wizard, journal_ids)
+        journal_blocks = itertools.groupby(moves, operator.itemgetter("journal_id"))
+        for journal_ledger_data in journal_ledgers_data:
+            journal_id = journal_ledger_data["id"]
+            totals = journal_totals.get(journal_id, {})
+            journal_ledger_data["tax_lines"] = []
+            journal_ledger_data["report_moves"] = self._iter_journal_moves(
+                journal_blocks, journal_id, totals.get("move_count")
+            )
+            for item in ["debit", "credit"]:
+                journal_ledger_data[item] += totals.get(item, 0.0)
+        res["Moves"] = moves
+        return res
@@ -157,9 +157,11 @@ class JournalLedgerXslx(models.AbstractModel):
         ]
 
     def _generate_report_content(self, workbook, report, data, report_data):
+        # the moves are read while they are written: the sheets are written in
+        # constant memory whatever the number of moves
         res_data = self.env[
             "report.account_financial_report.journal_ledger"
-        ]._get_report_values(report, data)
+        ]._get_streamed_report_values(report, data)
         group_option = report.group_option
         if group_option == "journal":
             for ledger in res_data["Journal_Ledgers"]:
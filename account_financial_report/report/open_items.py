@@ -68,6 +68,7 @@ class OpenItemsReport(models.AbstractModel):
         company_id,
         date_from,
         grouped_by,
+        partial_reconciled=None,
     ):
         domain = self._get_move_lines_domain_not_reconciled(
             company_id, account_ids, partner_ids, only_posted_moves, date_from
@@ -80,13 +81,17 @@ class OpenItemsReport(models.AbstractModel):
         group_ids = set()
         partners_data = {}
         if date_at_object < date.today():
+            if partial_reconciled is None:
+                partial_reconciled = self._get_account_partial_reconciled(
+                    company_id, date_at_object
+                )
             (
                 acc_partial_rec,
                 debit_amount,
                 credit_amount,
                 debit_amount_currency,
                 credit_amount_currency,
-            ) = self._get_account_partial_reconciled(company_id, date_at_object)
+            ) = partial_reconciled
             if acc_partial_rec:
                 ml_ids = list(map(operator.itemgetter("id"), move_lines))
                 debit_ids = list(
@@ -223,7 +228,7 @@ class OpenItemsReport(models.AbstractModel):
                 for prt_id in open_items_move_lines_data[acc_id]:
                     for move_line in open_items_move_lines_data[acc_id][prt_id]:
                         move_lines += [move_line]
-                move_lines = sorted(move_lines, key=lambda k: (k["date"]))
+                move_lines = sorted(move_lines, key=lambda k: k["date"])
                 new_open_items[acc_id] = move_lines
         else:
             for acc_id in account_ids_sorted:
@@ -300,6 +305,104 @@ class OpenItemsReport(models.AbstractModel):
         )
         return res
 
+    def _iter_open_items(
+        self,
+        account_ids,
+        partner_ids,
+        date_at_object,
+        only_posted_moves,
+        company_id,
+        date_from,
+        grouped_by,
+        show_partner_details,
+        res_data,
+    ):
+        """Yield ``(account_id, open_items)`` in account code order, computing
+        the open items of one account at a time. The partners, journals,
+        accounts and totals of each account are added to the dicts of
+        ``res_data`` before it is yielded."""
+        partial_reconciled = None
+        if date_at_object < date.today():
+            partial_reconciled = self._get_account_partial_reconciled(
+                company_id, date_at_object
+            )
+        accounts = self.env["account.account"].browse(account_ids)
+        for account in accounts.sorted(lambda account: account.code or ""):
+            (
+                _move_lines_data,
+                partners_data,
+                journals_data,
+                accounts_data,
+                open_items_move_lines_data,
+            ) = self._get_data(
+                [account.id],
+                partner_ids,
+                date_at_object,
+                only_posted_moves,
+                company_id,
+                date_from,
+                grouped_by,
+                partial_reconciled=partial_reconciled,
+            )
+            # the lines read by _get_data are not needed anymore
+            self.env["account.move.line"].invalidate_model()
+            if account.id not in open_items_move_lines_data:
+                continue
+            res_data["partners_data"].update(partners_data)
+            res_data["journals_data"].update(journals_data)
+            res_data["accounts_data"].update(accounts_data)
+            res_data["total_amount"].update(
+                self._calculate_amounts(open_items_move_lines_data)
+            )
+            open_items_move_lines_data = self._order_open_items_by_date(
+                open_items_move_lines_data,
+                show_partner_details,
+                partners_data,
+                accounts_data,
+            )
+            yield account.id, open_items_move_lines_data[account.id]
+
+    def _get_streamed_report_values(self, docids, data):
+        """Same as ``_get_report_values``, but ``Open_Items`` is an iterator
+        over ``(account_id, open_items)`` pairs, computed one account at a
+        time while the report is rendered. The other dicts are filled as the
+        accounts are yielded."""
+        res = super()._get_report_values(docids, data)
+        wizard_id = data["wizard_id"]
+        company = self.env["res.company"].browse(data["company_id"])
+        date_at_object = datetime.strptime(data["date_at"], "%Y-%m-%d").date()
+        res.update(
+            {
+                "doc_ids": [wizard_id],
+                "doc_model": "open.items.report.wizard",
+                "docs": self.env["open.items.report.wizard"].browse(wizard_id),
+                "foreign_currency": data["foreign_currency"],
+                "show_partner_details": data["show_partner_details"],
+                "company_name": company.display_name,
+                "currency_name": company.currency_id.name,
+                "date_at": date_at_object.strftime("%d/%m/%Y"),
+                "hide_account_at_0": data["hide_account_at_0"],
+                "target_move": data["target_move"],
+                "journals_data": {},
+                "partners_data": {},
+                "accounts_data": {},
+                "total_amount": {},
+                "grouped_by": data["grouped_by"],
+            }
+        )
+        res["Open_Items"] = self._iter_open_items(
+            data["account_ids"],
+            data["partner_ids"],
+            date_at_object,
+            data["only_posted_moves"],
+            data["company_id"],
+            data["date_from"],
+            data["grouped_by"],
+            data["show_partner_details"],
+            res,
+        )
+        return res
+
     def _get_ml_fields(self):
         return self.COMMON_ML_FIELDS + [
             "amount_residual",
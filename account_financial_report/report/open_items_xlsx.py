@@ -221,13 +221,12 @@ class OpenItemsXslx(models.AbstractModel):
     def _generate_report_content_by_partner(
         self, workbook, report, data, report_data, res_data
     ):
-        Open_items = res_data["Open_Items"]
         accounts_data = res_data["accounts_data"]
         partners_data = res_data["partners_data"]
         journals_data = res_data["journals_data"]
         total_amount = res_data["total_amount"]
         show_partner_details = res_data["show_partner_details"]
-        for account_id in Open_items.keys():
+        for account_id, account_open_items in res_data["Open_Items"]:
             # Write account title
             self.write_array_title(
                 accounts_data[account_id]["code"]
@@ -236,9 +235,9 @@ class OpenItemsXslx(models.AbstractModel):
                 report_data,
             )
             # For each partner
-            if Open_items[account_id]:
+            if account_open_items:
                 if show_partner_details:
-                    for partner_id in Open_items[account_id]:
+                    for partner_id in account_open_items:
                         type_object = "partner"
                         # Write partner title
                         self.write_array_title(
@@ -249,7 +248,7 @@ class OpenItemsXslx(models.AbstractModel):
                         self.write_array_header(report_data)
 
                         # Display account move lines
-                        for line in Open_items[account_id][partner_id]:
+                        for line in account_open_items[partner_id]:
                             line.update(
                                 {
                                     "account": accounts_data[account_id]["code"],
@@ -285,7 +284,7 @@ class OpenItemsXslx(models.AbstractModel):
                     self.write_array_header(report_data)
 
                     # Display account move lines
-                    for line in Open_items[account_id]:
+                    for line in account_open_items:
                         line.update(
                             {
                                 "account": accounts_data[account_id]["code"],
@@ -308,16 +307,16 @@ class OpenItemsXslx(models.AbstractModel):
                     report_data["row_pos"] += 2
 
     def _generate_report_content(self, workbook, report, data, report_data):
-        res_data = self.env[
-            "report.account_financial_report.open_items"
-        ]._get_report_values(report, data)
-        show_partner_details = res_data["show_partner_details"]
-        grouped_by = res_data["grouped_by"]
-        if grouped_by == "salesperson" and show_partner_details:
+        report_model = self.env["report.account_financial_report.open_items"]
+        if data["grouped_by"] == "salesperson" and data["show_partner_details"]:
+            # one sheet per salesperson, spanning all the accounts
+            res_data = report_model._get_report_values(report, data)
             return self._generate_report_content_by_salesperson(
                 workbook, report, data, report_data, res_data
             )
         else:
+            # the accounts are computed one at a time while they are written
+            res_data = report_model._get_streamed_report_values(report, data)
             return self._generate_report_content_by_partner(
                 workbook, report, data, report_data, res_data
             )
@@ -3,9 +3,11 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+from collections import defaultdict
 
 from odoo import _, api, models
 from odoo.exceptions import UserError
+from odoo.tools import SQL
 from odoo.tools.float_utils import float_is_zero
 
 
@@ -191,11 +193,7 @@ class TrialBalanceReport(models.AbstractModel):
             only_posted_moves,
             show_partner_details,
         )
-        initial_balances = self.env["account.move.line"].read_group(
-            domain=domain,
-            fields=["account_id", "balance", "amount_currency:sum"],
-            groupby=["account_id", "currency_id"],
-        )
+        initial_balances = self._read_group_balances(domain, ["account_id"])
         pl_initial_balance = 0.0
         pl_initial_currency_balance = 0.0
         for initial_balance in initial_balances:
@@ -206,12 +204,122 @@ class TrialBalanceReport(models.AbstractModel):
                 )
         return pl_initial_balance, pl_initial_currency_balance
 
+    def _get_tb_ml_sums(self, domain, group_partner=False, group_analytic=False):
+        """Sum the move lines matching ``domain`` per account and, in the
+        same statement, per account and partner and per account and analytic
+        account when asked. Return ``{(account_id, partner_id,
+        analytic_account_id): sums}``: the partner and analytic keys are None
+        on the sums that are not grouped by them, 0 for the lines without
+        partner or analytic account. Amounts in currency are summed whatever
+        their currency, as on the report. The balance snapshot serves the
+        sums not grouped by analytic account whenever ``domain`` allows it."""
+        if not group_analytic:
+            sums = self.env["account.balance.snapshot"]._get_domain_sums(
+                domain, group_partner
+            )
+            if sums is not None:
+                return {
+                    (acc_id, prt_id, None): values
+                    for (acc_id, prt_id), values in sums.items()
+                }
+        # the lines are read with plain SQL, pending ORM writes must be flushed
+        self.env.flush_all()
+        query = self.env["account.move.line"]._search(domain)
+        grouping_sets = [SQL("(lines.account_id)")]
+        # GROUPING() only takes the expressions of the grouping sets
+        partner = SQL("NULL::int")
+        if group_partner:
+            grouping_sets.append(SQL("(lines.account_id, lines.partner_id)"))
+            partner = SQL(
+                "CASE WHEN GROUPING(lines.partner_id) = 0 THEN lines.partner_id END"
+            )
+        sums = SQL(
+            """SUM(lines.debit) AS debit, SUM(lines.credit) AS credit,
+            SUM(lines.balance) AS balance,
+            SUM(lines.amount_currency) AS amount_currency"""
+        )
+        statement = SQL(
+            """
+            SELECT lines.account_id, %(partner)s AS partner_id,
+                NULL::int AS analytic_account_id, %(sums)s
+            FROM lines
+            GROUP BY GROUPING SETS (%(grouping_sets)s)
+            """,
+            partner=partner,
+            sums=sums,
+            grouping_sets=SQL(", ").join(grouping_sets),
+        )
+        if group_analytic:
+            # a line counts in each of its analytic accounts
+            field = self.env["account.move.line"]._fields["analytic_account_ids"]
+            statement = SQL(
+                """%(statement)s
+                UNION ALL
+                SELECT lines.account_id, NULL::int,
+                    COALESCE(rel.%(analytic_column)s, 0), %(sums)s
+                FROM lines
+                LEFT JOIN %(relation)s rel ON rel.%(line_column)s = lines.id
+                GROUP BY lines.account_id, COALESCE(rel.%(analytic_column)s, 0)
+                """,
+                statement=statement,
+                sums=sums,
+                relation=SQL.identifier(field.relation),
+                line_column=SQL.identifier(field.column1),
+                analytic_column=SQL.identifier(field.column2),
+            )
+        self.env.cr.execute(
+            SQL(
+                """
+                WITH lines AS (
+                    SELECT aml.id, aml.account_id,
+                        COALESCE(aml.partner_id, 0) AS partner_id,
+                        aml.debit, aml.credit, aml.balance, aml.amount_currency
+                    FROM account_move_line aml
+                    WHERE aml.id IN %s
+                )
+                %s
+                """,
+                query.subselect(),
+                statement,
+            )
+        )
+        return {
+            (row["account_id"], row["partner_id"], row["analytic_account_id"]): row
+            for row in self.env.cr.dictfetchall()
+        }
+
+    def _add_tb_ml_sums(self, sums, other_sums):
+        """Add ``other_sums`` to ``sums``, both as per ``_get_tb_ml_sums``."""
+        for key, other in other_sums.items():
+            if key not in sums:
+                sums[key] = dict(other)
+                continue
+            for field_name in ["debit", "credit", "balance", "amount_currency"]:
+                sums[key][field_name] += other[field_name]
+        return sums
+
+    def _index_tb_ml_sums(self, sums):
+        """Split the sums of ``_get_tb_ml_sums`` into
+        ``({account_id: sums}, {account_id: {partner_id: sums}},
+        {account_id: {analytic_account_id: sums}})``."""
+        acc_sums = {}
+        prt_sums = defaultdict(dict)
+        analytic_sums = defaultdict(dict)
+        for (acc_id, prt_id, analytic_id), values in sums.items():
+            if prt_id is not None:
+                prt_sums[acc_id][prt_id] = values
+            elif analytic_id is not None:
+                analytic_sums[acc_id][analytic_id] = values
+            else:
+                acc_sums[acc_id] = values
+        return acc_sums, prt_sums, analytic_sums
+
     @api.model
     def _compute_account_amount(
         self, total_amount, tb_initial_acc, tb_period_acc, foreign_currency
     ):
         for tb in tb_period_acc:
-            acc_id = tb["account_id"][0]
+            acc_id = tb["account_id"]
             total_amount[acc_id] = self._prepare_total_amount(tb, foreign_currency)
             total_amount[acc_id]["credit"] = tb["credit"]
             total_amount[acc_id]["debit"] = tb["debit"]
@@ -219,22 +327,9 @@ class TrialBalanceReport(models.AbstractModel):
             total_amount[acc_id]["initial_balance"] = 0.0
             if foreign_currency:
                 total_amount[acc_id]["initial_currency_balance"] = 0.0
-            if "__context" in tb and "group_by" in tb["__context"]:
-                group_by = tb["__context"]["group_by"][0]
+            if "group_by_data" in tb:
                 gb_data = {}
-                tb_grouped = self.env["account.move.line"].read_group(
-                    domain=tb["__domain"],
-                    fields=[
-                        group_by,
-                        "debit",
-                        "credit",
-                        "balance",
-                        "amount_currency:sum",
-                    ],
-                    groupby=[group_by],
-                )
-                for tb2 in tb_grouped:
-                    gb_id = tb2[group_by][0] if tb2[group_by] else 0
+                for gb_id, tb2 in tb["group_by_data"].items():
                     gb_data[gb_id] = self._prepare_total_amount(tb2, foreign_currency)
                     gb_data[gb_id]["credit"] = tb2["credit"]
                     gb_data[gb_id]["debit"] = tb2["debit"]
@@ -242,7 +337,7 @@ class TrialBalanceReport(models.AbstractModel):
                     gb_data[gb_id]["initial_balance"] = 0.0
                     if foreign_currency:
                         gb_data[gb_id]["initial_currency_balance"] = 0.0
-                total_amount[acc_id]["group_by"] = group_by
+                total_amount[acc_id]["group_by"] = tb["group_by"]
                 total_amount[acc_id]["group_by_data"] = gb_data
         for tb in tb_initial_acc:
             acc_id = tb["account_id"]
@@ -252,6 +347,12 @@ class TrialBalanceReport(models.AbstractModel):
                 total_amount[acc_id]["group_by_data"][0] = self._prepare_total_amount(
                     tb, foreign_currency
                 )
+                if tb.get("group_by_data"):
+                    total_amount[acc_id]["group_by"] = tb["group_by"]
+                    total_amount[acc_id]["group_by_data"] = {
+                        gb_key: self._prepare_total_amount(tb2, foreign_currency)
+                        for gb_key, tb2 in tb["group_by_data"].items()
+                    }
             else:
                 total_amount[acc_id]["initial_balance"] = tb["balance"]
                 total_amount[acc_id]["ending_balance"] += tb["balance"]
@@ -334,7 +435,7 @@ class TrialBalanceReport(models.AbstractModel):
         partners_ids = set()
         partners_data = {}
         for tb in tb_period_prt:
-            acc_id = tb["account_id"][0]
+            acc_id = tb["account_id"]
             prt_id = tb["partner_id"][0] if tb["partner_id"] else 0
             if prt_id not in partners_ids:
                 partner_name = (
@@ -351,7 +452,7 @@ class TrialBalanceReport(models.AbstractModel):
             total_amount[acc_id][prt_id]["partner_name"] = partners_data[prt_id]["name"]
             partners_ids.add(prt_id)
         for tb in tb_initial_prt:
-            acc_id = tb["account_id"][0]
+            acc_id = tb["account_id"]
             prt_id = tb["partner_id"][0] if tb["partner_id"] else 0
             if prt_id not in partners_ids:
                 partner_name = (
@@ -427,14 +528,7 @@ class TrialBalanceReport(models.AbstractModel):
             # don't include unaffected earnings account
             unaffected_earnings_account = False
         accounts = self.env["account.account"].search(accounts_domain)
-        tb_initial_acc = []
-        for account in accounts:
-            tb_initial_acc.append(
-                {"account_id": account.id, "balance": 0.0, "amount_currency": 0.0}
-            )
-        groupby_fields = ["account_id", "currency_id"]
-        if grouped_by:
-            groupby_fields.append("analytic_account_ids")
+        group_by = "analytic_account_ids" if grouped_by else False
         initial_domain_bs = self._get_initial_balances_bs_ml_domain(
             account_ids,
             journal_ids,
@@ -444,11 +538,6 @@ class TrialBalanceReport(models.AbstractModel):
             only_posted_moves,
             show_partner_details,
         )
-        tb_initial_acc_bs = self.env["account.move.line"].read_group(
-            domain=initial_domain_bs,
-            fields=["account_id", "balance", "amount_currency:sum"],
-            groupby=groupby_fields,
-        )
         initial_domain_pl = self._get_initial_balances_pl_ml_domain(
             account_ids,
             journal_ids,
@@ -459,42 +548,6 @@ class TrialBalanceReport(models.AbstractModel):
             show_partner_details,
             fy_start_date,
         )
-        tb_initial_acc_pl = self.env["account.move.line"].read_group(
-            domain=initial_domain_pl,
-            fields=["account_id", "balance", "amount_currency:sum"],
-            groupby=groupby_fields,
-        )
-        tb_initial_acc_rg = tb_initial_acc_bs + tb_initial_acc_pl
-        for account_rg in tb_initial_acc_rg:
-            element = list(
-                filter(
-                    lambda acc_dict: acc_dict["account_id"]
-                    == account_rg["account_id"][0],
-                    tb_initial_acc,
-                )
-            )
-            if element:
-                element[0]["balance"] += account_rg["balance"]
-                element[0]["amount_currency"] += account_rg["amount_currency"]
-                if "__context" in account_rg and "group_by" in account_rg["__context"]:
-                    group_by = account_rg["__context"]["group_by"][0]
-                    gb_data = {}
-                    account_rg_grouped = self.env["account.move.line"].read_group(
-                        domain=account_rg["__domain"],
-                        fields=[group_by, "balance", "amount_currency:sum"],
-                        groupby=[group_by],
-                    )
-                    for a_rg2 in account_rg_grouped:
-                        gb_id = a_rg2[group_by][0] if a_rg2[group_by] else 0
-                        gb_data[gb_id] = {
-                            "balance": a_rg2["balance"],
-                            "amount_currency": a_rg2["amount_currency"],
-                        }
-                    element[0]["group_by"] = group_by
-                    element[0]["group_by_data"] = gb_data
-        if hide_account_at_0:
-            tb_initial_acc = [p for p in tb_initial_acc if p["balance"] != 0]
-
         period_domain = self._get_period_ml_domain(
             account_ids,
             journal_ids,
@@ -505,40 +558,65 @@ class TrialBalanceReport(models.AbstractModel):
             only_posted_moves,
             show_partner_details,
         )
-        tb_period_acc = self.env["account.move.line"].read_group(
-            domain=period_domain,
-            fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
-            groupby=groupby_fields,
+        # all the amounts of the report come from these queries, indexed by
+        # account, then by partner or analytic account
+        initial_sums = self._add_tb_ml_sums(
+            self._get_tb_ml_sums(initial_domain_bs, show_partner_details, group_by),
+            self._get_tb_ml_sums(initial_domain_pl, show_partner_details, group_by),
         )
-
+        initial_acc, initial_prt, initial_analytic = self._index_tb_ml_sums(
+            initial_sums
+        )
+        period_acc, period_prt, period_analytic = self._index_tb_ml_sums(
+            self._get_tb_ml_sums(period_domain, show_partner_details, group_by)
+        )
+        tb_initial_acc = []
+        for account in accounts:
+            tb = {"account_id": account.id, "balance": 0.0, "amount_currency": 0.0}
+            if account.id in initial_acc:
+                tb["balance"] = initial_acc[account.id]["balance"]
+                tb["amount_currency"] = initial_acc[account.id]["amount_currency"]
+                if group_by:
+                    tb["group_by"] = group_by
+                    tb["group_by_data"] = initial_analytic[account.id]
+            tb_initial_acc.append(tb)
+        if hide_account_at_0:
+            tb_initial_acc = [p for p in tb_initial_acc if p["balance"] != 0]
+        tb_period_acc = []
+        for account in accounts:
+            if account.id not in period_acc:
+                continue
+            tb = dict(period_acc[account.id])
+            if group_by:
+                tb["group_by"] = group_by
+                tb["group_by_data"] = period_analytic[account.id]
+            tb_period_acc.append(tb)
         if show_partner_details:
-            tb_initial_prt_bs = self.env["account.move.line"].read_group(
-                domain=initial_domain_bs,
-                fields=["account_id", "partner_id", "balance", "amount_currency:sum"],
-                groupby=["account_id", "partner_id", "currency_id"],
-                lazy=False,
-            )
-            tb_initial_prt_pl = self.env["account.move.line"].read_group(
-                domain=initial_domain_pl,
-                fields=["account_id", "partner_id", "balance", "amount_currency:sum"],
-                groupby=["account_id", "partner_id", "currency_id"],
-            )
-            tb_initial_prt = tb_initial_prt_bs + tb_initial_prt_pl
+            partner_names = {
+                partner.id: partner.display_name
+                for partner in self.env["res.partner"].browse(
+                    {
+                        prt_id
+                        for prt_sums in [initial_prt, period_prt]
+                        for acc_prt_sums in prt_sums.values()
+                        for prt_id in acc_prt_sums
+                        if prt_id
+                    }
+                )
+            }
+            tb_initial_prt = []
+            tb_period_prt = []
+            for prt_sums, tb_prt in [
+                (initial_prt, tb_initial_prt),
+                (period_prt, tb_period_prt),
+            ]:
+                for account in accounts:
+                    for prt_id, values in prt_sums.get(account.id, {}).items():
+                        tb = dict(values)
+                        tb["partner_id"] = prt_id and (prt_id, partner_names[prt_id])
+                        tb_prt.append(tb)
             if hide_account_at_0:
                 tb_initial_prt = [p for p in tb_initial_prt if p["balance"] != 0]
-            tb_period_prt = self.env["account.move.line"].read_group(
-                domain=period_domain,
-                fields=[
-                    "account_id",
-                    "partner_id",
-                    "debit",
-                    "credit",
-                    "balance",
-                    "amount_currency:sum",
-                ],
-                groupby=["account_id", "currency_id", "partner_id"],
-                lazy=False,
-            )
         total_amount = {}
         partners_data = []
         total_amount = self._compute_account_amount(
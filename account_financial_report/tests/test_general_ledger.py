@@ -101,7 +101,7 @@ class TestGeneralLedgerReport(AccountTestInvoicingCommon):
         move = self.env["account.move"].create(move_vals)
         move.action_post()
 
-    def _get_report_lines(self, with_partners=False, account_ids=False):
+    def _get_report_lines(self, with_partners=False, account_ids=False, streamed=False):
         centralize = True
         if with_partners:
             centralize = False
@@ -119,9 +119,10 @@ class TestGeneralLedgerReport(AccountTestInvoicingCommon):
             }
         )
         data = general_ledger._prepare_report_data()
-        res_data = self.env[
-            "report.account_financial_report.general_ledger"
-        ]._get_report_values(general_ledger, data)
+        report_model = self.env["report.account_financial_report.general_ledger"]
+        if streamed:
+            return report_model._get_streamed_report_values(general_ledger, data)
+        res_data = report_model._get_report_values(general_ledger, data)
         return res_data
 
     @api.model
@@ -687,6 +688,155 @@ class TestGeneralLedgerReport(AccountTestInvoicingCommon):
         self.assertEqual(unaffected_fin_balance["credit"], 1000)
         self.assertEqual(unaffected_fin_balance["balance"], 500)
 
+    def test_05_cumulative_balance(self):
+        self._add_move(
+            date=self.previous_fy_date_end,
+            receivable_debit=1000,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=1000,
+        )
+        self._add_move(
+            date=self.fy_date_end,
+            receivable_debit=0,
+            receivable_credit=200,
+            income_debit=200,
+            income_credit=0,
+        )
+        self._add_move(
+            date=self.fy_date_start,
+            receivable_debit=0,
+            receivable_credit=300,
+            income_debit=300,
+            income_credit=0,
+        )
+        res_data = self._get_report_lines(with_partners=True)
+        general_ledger = res_data["general_ledger"]
+        codes = [account["code"] for account in general_ledger]
+        self.assertEqual(codes, sorted(codes))
+        receivable = next(
+            account
+            for account in general_ledger
+            if account["id"] == self.receivable_account.id
+        )
+        partner_lines = next(
+            item["move_lines"]
+            for item in receivable["list_grouped"]
+            if item["id"] == self.partner.id
+        )
+        # running balance from the initial balance, in date order
+        self.assertEqual(
+            [line["date"] for line in partner_lines],
+            [self.fy_date_start, self.fy_date_end],
+        )
+        self.assertEqual([line["balance"] for line in partner_lines], [700, 500])
+        self.assertEqual([line["credit"] for line in partner_lines], [300, 200])
+        income = next(
+            account
+            for account in general_ledger
+            if account["id"] == self.income_account.id
+        )
+        self.assertEqual([line["balance"] for line in income["move_lines"]], [300, 500])
+        self.assertEqual(income["fin_bal"]["balance"], 500)
+
+    def test_06_streamed_report_values(self):
+        for move_date, amount in [
+            (self.previous_fy_date_end, 1000),
+            (self.fy_date_start, 300),
+            (self.fy_date_end, 200),
+        ]:
+            self._add_move(
+                date=move_date,
+                receivable_debit=amount,
+                receivable_credit=0,
+                income_debit=0,
+                income_credit=amount,
+            )
+        expected = [
+            (
+                account["id"],
+                [line["balance"] for line in account.get("move_lines", [])],
+                [
+                    [line["balance"] for line in item["move_lines"]]
+                    for item in account.get("list_grouped", [])
+                ],
+                account["fin_bal"]["balance"],
+            )
+            for account in self._get_report_lines(with_partners=True)["general_ledger"]
+        ]
+        res_data = self._get_report_lines(with_partners=True, streamed=True)
+        streamed = []
+        for account in res_data["general_ledger"]:
+            move_lines = []
+            for line in account.get("move_lines", []):
+                # other queries may run while the lines are read
+                self.env["account.account"].search_count([])
+                move_lines.append(line["balance"])
+            streamed.append(
+                (
+                    account["id"],
+                    move_lines,
+                    [
+                        [line["balance"] for line in item["move_lines"]]
+                        for item in account.get("list_grouped", [])
+                    ],
+                    account["fin_bal"]["balance"],
+                )
+            )
+        self.assertEqual(streamed, expected)
+
+    def test_07_balance_snapshot(self):
+        for move_date, amount in [
+            ("2015-03-15", 1000),
+            ("2016-02-10", -300),
+            ("2016-05-20", 50),
+        ]:
+            self._add_move(
+                date=move_date,
+                receivable_debit=max(amount, 0),
+                receivable_credit=max(-amount, 0),
+                income_debit=max(-amount, 0),
+                income_credit=max(amount, 0),
+            )
+        accounts = [
+            self.receivable_account.id,
+            self.income_account.id,
+            self.unaffected_account.id,
+        ]
+
+        def get_balances():
+            general_ledger = self._get_report_lines()["general_ledger"]
+            balances = [
+                (
+                    self._get_initial_balance(account_id, general_ledger),
+                    self._get_final_balance(account_id, general_ledger),
+                )
+                for account_id in accounts
+            ]
+            general_ledger = self._get_report_lines(with_partners=True)[
+                "general_ledger"
+            ]
+            balances += [
+                (
+                    self._get_partner_initial_balance(
+                        account_id, self.partner.id, general_ledger
+                    ),
+                    self._get_partner_final_balance(
+                        account_id, self.partner.id, general_ledger
+                    ),
+                )
+                for account_id in accounts
+            ]
+            return balances
+
+        balances = get_balances()
+        self.assertEqual(balances[0][0]["balance"], 1000)
+        company = self.env.user.company_id
+        company.fiscalyear_lock_date = "2016-03-15"
+        self.env["account.balance.snapshot"]._cron_refresh()
+        self.assertTrue(company.balance_snapshot_date)
+        self.assertEqual(get_balances(), balances)
+
     def test_partner_filter(self):
         partner_1 = self.env.ref("base.res_partner_1")
         partner_2 = self.env.ref("base.res_partner_2")
@@ -731,3 +881,71 @@ class TestGeneralLedgerReport(AccountTestInvoicingCommon):
         wizard.onchange_date_range_id()
         self.assertEqual(wizard.date_from, date(2018, 1, 1))
         self.assertEqual(wizard.date_to, date(2018, 12, 31))
+
+    def test_export_background(self):
+        self._add_move(
+            date=self.fy_date_start,
+            receivable_debit=100,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=100,
+        )
+        wizard = self.env["general.ledger.report.wizard"].create(
+            {
+                "date_from": self.fy_date_start,
+                "date_to": self.fy_date_end,
+                "company_id": self.env.user.company_id.id,
+                "fy_start_date": self.fy_date_start,
+            }
+        )
+        action = wizard.button_export_xlsx_background()
+        job = self.env["account.financial.report.job"].browse(action["res_id"])
+        self.assertEqual(job.state, "queued")
+        # an identical export waits for the same job
+        action = wizard.copy().button_export_xlsx_background()
+        self.assertEqual(action["res_id"], job.id)
+        # the job does not need the wizard, possibly vacuumed meanwhile
+        wizard = wizard.copy()
+        self.env["general.ledger.report.wizard"].browse(job.data["wizard_id"]).unlink()
+        job._run()
+        job.state = "done"
+        self.assertTrue(job.attachment_id.raw)
+        action = wizard.button_export_xlsx_background()
+        self.assertEqual(action["type"], "ir.actions.act_url")
+        # new move lines invalidate the file
+        self._add_move(
+            date=self.fy_date_end,
+            receivable_debit=50,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=50,
+        )
+        action = wizard.button_export_xlsx_background()
+        self.assertNotEqual(action.get("res_id"), job.id)
+
+    def test_export_cache_token(self):
+        Job = self.env["account.financial.report.job"]
+        company = self.env.user.company_id
+        journal = self.env["account.journal"].search(
+            [("company_id", "=", company.id)], limit=1
+        )
+        moves = self.env["account.move"].create(
+            [
+                {
+                    "journal_id": journal.id,
+                    "date": self.fy_date_start,
+                    "line_ids": [
+                        (0, 0, {"balance": amount, "account_id": account.id})
+                        for account, amount in [
+                            (self.receivable_account, 10),
+                            (self.income_account, -10),
+                        ]
+                    ],
+                }
+                for _i in range(2)
+            ]
+        )
+        token = Job._get_cache_token(company.id)
+        # neither the newest line nor the latest update change
+        moves[0].unlink()
+        self.assertNotEqual(Job._get_cache_token(company.id), token)
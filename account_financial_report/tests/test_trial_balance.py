@@ -715,3 +715,131 @@ class TestTrialBalanceReport(AccountTestInvoicingCommon):
         ]
         self.assertEqual(len(trial_balance_code_set), len(all_accounts_code_set))
         self.assertTrue(trial_balance_code_set == all_accounts_code_set)
+
+    def test_06_grouped_by_analytic_account(self):
+        plan = self.env["account.analytic.plan"].create({"name": "Plan"})
+        analytic_account = self.env["account.analytic.account"].create(
+            {"name": "Analytic", "plan_id": plan.id}
+        )
+        journal = self.env["account.journal"].search(
+            [("company_id", "=", self.env.user.company_id.id)], limit=1
+        )
+        move = self.env["account.move"].create(
+            {
+                "journal_id": journal.id,
+                "date": self.date_start,
+                "line_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "debit": 100,
+                            "credit": 0,
+                            "account_id": self.account100.id,
+                        },
+                    ),
+                    (
+                        0,
+                        0,
+                        {
+                            "debit": 0,
+                            "credit": 60,
+                            "account_id": self.account200.id,
+                            "analytic_distribution": {str(analytic_account.id): 100},
+                        },
+                    ),
+                    (
+                        0,
+                        0,
+                        {
+                            "debit": 0,
+                            "credit": 40,
+                            "account_id": self.account200.id,
+                        },
+                    ),
+                ],
+            }
+        )
+        move.action_post()
+        company = self.env.user.company_id
+        trial_balance = self.env["trial.balance.report.wizard"].create(
+            {
+                "date_from": self.date_start,
+                "date_to": self.date_end,
+                "target_move": "posted",
+                "hide_account_at_0": True,
+                "company_id": company.id,
+                "fy_start_date": self.fy_date_start,
+                "grouped_by": "analytic_account",
+            }
+        )
+        data = trial_balance._prepare_report_data()
+        res_data = self.env[
+            "report.account_financial_report.trial_balance"
+        ]._get_report_values(trial_balance, data)
+        account = next(
+            line
+            for line in res_data["trial_balance"]
+            if line["id"] == self.account200.id and line["type"] == "account_type"
+        )
+        self.assertEqual(account["credit"], 100)
+        self.assertEqual(account["group_by_data"][analytic_account.id]["credit"], 60)
+        self.assertEqual(account["group_by_data"][0]["credit"], 40)
+
+    def test_07_balance_snapshot(self):
+        self._add_move(
+            date="2015-03-15",
+            receivable_debit=1000,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=1000,
+        )
+        self._add_move(
+            date="2016-02-10",
+            receivable_debit=0,
+            receivable_credit=300,
+            income_debit=300,
+            income_credit=0,
+        )
+        self._add_move(
+            date="2016-05-20",
+            receivable_debit=50,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=50,
+        )
+        company = self.env.user.company_id
+        report = self._get_report_lines()
+        lines = self._get_account_lines(self.account100.id, report["trial_balance"])
+        self.assertEqual(lines["initial_balance"], 700)
+        report = self._get_report_lines(with_partners=True)
+        partner_lines = self._get_partner_lines(
+            self.account100.id, self.partner.id, report["total_amount"]
+        )
+        company.fiscalyear_lock_date = "2016-03-15"
+        self.env["account.balance.snapshot"]._cron_refresh()
+        self.assertEqual(str(company.balance_snapshot_date), "2016-03-01")
+        self.assertTrue(
+            self.env["account.balance.snapshot"].search(
+                [("company_id", "=", company.id)]
+            )
+        )
+        report = self._get_report_lines()
+        self.assertEqual(
+            self._get_account_lines(self.account100.id, report["trial_balance"]),
+            lines,
+        )
+        report = self._get_report_lines(with_partners=True)
+        self.assertEqual(
+            self._get_partner_lines(
+                self.account100.id, self.partner.id, report["total_amount"]
+            ),
+            partner_lines,
+        )
+        company.fiscalyear_lock_date = False
+        self.assertFalse(company.balance_snapshot_date)
+        self.assertFalse(
+            self.env["account.balance.snapshot"].search(
+                [("company_id", "=", company.id)]
+            )
+        )
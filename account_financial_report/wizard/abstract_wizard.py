@@ -54,6 +54,32 @@ class AbstractWizard(models.AbstractModel):
         report_type = "xlsx"
         return self._export(report_type)
 
+    def button_export_pdf_background(self):
+        self.ensure_one()
+        self._set_default_wizard_values()
+        return self._export_background("qweb-pdf")
+
+    def button_export_xlsx_background(self):
+        self.ensure_one()
+        self._set_default_wizard_values()
+        return self._export_background("xlsx")
+
+    def _export_background(self, report_type):
+        """Queue the export to be rendered by a cron instead of the current
+        request, or reuse the file of an identical export."""
+        action = self._export(report_type)
+        report = self.env["ir.actions.report"].search(
+            [
+                ("report_name", "=", action["report_name"]),
+                ("report_type", "=", action["report_type"]),
+            ],
+            limit=1,
+        )
+        job = self.env["account.financial.report.job"]._queue(
+            report, action["data"], action["name"], wizard=self
+        )
+        return job._get_action()
+
     def _limit_text(self, value, limit_field="label_text_limit"):
         limit = self[limit_field]
         if value and limit and len(value) > limit:
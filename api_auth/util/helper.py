@@ -31,11 +31,23 @@ def create_access_token(
     return encoded_jwt
 
 
+def get_token_secret(cr):
+    """Get the secret signing the tokens.
+
+    The config parameter is cached until it is written, so that validating a
+    token doesn't query the database.
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    return env["ir.config_parameter"].get_param("api_auth.token_secret") or SECRET_KEY
+
+
 def get_token_secret_expires_delta(cr):
     env = api.Environment(cr, SUPERUSER_ID, {})
-    config_values = env[RES_CONFIG_SETTINGS].get_values()
-    expires_delta = int(config_values.get("token_expires_delta", ACCESS_TOKEN_EXPIRE_MINUTES))
-    token_secret = config_values.get("token_secret", SECRET_KEY)
+    expires_delta = int(
+        env["ir.config_parameter"].get_param("api_auth.token_expires_delta")
+        or ACCESS_TOKEN_EXPIRE_MINUTES
+    )
+    token_secret = get_token_secret(cr)
     return expires_delta, token_secret
 
 
@@ -57,7 +69,7 @@ def validate_token(func):
                 401,
             )
         try:
-            secret_key = request.env["res.config.settings"].get_values().get("token_secret", SECRET_KEY)
+            secret_key = get_token_secret(request.env.cr)
             payload = jwt.decode(token, secret_key, algorithms=[ALGORITHM])
             payload = SimpleNamespace(**payload)
             request.session.uid = int(payload.sub)
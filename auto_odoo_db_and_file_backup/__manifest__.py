@@ -3,7 +3,7 @@
 {
     'name': "Automatic Backup (Google Drive, Dropbox, Amazon S3, FTP, SFTP, Local)",
 	'category': 'Extra Tools',
-	'version': '18.0.0.2.0', 
+	'version': '18.0.0.3.0', 
 	
     'summary': 'Automatic Backup -(Google Drive, Dropbox, Amazon S3, FTP, SFTP, Local)',
     'description': "Automatic Backup -(Google Drive, Dropbox, Amazon S3, FTP, SFTP, Local)",
@@ -30,6 +30,7 @@
         'views/auto_backup_mail_templates.xml',
         'data/data.xml',
         'wizard/wiz.xml',
+        'wizard/restore_wiz.xml',
     ],
     'installable': True,
     'application': True,
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+
+from werkzeug.exceptions import Forbidden
+
+from odoo import http
+from odoo.http import request
+
+
+class AutoBackupMetrics(http.Controller):
+
+    @http.route('/auto_odoo_db_and_file_backup/metrics', type='http', auth='user', methods=['GET'])
+    def backup_metrics(self, limit=100, format='json', **kw):
+        """Per-destination metrics of the latest backup runs, newest first,
+        as JSON (default) or CSV (``format=csv``)."""
+        if not request.env.user.has_group('base.group_system'):
+            raise Forbidden()
+        statuses = request.env['auto.database.backup.status'].search([], limit=int(limit), order='date desc, id desc')
+        metrics = statuses._get_metrics()
+        if format != 'csv':
+            return request.make_json_response(metrics)
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=['id'] + statuses._metric_fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(metrics)
+        return request.make_response(output.getvalue(), headers=[
+            ('Content-Type', 'text/csv; charset=utf-8'),
+            ('Content-Disposition', 'attachment; filename=backup_metrics.csv'),
+        ])
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Back up the active rules with the all destinations scheduler instead
+    of the scheduler of each destination."""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    _logger.info("Scheduling the backups with the all destinations scheduler")
+    env['database.backup']._sync_backup_crons()
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Crons whose methods moved from auto.database.backup to database.backup,
+# their data being loaded once
+CRONS = [
+    'auto_db_backup_scheduler',
+    'auto_db_backup_scheduler_Gdrive',
+    'auto_db_backup_scheduler_dropbox',
+    'auto_db_backup_scheduler_ftp',
+    'auto_db_backup_scheduler_sftp',
+    'auto_db_backup_scheduler_AWSs3',
+]
+
+
+def migrate(cr, version):
+    """Run the backup crons on database.backup."""
+    _logger.info("Moving the backup crons to database.backup")
+    cr.execute("""
+        UPDATE ir_act_server action
+        SET model_id = model.id, model_name = model.model
+        FROM ir_cron cron, ir_model_data data, ir_model model
+        WHERE action.id = cron.ir_actions_server_id
+          AND data.model = 'ir.cron' AND data.res_id = cron.id
+          AND data.module = 'auto_odoo_db_and_file_backup' AND data.name IN %s
+          AND model.model = 'database.backup'
+    """, [tuple(CRONS)])
@@ -1,2 +1,5 @@
 # -*- coding: utf-8 -*-
-from . import models
\ No newline at end of file
+from . import models
+from . import backup_artifact
+from . import backup_filestore
+from . import backup_verification
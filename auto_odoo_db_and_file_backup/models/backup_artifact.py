@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+
+class DatabaseBackupArtifact(models.Model):
+    _name = 'database.backup.artifact'
+    _description = 'Auto Database Backup Artifact'
+    _order = 'date desc, id desc'
+
+    name = fields.Char("Path", required=True)
+    rule_id = fields.Many2one('database.backup', "Backup Rule", required=True, ondelete='cascade', index=True)
+    backup_destination = fields.Selection(related='rule_id.backup_destination', store=True, string="Destination")
+    kind = fields.Selection([('database', 'Database'), ('files', 'Files')], "Kind", required=True)
+    date = fields.Datetime("Date", required=True, index=True,
+                           help="Date of the backup run, shared by all the artifacts of the run.")
+    size = fields.Float("Size (bytes)", digits=(20, 0))
+    checksum = fields.Char("SHA-256")
+
+    @api.model
+    def _remove_outdated_artifacts(self, rec, destination):
+        """Delete, in batches, the artifacts of ``rec`` whose run falls out of
+        the retention policy of its backup configuration."""
+        artifacts = self.search([('rule_id', '=', rec.id)])
+        outdated_dates = rec.backup_id._get_outdated_dates(artifacts.mapped('date'))
+        outdated = artifacts.filtered(lambda artifact: artifact.date in outdated_dates)
+        if not outdated:
+            return
+        _logger.info("Delete %s out-of-date files from %s: %s", len(outdated), rec.backup_destination,
+                     ", ".join(outdated.mapped('name')))
+        destination.delete_many(outdated.mapped('name'))
+        outdated.unlink()
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""Backup destinations.
+
+Each destination is built from a ``database.backup`` rule, copies the
+settings it needs at construction time and never touches the ORM
+afterwards. It is used as a context manager owning the remote connection
+and uploads readable streams chunk by chunk, or downloads them back for the
+restore verifications. Destinations are never listed:
+what was uploaded is tracked by the ``database.backup.artifact`` catalogue.
+"""
+
+import ftplib
+import logging
+import os
+import shutil
+import time
+
+import boto3
+import dropbox
+import paramiko
+import requests
+from boto3.s3.transfer import TransferConfig
+from dropbox.files import CommitInfo, DeleteArg, UploadSessionCursor, WriteMode
+
+from .backup_stream import CHUNK_SIZE, read_chunk
+
+_logger = logging.getLogger(__name__)
+
+TIMEOUT = 300
+# maximum number of paths per batch delete request of the APIs
+DROPBOX_DELETE_BATCH = 1000
+S3_DELETE_BATCH = 1000
+GDRIVE_UPLOAD_URL = 'https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable'
+GDRIVE_DOWNLOAD_URL = 'https://www.googleapis.com/drive/v3/files/%s?alt=media'
+
+
+class BackupDestination(object):
+    """Base class of the backup destinations."""
+
+    code = None
+
+    def __init__(self, rec):
+        self.rule_id = rec.id
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disconnect()
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def upload(self, stream, filename):
+        """Upload the readable ``stream`` as ``filename``, a path relative to
+        the backup folder whose parent folders are created when needed."""
+        raise NotImplementedError()
+
+    def download(self, filename, fileobj):
+        """Write the content of ``filename`` into the writable ``fileobj``."""
+        raise NotImplementedError()
+
+    def delete(self, filename):
+        raise NotImplementedError()
+
+    def delete_many(self, filenames):
+        """Delete ``filenames``, in as few requests as the API allows."""
+        for filename in filenames:
+            self.delete(filename)
+
+
+class FolderDestination(BackupDestination):
+    code = 'folder'
+
+    def __init__(self, rec):
+        super().__init__(rec)
+        folder = rec.folder
+        if folder.endswith('/'):
+            folder = folder.strip('/')
+        self.path = folder + "/" + rec.foldername
+
+    def connect(self):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def upload(self, stream, filename):
+        path = os.path.join(self.path, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fp:
+            shutil.copyfileobj(stream, fp, CHUNK_SIZE)
+
+    def download(self, filename, fileobj):
+        with open(os.path.join(self.path, filename), 'rb') as fp:
+            shutil.copyfileobj(fp, fileobj, CHUNK_SIZE)
+
+    def delete(self, filename):
+        os.remove(os.path.join(self.path, filename))
+
+
+class DropboxDestination(BackupDestination):
+    code = 'dropbox'
+
+    def __init__(self, rec):
+        super().__init__(rec)
+        self.refresh_token = rec.dropbox_refresh_token
+        self.app_key = rec.d_app_key
+        self.dbx = None
+
+    def connect(self):
+        if not self.refresh_token:
+            raise ValueError("Something went wrong during the token generation. "
+                             "Please request again an authorization code.")
+        self.dbx = dropbox.Dropbox(oauth2_refresh_token=self.refresh_token, app_key=self.app_key)
+        self.dbx.users_get_current_account()
+
+    def disconnect(self):
+        if self.dbx:
+            self.dbx.close()
+            self.dbx = None
+
+    def upload(self, stream, filename):
+        # Upload sessions accept an unlimited size, one chunk per request.
+        chunk = read_chunk(stream)
+        session = self.dbx.files_upload_session_start(chunk)
+        cursor = UploadSessionCursor(session_id=session.session_id, offset=len(chunk))
+        for chunk in iter(lambda: read_chunk(stream), b''):
+            self.dbx.files_upload_session_append_v2(chunk, cursor)
+            cursor.offset += len(chunk)
+        commit = CommitInfo(path="/" + filename, mode=WriteMode('overwrite'))
+        self.dbx.files_upload_session_finish(b'', cursor, commit)
+
+    def download(self, filename, fileobj):
+        metadata, response = self.dbx.files_download("/" + filename)
+        with response:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                fileobj.write(chunk)
+
+    def delete(self, filename):
+        self.dbx.files_delete_v2("/" + filename)
+
+    def delete_many(self, filenames):
+        for index in range(0, len(filenames), DROPBOX_DELETE_BATCH):
+            entries = [DeleteArg("/" + filename) for filename in filenames[index:index + DROPBOX_DELETE_BATCH]]
+            launch = self.dbx.files_delete_batch(entries)
+            if not launch.is_async_job_id():
+                continue
+            job_id = launch.get_async_job_id()
+            status = self.dbx.files_delete_batch_check(job_id)
+            while status.is_in_progress():
+                time.sleep(1)
+                status = self.dbx.files_delete_batch_check(job_id)
+            if status.is_failed():
+                raise ValueError("Dropbox batch delete failed: %s" % status.get_failed())
+
+
+class S3Destination(BackupDestination):
+    code = 'AWSs3'
+
+    def __init__(self, rec):
+        super().__init__(rec)
+        self.app_key_id = rec.s3_app_key_id
+        self.secret_key_id = rec.s3_secret_key_id
+        self.bucket = rec.s3_bucket_name
+        self.client = None
+
+    def connect(self):
+        self.client = boto3.client(
+            's3',
+            aws_access_key_id=self.app_key_id,
+            aws_secret_access_key=self.secret_key_id,
+        )
+
+    def upload(self, stream, filename):
+        # upload_fileobj switches to a multipart upload for large streams and
+        # only buffers ``max_concurrency`` parts at a time.
+        config = TransferConfig(multipart_chunksize=CHUNK_SIZE, max_concurrency=2)
+        self.client.upload_fileobj(stream, self.bucket, filename, Config=config)
+
+    def download(self, filename, fileobj):
+        config = TransferConfig(multipart_chunksize=CHUNK_SIZE)
+        self.client.download_fileobj(self.bucket, filename, fileobj, Config=config)
+
+    def delete(self, filename):
+        self.client.delete_object(Bucket=self.bucket, Key=filename)
+
+    def delete_many(self, filenames):
+        for index in range(0, len(filenames), S3_DELETE_BATCH):
+            keys = [{'Key': filename} for filename in filenames[index:index + S3_DELETE_BATCH]]
+            response = self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': keys, 'Quiet': True})
+            if response.get('Errors'):
+                raise ValueError("AWS S3 batch delete failed: %s" % response['Errors'][:5])
+
+
+class FTPDestination(BackupDestination):
+    code = 'ftp'
+
+    def __init__(self, rec):
+        super().__init__(rec)
+        self.address = rec.ftp_address
+        self.port = rec.ftp_port or 21
+        self.username = rec.ftp_usrnm
+        self.password = rec.ftp_pwd
+        self.path = rec.ftp_path
+        self.ftp = None
+        self._dirs = set()
+
+    def connect(self):
+        self.ftp = ftplib.FTP(timeout=TIMEOUT)
+        self.ftp.connect(self.address, self.port)
+        self.ftp.login(self.username, self.password)
+        self.ftp.encoding = "utf-8"
+        self.ftp.cwd(self.path)
+
+    def disconnect(self):
+        if self.ftp:
+            try:
+                self.ftp.quit()
+            except ftplib.all_errors:
+                self.ftp.close()
+            self.ftp = None
+
+    def _makedirs(self, filename):
+        parts = filename.split('/')[:-1]
+        for index in range(len(parts)):
+            dirname = '/'.join(parts[:index + 1])
+            if dirname in self._dirs:
+                continue
+            try:
+                self.ftp.mkd(dirname)
+            except ftplib.error_perm:
+                # already exists
+                pass
+            self._dirs.add(dirname)
+
+    def upload(self, stream, filename):
+        self._makedirs(filename)
+        self.ftp.storbinary('STOR ' + filename, stream, blocksize=CHUNK_SIZE)
+
+    def download(self, filename, fileobj):
+        self.ftp.retrbinary('RETR ' + filename, fileobj.write, blocksize=CHUNK_SIZE)
+
+    def delete(self, filename):
+        self.ftp.delete(filename)
+
+
+class SFTPDestination(BackupDestination):
+    code = 'sftp'
+
+    def __init__(self, rec):
+        super().__init__(rec)
+        self.host = rec.sftp_host
+        self.port = rec.sftp_port or 22
+        self.user = rec.sftp_user
+        self.use_key_file = rec.is_pem_file_avail
+        # holds the key file path or the password depending on is_pem_file_avail
+        self.secret = rec.sftp_keyfilepath
+        remote = rec.sftp_file_path or ''
+        if remote.endswith('/'):
+            remote = remote.strip('/')
+        self.path = remote
+        self.client = None
+        self.sftp = None
+        self._dirs = set()
+
+    def connect(self):
+        self.client = paramiko.SSHClient()
+        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        if self.use_key_file:
+            self.client.connect(self.host, self.port, self.user, key_filename=self.secret, timeout=10)
+        else:
+            self.client.connect(self.host, self.port, self.user, self.secret, timeout=10)
+        self.sftp = self.client.open_sftp()
+
+    def disconnect(self):
+        if self.sftp:
+            self.sftp.close()
+            self.sftp = None
+        if self.client:
+            self.client.close()
+            self.client = None
+
+    def _makedirs(self, filename):
+        parts = filename.split('/')[:-1]
+        for index in range(len(parts)):
+            dirname = self.path + "/" + '/'.join(parts[:index + 1])
+            if dirname in self._dirs:
+                continue
+            try:
+                self.sftp.stat(dirname)
+            except IOError:
+                self.sftp.mkdir(dirname)
+            self._dirs.add(dirname)
+
+    def upload(self, stream, filename):
+        self._makedirs(filename)
+        self.sftp.putfo(stream, self.path + "/" + filename)
+
+    def download(self, filename, fileobj):
+        self.sftp.getfo(self.path + "/" + filename, fileobj)
+
+    def delete(self, filename):
+        self.sftp.remove(self.path + "/" + filename)
+
+
+class GoogleDriveDestination(BackupDestination):
+    code = 'g_drive'
+
+    def __init__(self, rec):
+        super().__init__(rec)
+        # authorization reads/writes the credential files next to the models
+        self.drive = rec.authorize_drive()
+
+    def _headers(self):
+        if self.drive.auth.access_token_expired:
+            self.drive.auth.Refresh()
+        return {'Authorization': 'Bearer %s' % self.drive.auth.credentials.access_token}
+
+    def upload(self, stream, filename):
+        # Resumable upload of a stream of unknown size: every chunk but the
+        # last one is sent with an open ("*") total size.
+        headers = dict(self._headers(), **{'X-Upload-Content-Type': 'application/octet-stream'})
+        response = requests.post(GDRIVE_UPLOAD_URL, json={'name': filename}, headers=headers, timeout=TIMEOUT)
+        response.raise_for_status()
+        location = response.headers['Location']
+        offset = 0
+        chunk = read_chunk(stream)
+        while True:
+            next_chunk = read_chunk(stream) if len(chunk) == CHUNK_SIZE else b''
+            last = not next_chunk
+            end = offset + len(chunk)
+            if chunk:
+                content_range = 'bytes %d-%d/%s' % (offset, end - 1, end if last else '*')
+            else:
+                content_range = 'bytes */%d' % end
+            headers = dict(self._headers(), **{'Content-Range': content_range})
+            response = requests.put(location, data=chunk, headers=headers, timeout=TIMEOUT)
+            if last:
+                response.raise_for_status()
+                return
+            if response.status_code != 308:
+                response.raise_for_status()
+                raise ValueError("Unexpected Google Drive response while uploading %s: %s" % (
+                    filename, response.status_code))
+            offset, chunk = end, next_chunk
+
+    def _find(self, filename):
+        query = "'root' in parents and trashed=false and title='%s'" % filename.replace("'", "\\'")
+        return self.drive.ListFile({'q': query}).GetList()
+
+    def download(self, filename, fileobj):
+        items = self._find(filename)
+        if not items:
+            raise ValueError("File %s not found on Google Drive." % filename)
+        url = GDRIVE_DOWNLOAD_URL % items[0]['id']
+        with requests.get(url, headers=self._headers(), stream=True, timeout=TIMEOUT) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                fileobj.write(chunk)
+
+    def delete(self, filename):
+        for item in self._find(filename):
+            self.drive.CreateFile({'id': item['id']}).Delete()
+
+
+DESTINATIONS = {
+    destination.code: destination
+    for destination in (
+        FolderDestination,
+        DropboxDestination,
+        S3Destination,
+        FTPDestination,
+        SFTPDestination,
+        GoogleDriveDestination,
+    )
+}
+
+
+def get_destination(rec):
+    return DESTINATIONS[rec.backup_destination](rec)
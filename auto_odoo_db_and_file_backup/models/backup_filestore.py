@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""Incremental, content-addressed backups of the files of a backup rule.
+
+Files are uploaded once, as blobs named after their SHA-256, under
+``<folder>_blobs/<2 first hex digits>/<sha256>`` on the destination. Each run
+only uploads the blobs missing from the destination and writes a gzipped
+JSON manifest ``<folder>_<date>.manifest.json.gz`` mapping every relative
+path to its blob, which is enough to rebuild the files as they were at that
+run.
+"""
+
+import base64
+import gzip
+import io
+import json
+import logging
+import os
+
+from odoo import api, fields, models
+
+from . import backup_stream
+
+_logger = logging.getLogger(__name__)
+
+
+class DatabaseBackupBlob(models.Model):
+    _name = 'database.backup.blob'
+    _description = 'Auto Database Backup File Blob'
+
+    rule_id = fields.Many2one('database.backup', "Backup Rule", required=True, ondelete='cascade', index=True)
+    checksum = fields.Char("SHA-256", required=True)
+    size = fields.Float("Size (bytes)", digits=(20, 0))
+
+    _sql_constraints = [
+        ('checksum_uniq', 'unique(rule_id, checksum)', 'A blob is only stored once per backup rule.'),
+    ]
+
+
+class DatabaseBackupSnapshot(models.Model):
+    _name = 'database.backup.snapshot'
+    _description = 'Auto Database Backup Files Snapshot'
+    _order = 'date desc, id desc'
+
+    name = fields.Char("Manifest", required=True)
+    rule_id = fields.Many2one('database.backup', "Backup Rule", required=True, ondelete='cascade', index=True)
+    date = fields.Datetime("Date", required=True, default=fields.Datetime.now)
+    manifest = fields.Binary("Manifest Content", attachment=False)
+    file_count = fields.Integer("Files")
+    total_size = fields.Float("Total Size (MB)", digits=(16, 2))
+    new_blob_count = fields.Integer("Uploaded Files")
+    new_blob_size = fields.Float("Uploaded Size (MB)", digits=(16, 2))
+
+    @api.model
+    def _blob_path(self, rec, checksum):
+        fpath = rec.files_path.split('/')[-1]
+        return '%s_blobs/%s/%s' % (fpath, checksum[:2], checksum)
+
+    def _read_manifest(self):
+        self.ensure_one()
+        if not self.manifest:
+            return {}
+        return json.loads(gzip.decompress(base64.b64decode(self.manifest)))
+
+    @api.model
+    def _backup_files(self, rec, destination, date_today):
+        """Upload the files of ``rec`` missing from ``destination`` and the
+        manifest of this run; return the created snapshot."""
+        fpath = rec.files_path.split('/')[-1]
+        previous = self.search([('rule_id', '=', rec.id)], limit=1)._read_manifest()
+        self.env.cr.execute("SELECT checksum FROM database_backup_blob WHERE rule_id = %s", (rec.id,))
+        known = {row[0] for row in self.env.cr.fetchall()}
+
+        manifest = {}
+        new_blobs = []
+        total_size = 0
+        for root, dirs, files in os.walk(rec.files_path):
+            for filename in files:
+                fullpath = os.path.join(root, filename)
+                if not os.path.isfile(fullpath):
+                    continue
+                relpath = os.path.relpath(fullpath, rec.files_path)
+                stat = os.stat(fullpath)
+                # entries are [sha256, size, mtime_ns]: unchanged files keep
+                # the checksum of the previous run instead of being hashed again
+                entry = previous.get(relpath)
+                if entry and entry[1] == stat.st_size and entry[2] == stat.st_mtime_ns:
+                    checksum = entry[0]
+                else:
+                    checksum = backup_stream.file_sha256(fullpath)
+                manifest[relpath] = [checksum, stat.st_size, stat.st_mtime_ns]
+                total_size += stat.st_size
+                if checksum not in known:
+                    with open(fullpath, 'rb') as fp:
+                        destination.upload(fp, self._blob_path(rec, checksum))
+                    known.add(checksum)
+                    new_blobs.append({'rule_id': rec.id, 'checksum': checksum, 'size': stat.st_size})
+
+        name = '%s_%s.manifest.json.gz' % (fpath, date_today.strftime('%Y-%m-%d_%H_%M_%S'))
+        content = gzip.compress(json.dumps(manifest).encode())
+        destination.upload(io.BytesIO(content), name)
+        self.env['database.backup.blob'].create(new_blobs)
+        _logger.info("Files backup %s: %s files, %s uploaded.", name, len(manifest), len(new_blobs))
+        return self.create({
+            'name': name,
+            'rule_id': rec.id,
+            'manifest': base64.b64encode(content),
+            'file_count': len(manifest),
+            'total_size': total_size / 1024.0 / 1024.0,
+            'new_blob_count': len(new_blobs),
+            'new_blob_size': sum(blob['size'] for blob in new_blobs) / 1024.0 / 1024.0,
+        })
+
+    @api.model
+    def _remove_outdated_snapshots(self, rec, destination):
+        """Remove the manifests falling out of the retention policy of ``rec``
+        and the blobs no remaining manifest references."""
+        snapshots = self.search([('rule_id', '=', rec.id)])
+        outdated_dates = rec.backup_id._get_outdated_dates(snapshots.mapped('date'))
+        outdated = snapshots.filtered(lambda snapshot: snapshot.date in outdated_dates)
+        if not outdated:
+            return
+        _logger.info("Delete %s out-of-date files from %s: %s", len(outdated), rec.backup_destination,
+                     ", ".join(outdated.mapped('name')))
+        destination.delete_many(outdated.mapped('name'))
+        outdated.unlink()
+
+        referenced = set()
+        for snapshot in snapshots - outdated:
+            referenced.update(entry[0] for entry in snapshot._read_manifest().values())
+        blobs = self.env['database.backup.blob'].search([('rule_id', '=', rec.id)])
+        unreferenced = blobs.filtered(lambda blob: blob.checksum not in referenced)
+        destination.delete_many([self._blob_path(rec, blob.checksum) for blob in unreferenced])
+        unreferenced.unlink()
+        _logger.info("Deleted %s unreferenced blobs of %s.", len(unreferenced), rec.files_path)
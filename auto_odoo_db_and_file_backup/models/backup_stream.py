@@ -0,0 +1,563 @@
+# -*- coding: utf-8 -*-
+"""Streaming primitives for the automatic backup pipeline.
+
+Every backup artifact is exposed as a readable, non-seekable file object
+produced on the fly (``pg_dump`` stdout, a zip archive written by a
+background thread, ...). Destinations consume those objects chunk by chunk,
+so a backup never needs a local staging copy nor the whole artifact in
+memory.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from odoo.tools.misc import exec_pg_environ, find_pg_tool
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+    _logger.debug("Can not import zstandard, the zstd compression is not available.")
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+    _logger.debug("Can not import lz4, the lz4 compression is not available.")
+
+# 8 MiB: a multiple of the 256 KiB Google Drive chunk granularity and above
+# the 5 MiB minimum part size of S3 multipart uploads.
+CHUNK_SIZE = 8 * 1024 * 1024
+
+BACKUP_EXTENSIONS = {
+    'zip': 'zip',
+    'dump': 'dump',
+    'directory': 'tar',
+}
+
+COMPRESSION_EXTENSIONS = {
+    'none': '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+    'lz4': '.lz4',
+}
+
+# leading bytes of the compressed streams, used to detect the codec on restore
+COMPRESSION_MAGIC = {
+    'gzip': b'\x1f\x8b',
+    'zstd': b'\x28\xb5\x2f\xfd',
+    'lz4': b'\x04\x22\x4d\x18',
+}
+
+
+def read_chunk(stream, size=CHUNK_SIZE):
+    """Read exactly ``size`` bytes from ``stream`` unless EOF is reached.
+
+    Pipes return short reads, while some remote APIs require every chunk but
+    the last one to have a fixed size.
+    """
+    chunks = []
+    missing = size
+    while missing > 0:
+        data = stream.read(missing)
+        if not data:
+            break
+        chunks.append(data)
+        missing -= len(data)
+    return b''.join(chunks)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_chunks(stream, size=CHUNK_SIZE):
+    while True:
+        chunk = read_chunk(stream, size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def current_rss():
+    """Return the resident memory of the process in MB, 0 where unknown."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+
+class RssMonitor(object):
+    """Sample the resident memory of the process every ``interval`` seconds
+    between ``start`` and ``stop``, keeping its peak in MB.
+
+    Unlike ``ru_maxrss``, the peak of the process since it started, the
+    peak only covers the monitored run.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.peak = 0.0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='backup-rss', daemon=True)
+
+    def _sample(self):
+        self.peak = max(self.peak, current_rss())
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._sample()
+        return self.peak
+
+
+class PipeStream(io.RawIOBase):
+    """Readable end of a producer (subprocess or thread).
+
+    ``wait`` is called once the data is exhausted and must raise if the
+    producer failed, so that a truncated artifact is never reported as a
+    successful upload. When the stream is closed before EOF (the consumer
+    failed), ``wait`` is called with ``abort=True`` and must not raise.
+    """
+
+    def __init__(self, fileobj, wait):
+        super().__init__()
+        self._fileobj = fileobj
+        self._wait = wait
+        self._finished = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = self._fileobj.readinto(buffer)
+        if not size and not self._finished:
+            self._finished = True
+            self._wait(abort=False)
+        return size
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._fileobj.close()
+            if not self._finished:
+                self._finished = True
+                self._wait(abort=True)
+        finally:
+            super().close()
+
+
+class CountingStream(io.RawIOBase):
+    """Pass-through reader keeping track of the number of bytes read and of
+    the time spent waiting for them, optionally feeding them to a
+    ``hashlib`` ``digest``."""
+
+    def __init__(self, raw, digest=None):
+        super().__init__()
+        self._raw = raw
+        self.digest = digest
+        self.bytes_read = 0
+        self.elapsed = 0.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        start = time.perf_counter()
+        size = self._raw.readinto(buffer)
+        self.elapsed += time.perf_counter() - start
+        if size:
+            self.bytes_read += size
+            if self.digest is not None:
+                self.digest.update(buffer[:size])
+        return size
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._raw.close()
+            finally:
+                super().close()
+
+
+class CompressedStream(io.RawIOBase):
+    """Compress ``raw`` on the fly with a zlib-like ``compressor`` object."""
+
+    def __init__(self, raw, compressor):
+        super().__init__()
+        self._raw = raw
+        self._compressor = compressor
+        self._buffer = bytearray()
+        self._eof = False
+        # time spent compressing, reading ``raw`` excluded
+        self.elapsed = 0.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer and not self._eof:
+            data = self._raw.read(CHUNK_SIZE)
+            start = time.perf_counter()
+            if data:
+                self._buffer += self._compressor.compress(data)
+            else:
+                self._buffer += self._compressor.flush()
+                self._eof = True
+            self.elapsed += time.perf_counter() - start
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        del self._buffer[:size]
+        return size
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._raw.close()
+            finally:
+                super().close()
+
+
+class _LZ4Compressor(object):
+    """zlib-like interface over :class:`lz4.frame.LZ4FrameCompressor`."""
+
+    def __init__(self, level):
+        self._compressor = lz4.frame.LZ4FrameCompressor(compression_level=level)
+        self._header = self._compressor.begin()
+
+    def compress(self, data):
+        header, self._header = self._header, b''
+        return header + self._compressor.compress(data)
+
+    def flush(self):
+        header, self._header = self._header, b''
+        return header + self._compressor.flush()
+
+
+def is_compression_available(compression):
+    if compression == 'zstd':
+        return zstandard is not None
+    if compression == 'lz4':
+        return lz4 is not None
+    return True
+
+
+def compress_stream(stream, compression, level=0, threads=0):
+    """Compress ``stream`` on the fly with ``compression``.
+
+    ``level`` 0 stands for the default level of the codec and ``threads`` is
+    the number of zstd worker threads (0 compresses in the calling thread,
+    -1 uses all the cores).
+    """
+    if not compression or compression == 'none':
+        return stream
+    if not is_compression_available(compression):
+        raise ValueError("The python library of the %s compression is not installed." % compression)
+    if compression == 'gzip':
+        # wbits=31 produces a gzip container instead of a raw zlib stream
+        return CompressedStream(stream, zlib.compressobj(level or 6, zlib.DEFLATED, 31))
+    if compression == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=level or 3, threads=threads)
+        return CompressedStream(stream, compressor.compressobj())
+    if compression == 'lz4':
+        return CompressedStream(stream, _LZ4Compressor(level))
+    raise ValueError("Unsupported compression: %s" % compression)
+
+
+def detect_compression(fileobj):
+    """Return the codec of the seekable ``fileobj`` from its leading bytes."""
+    position = fileobj.tell()
+    magic = fileobj.read(4)
+    fileobj.seek(position)
+    for compression, prefix in COMPRESSION_MAGIC.items():
+        if magic.startswith(prefix):
+            return compression
+    return 'none'
+
+
+def decompress_stream(fileobj):
+    """Return a readable stream of the decompressed content of ``fileobj``,
+    whose codec is detected automatically."""
+    compression = detect_compression(fileobj)
+    if not is_compression_available(compression):
+        raise ValueError("The python library of the %s compression is not installed." % compression)
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True)
+    if compression == 'lz4':
+        return lz4.frame.LZ4FrameFile(fileobj, mode='rb')
+    return fileobj
+
+
+def pg_dump_stream(db_name, backup_format='custom'):
+    """Return the stdout of ``pg_dump`` as a :class:`PipeStream`."""
+    cmd = [find_pg_tool('pg_dump'), '--no-owner', db_name]
+    if backup_format != 'plain':
+        cmd.insert(-1, '--format=%s' % backup_format)
+    errors = tempfile.TemporaryFile()
+    process = subprocess.Popen(
+        cmd, env=exec_pg_environ(), stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=errors)
+
+    def wait(abort=False):
+        try:
+            if abort:
+                process.kill()
+            returncode = process.wait()
+            if returncode and not abort:
+                errors.seek(0)
+                raise RuntimeError("pg_dump failed (exit code %s): %s" % (
+                    returncode, errors.read().decode(errors='replace').strip()))
+        finally:
+            errors.close()
+
+    return PipeStream(process.stdout, wait)
+
+
+def pg_dump_directory_stream(db_name, jobs=1):
+    """Dump ``db_name`` with ``pg_dump --format=directory --jobs=N`` and
+    stream the resulting directory as an uncompressed tar archive.
+
+    The directory format is the only one ``pg_dump`` can write in parallel;
+    it needs a local working directory, removed as soon as it is archived.
+    """
+    def produce(fileobj):
+        dump_dir = tempfile.mkdtemp(prefix='backup-%s-' % db_name)
+        try:
+            target = os.path.join(dump_dir, 'dump')
+            cmd = [find_pg_tool('pg_dump'), '--no-owner', '--format=directory',
+                   '--jobs=%d' % max(jobs, 1), '--file=' + target, db_name]
+            result = subprocess.run(cmd, env=exec_pg_environ(), stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            if result.returncode:
+                raise RuntimeError("pg_dump failed (exit code %s): %s" % (
+                    result.returncode, result.stderr.decode(errors='replace').strip()))
+            with tarfile.open(fileobj=fileobj, mode='w|') as archive:
+                archive.add(target, arcname='dump')
+        finally:
+            shutil.rmtree(dump_dir, ignore_errors=True)
+    return thread_stream(produce, name='backup-dir-%s' % db_name)
+
+
+def pg_restore(path, db_name, jobs=1):
+    """Restore the ``pg_dump`` archive at ``path`` into the existing database
+    ``db_name`` with ``pg_restore --jobs=N``.
+
+    ``path`` is a custom-format dump or a tar of a directory-format dump, both
+    optionally compressed with any supported codec, detected automatically.
+    Parallel restores need a seekable input, so compressed dumps are unpacked
+    to a temporary location first.
+    """
+    with tempfile.TemporaryDirectory(prefix='restore-%s-' % db_name) as work_dir, \
+            open(path, 'rb') as fp:
+        source = path
+        if detect_compression(fp) != 'none':
+            source = os.path.join(work_dir, 'dump.bin')
+            with decompress_stream(fp) as src, open(source, 'wb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        if tarfile.is_tarfile(source):
+            with tarfile.open(source, 'r:') as archive:
+                members = archive.getmembers()
+                for member in members:
+                    if not (member.isfile() or member.isdir()) or \
+                            os.path.isabs(member.name) or '..' in member.name.split('/'):
+                        raise ValueError("Unexpected entry %s in %s." % (member.name, path))
+                archive.extractall(work_dir, members=members)
+            if source != path:
+                os.remove(source)
+            source = os.path.join(work_dir, 'dump')
+            if not os.path.isdir(source):
+                raise ValueError("%s is not a directory-format backup." % path)
+        cmd = [find_pg_tool('pg_restore'), '--no-owner', '--jobs=%d' % max(jobs, 1),
+               '--dbname=' + db_name, source]
+        result = subprocess.run(cmd, env=exec_pg_environ(), stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode:
+            raise RuntimeError("pg_restore failed (exit code %s): %s" % (
+                result.returncode, result.stderr.decode(errors='replace').strip()))
+
+
+def thread_stream(producer, name='backup-producer'):
+    """Run ``producer(fileobj)`` in a thread and return what it writes as a
+    :class:`PipeStream`."""
+    read_fd, write_fd = os.pipe()
+    reader = os.fdopen(read_fd, 'rb', buffering=0)
+    writer = os.fdopen(write_fd, 'wb', buffering=CHUNK_SIZE)
+    failures = []
+
+    def run():
+        try:
+            producer(writer)
+        except Exception as e:
+            failures.append(e)
+        finally:
+            try:
+                writer.close()
+            except OSError:
+                # the reader went away, the failure is already known
+                pass
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+
+    def wait(abort=False):
+        thread.join()
+        if failures and not abort:
+            raise failures[0]
+
+    return PipeStream(reader, wait)
+
+
+def _zip_tree(archive, path, arcroot):
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            fullpath = os.path.join(root, filename)
+            if not os.path.isfile(fullpath):
+                continue
+            arcname = os.path.join(arcroot, os.path.relpath(fullpath, path))
+            archive.write(fullpath, arcname)
+
+
+def odoo_zip_stream(db_name, manifest, filestore, compression=zipfile.ZIP_DEFLATED):
+    """Stream an archive in the layout of Odoo's database manager backups
+    (``dump.sql``, ``manifest.json`` and ``filestore/``)."""
+    def produce(fileobj):
+        with zipfile.ZipFile(fileobj, 'w', compression=compression, allowZip64=True) as archive:
+            with pg_dump_stream(db_name, 'plain') as dump, \
+                    archive.open('dump.sql', 'w', force_zip64=True) as entry:
+                shutil.copyfileobj(dump, entry, CHUNK_SIZE)
+            archive.writestr('manifest.json', json.dumps(manifest, indent=4))
+            if os.path.exists(filestore):
+                _zip_tree(archive, filestore, 'filestore')
+    return thread_stream(produce, name='backup-zip-%s' % db_name)
+
+
+def zip_dir_stream(path, arcroot, compression=zipfile.ZIP_DEFLATED):
+    """Stream a zip archive of ``path`` whose entries live under ``arcroot``."""
+    def produce(fileobj):
+        with zipfile.ZipFile(fileobj, 'w', compression=compression, allowZip64=True) as archive:
+            if os.path.exists(path):
+                _zip_tree(archive, path, arcroot)
+    return thread_stream(produce, name='backup-zip-%s' % arcroot)
+
+
+class QueueStream(io.RawIOBase):
+    """Readable stream fed chunk by chunk through a bounded queue.
+
+    ``None`` marks the end of the data and an exception instance is raised
+    to the reader, e.g. when the producer of the fanned out stream failed.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.queue = queue.Queue(maxsize)
+        # set once the consumer stopped reading, the feeder then skips it
+        self.detached = False
+        self._buffer = memoryview(b'')
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._buffer and not self._eof:
+            item = self.queue.get()
+            if item is None or isinstance(item, BaseException):
+                self._eof = True
+                if item is not None:
+                    raise item
+            else:
+                self._buffer = memoryview(item)
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def put(self, item):
+        while not self.detached:
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+
+def fan_out(stream, consumers, queue_size=4, max_workers=None):
+    """Read ``stream`` once and feed it to every ``consumers[key](stream)``
+    concurrently, one thread per consumer.
+
+    Memory stays bounded by ``queue_size`` chunks per consumer: the slowest
+    consumer throttles the producer. A failing consumer is detached without
+    stopping the others. Return the exceptions raised by the consumers, by key.
+
+    Every consumer reads while the stream is produced, so they can't be run
+    ``max_workers`` at a time without staging the stream: more consumers
+    than ``max_workers`` is refused.
+    """
+    if max_workers and len(consumers) > max_workers:
+        raise ValueError("Cannot stream to %d destinations, %d at most"
+                         % (len(consumers), max_workers))
+    targets = {key: QueueStream(queue_size) for key in consumers}
+    failures = {}
+
+    def run(key):
+        target = targets[key]
+        try:
+            consumers[key](target)
+        except Exception as e:
+            failures[key] = e
+        finally:
+            target.detached = True
+
+    with ThreadPoolExecutor(max_workers=len(consumers), thread_name_prefix='backup-upload') as executor:
+        for key in consumers:
+            executor.submit(run, key)
+        end = None
+        try:
+            for chunk in iter_chunks(stream):
+                for target in targets.values():
+                    target.put(chunk)
+                if all(target.detached for target in targets.values()):
+                    break
+        except Exception as e:
+            end = e
+        for target in targets.values():
+            target.put(end)
+    return failures
+
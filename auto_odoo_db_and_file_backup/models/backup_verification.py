@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Restore verifications of the database backups.
+
+The latest database backup of a rule is downloaded back from its
+destination, its SHA-256 is checked against the one computed while it was
+uploaded, and it is restored with a parallel ``pg_restore`` into a scratch
+database on the local PostgreSQL server, which is dropped afterwards. The
+restore durations recorded here are the trend to watch for capacity
+planning.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+
+import odoo
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+from . import backup_destination, backup_stream
+
+_logger = logging.getLogger(__name__)
+
+
+class DatabaseBackupVerification(models.Model):
+    _name = 'database.backup.verification'
+    _description = 'Auto Database Backup Restore Verification'
+    _order = 'date desc, id desc'
+
+    name = fields.Char("Backup File", required=True)
+    rule_id = fields.Many2one('database.backup', "Backup Rule", required=True, ondelete='cascade', index=True)
+    artifact_id = fields.Many2one('database.backup.artifact', "Backup", ondelete='set null', index=True)
+    backup_destination = fields.Selection(related='rule_id.backup_destination', store=True, string="Destination")
+    date = fields.Datetime("Date", required=True, default=fields.Datetime.now)
+    state = fields.Selection([('success', 'Success'), ('failed', 'Failed')], "Status", required=True)
+    size = fields.Float("Size (bytes)", digits=(20, 0))
+    checksum_ok = fields.Boolean("Checksum Matches")
+    download_time = fields.Float("Download Time (s)")
+    restore_time = fields.Float("Restore Time (s)")
+    row_counts = fields.Text("Row Counts", help="Rows of the key tables, restored and live: {table: [restored, live]}.")
+    message = fields.Text("Error")
+
+    @api.model
+    def _cron_verify_backups(self):
+        """Verify the latest database backup of every rule with restore
+        verifications enabled, unless it was already verified."""
+        rules = self.env['database.backup'].search([('verify_restore', '=', True), ('backup_type', '!=', 'zip')])
+        for rec in rules:
+            artifact = self.env['database.backup.artifact'].search(
+                [('rule_id', '=', rec.id), ('kind', '=', 'database')], limit=1)
+            if not artifact or '.zip' in artifact.name or self.search_count([('artifact_id', '=', artifact.id)]):
+                continue
+            self._verify_artifact(artifact)
+
+    @api.model
+    def _scratch_db_name(self, artifact):
+        # PostgreSQL truncates identifiers to 63 bytes
+        return 'verify_%s_%s' % (self.env.cr.dbname[:40], artifact.id)
+
+    @api.model
+    def _count_table(self, cr, table):
+        """Return the number of rows of ``table`` or None when it does not exist."""
+        cr.execute("SELECT to_regclass(%s)", (table,))
+        if not cr.fetchone()[0]:
+            return None
+        cr.execute(SQL("SELECT count(*) FROM %s", SQL.identifier(table)))
+        return cr.fetchone()[0]
+
+    @api.model
+    def _count_rows(self, rec, db_name):
+        tables = [table.strip() for table in (rec.verify_tables or '').split(',') if table.strip()]
+        with odoo.sql_db.db_connect(db_name).cursor() as cr:
+            return {table: [self._count_table(cr, table), self._count_table(self.env.cr, table)] for table in tables}
+
+    @api.model
+    def _verify_artifact(self, artifact):
+        """Download, check and restore ``artifact`` into a scratch database;
+        return the verification record, successful or not."""
+        rec = artifact.rule_id
+        vals = {'name': artifact.name, 'rule_id': rec.id, 'artifact_id': artifact.id, 'size': artifact.size}
+        scratch_db = self._scratch_db_name(artifact)
+        try:
+            with tempfile.TemporaryDirectory(prefix='verify-%s-' % artifact.id) as work_dir:
+                path = os.path.join(work_dir, os.path.basename(artifact.name))
+                start = time.perf_counter()
+                with backup_destination.get_destination(rec) as destination, open(path, 'wb') as fp:
+                    destination.download(artifact.name, fp)
+                vals['download_time'] = time.perf_counter() - start
+                checksum = backup_stream.file_sha256(path)
+                vals['checksum_ok'] = checksum == artifact.checksum
+                if not vals['checksum_ok']:
+                    raise ValueError("SHA-256 mismatch: %s uploaded, %s downloaded." % (artifact.checksum, checksum))
+
+                if odoo.service.db.exp_db_exist(scratch_db):
+                    odoo.service.db.exp_drop(scratch_db)
+                odoo.service.db._create_empty_database(scratch_db)
+                start = time.perf_counter()
+                backup_stream.pg_restore(path, scratch_db, rec.restore_jobs)
+                vals['restore_time'] = time.perf_counter() - start
+
+            counts = self._count_rows(rec, scratch_db)
+            vals['row_counts'] = json.dumps(counts)
+            missing = [table for table, (restored, live) in counts.items() if restored is None or (live and not restored)]
+            if missing:
+                raise ValueError("Missing or empty tables in the restored database: %s" % ", ".join(missing))
+            vals['state'] = 'success'
+            _logger.info("Verified %s: restored in %.1fs.", artifact.name, vals['restore_time'])
+        except Exception as e:
+            _logger.exception("Verification of %s failed.", artifact.name)
+            vals.update(state='failed', message=str(e))
+        finally:
+            if odoo.service.db.exp_db_exist(scratch_db):
+                odoo.service.db.exp_drop(scratch_db)
+        return self.create(vals)
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
 import os
+import base64
 import datetime
+import functools
+import hashlib
 from datetime import timedelta
 import time
 import shutil
 import json
-import tempfile
+import zipfile
 
 from odoo import models, fields, api,exceptions, _
 from odoo.exceptions import UserError,ValidationError, AccessDenied, RedirectWarning, UserError
@@ -26,19 +29,16 @@ import sys, subprocess
 from dateutil.relativedelta import relativedelta
 py_v = "python%s.%s" % (sys.version_info.major,sys.version_info.minor)
 # Replace the entire section from line 29 to line 83 with:
-import dropbox
-from dropbox.files import WriteMode
-from dropbox.exceptions import ApiError, AuthError
 from dropbox import DropboxOAuth2FlowNoRedirect  
 import http.client  
 import ftplib
 import paramiko
 from paramiko.ssh_exception import SSHException
-import boto3
-from botocore.exceptions import ClientError
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
 
+from . import backup_destination, backup_stream
+
 _intervalTypes = {
     'days': lambda interval: relativedelta(days=interval),
     'hours': lambda interval: relativedelta(hours=interval),
@@ -56,6 +56,17 @@ def execute(connector, method, *args):
         raise error
     return res
 
+# Scheduler of the backups to each destination, superseded by the all
+# destinations scheduler
+DESTINATION_CRONS = [
+    'auto_db_backup_scheduler',
+    'auto_db_backup_scheduler_Gdrive',
+    'auto_db_backup_scheduler_dropbox',
+    'auto_db_backup_scheduler_ftp',
+    'auto_db_backup_scheduler_sftp',
+    'auto_db_backup_scheduler_AWSs3',
+]
+
 class ir_cron(models.Model):
     _inherit = "ir.cron"
         
@@ -165,6 +176,10 @@ class ir_cron(models.Model):
                 cron_cr.execute("UPDATE database_backup SET next_exec_dt=%s"+" WHERE id=%s",(
                 fields.Datetime.to_string(future_nextcall.astimezone(pytz.UTC)),
                 bid ))
+            if job['id'] == cron.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_all').id:
+                cron_cr.execute("UPDATE database_backup SET next_exec_dt=%s WHERE is_active",(
+                fields.Datetime.to_string(future_nextcall.astimezone(pytz.UTC)),
+                ))
                 
         cron_cr.execute("""
             DELETE FROM ir_cron_trigger
@@ -180,6 +195,26 @@ class AutoDatabaseBackupStatus(models.Model):
     
     name = fields.Char("Status")
     date = fields.Datetime("Date")
+    rule_id = fields.Many2one('database.backup', "Backup Rule", ondelete='set null', index=True)
+    backup_destination = fields.Selection(related='rule_id.backup_destination', store=True, string="Destination")
+    dump_time = fields.Float("Dump Time (s)", help="Time spent waiting for pg_dump and the archivers.")
+    compression_time = fields.Float("Compression Time (s)")
+    bytes_raw = fields.Float("Size Before Compression (bytes)", digits=(20, 0))
+    bytes_compressed = fields.Float("Uploaded Size (bytes)", digits=(20, 0))
+    upload_time = fields.Float("Upload Time (s)")
+    upload_speed = fields.Float("Upload Speed (MB/s)")
+    cleanup_time = fields.Float("Retention Cleanup Time (s)")
+    peak_rss = fields.Float("Peak Memory (MB)", help="Peak resident memory of the worker process during the run, "
+                                                     "sampled every second.")
+
+    _metric_fields = ['date', 'backup_destination', 'name', 'dump_time', 'compression_time', 'bytes_raw',
+                      'bytes_compressed', 'upload_time', 'upload_speed', 'cleanup_time', 'peak_rss']
+
+    def _get_metrics(self):
+        return [
+            dict(status, date=fields.Datetime.to_string(status['date']))
+            for status in self.read(self._metric_fields, load=None)
+        ]
         
 class AutoDatabaseBackup(models.Model):
     _name = 'auto.database.backup'
@@ -195,7 +230,48 @@ class AutoDatabaseBackup(models.Model):
                                        "If you fill in 5 the backups will be removed after 5 days.",
                                   )
     name = fields.Char("Filename")
+    keep_daily = fields.Integer("Daily Backups to Keep",
+                                help="Grandfather-father-son retention: number of days for which the latest backup "
+                                     "is kept. When no daily, weekly nor monthly backups are kept, the backups "
+                                     "older than 'Remove after x days' are removed instead.")
+    keep_weekly = fields.Integer("Weekly Backups to Keep", help="Number of weeks for which the latest backup is kept.")
+    keep_monthly = fields.Integer("Monthly Backups to Keep",
+                                  help="Number of months for which the latest backup is kept.")
+    max_parallel_uploads = fields.Integer("Parallel Uploads", default=4,
+                                          help="Maximum number of destinations a backup is streamed to at the same "
+                                               "time, 0 for no limit. The rules backing up the same "
+                                               "artifacts can't outnumber it.")
     bkpu_rules = fields.One2many('database.backup','backup_id',"Auto Database Backup Rules")
+
+    @api.constrains('max_parallel_uploads')
+    def _check_max_parallel_uploads(self):
+        self.env['database.backup']._check_max_parallel_uploads()
+
+    def _get_outdated_dates(self, dates):
+        """Return the run dates among ``dates`` falling out of the retention
+        policy. The latest run is always kept."""
+        self.ensure_one()
+        dates = sorted(set(dates), reverse=True)
+        kept = set(dates[:1])
+        if not (self.keep_daily or self.keep_weekly or self.keep_monthly):
+            limit = fields.Datetime.now() - timedelta(days=self.days_to_keep)
+            return {date for date in dates if date < limit} - kept
+        periods = (
+            (self.keep_daily, lambda date: date.date()),
+            (self.keep_weekly, lambda date: date.isocalendar()[:2]),
+            (self.keep_monthly, lambda date: (date.year, date.month)),
+        )
+        for keep, period in periods:
+            seen = set()
+            for date in dates:
+                key = period(date)
+                if key in seen:
+                    continue
+                if len(seen) >= keep:
+                    break
+                seen.add(key)
+                kept.add(date)
+        return set(dates) - kept
     
 class DatabaseBackup(models.Model):
     _name = 'database.backup'
@@ -224,11 +300,35 @@ class DatabaseBackup(models.Model):
                                       ('days', 'Days'),
                                       ('weeks', 'Weeks'),
                                       ('months', 'Months')], string='Interval Unit', default='days')
-    backup_type = fields.Selection([('zip', 'Zip'), ('dump', 'Dump')], 'Backup Type', required=True, default='zip')
+    backup_type = fields.Selection([('zip', 'Zip'), ('dump', 'Dump'), ('directory', 'Directory (Parallel Dump)')],
+                                   'Backup Type', required=True, default='zip')
+    dump_jobs = fields.Integer('Dump Jobs', default=4,
+                               help="Number of tables dumped in parallel by pg_dump for the Directory backup type.")
+    compression = fields.Selection([('none', 'None'), ('gzip', 'Gzip'), ('zstd', 'Zstandard'), ('lz4', 'LZ4')],
+                                   'Compression', required=True, default='none',
+                                   help="Compress the database and files backups on the fly while they are streamed "
+                                        "to the destination. Zip archives are then stored without deflate.")
+    compression_level = fields.Integer('Compression Level', default=0,
+                                       help="0 uses the default level of the codec (gzip: 6, zstd: 3, lz4: 0).")
+    compression_threads = fields.Integer('Compression Threads', default=0,
+                                         help="Number of zstd worker threads, 0 compresses in the backup thread and "
+                                              "-1 uses all the cores.")
     backup_destination = fields.Selection([('folder', 'Folder'), ('g_drive', 'Google Drive'),
                                            ('dropbox', 'Dropbox'),('ftp', 'FTP'),('sftp', 'SFTP'),('AWSs3','AWS S3')], 'Backup Destination', readonly=True,default='folder')
     next_exec_dt = fields.Datetime("Next Excecution Date",default=fields.Datetime.now,required=True,)
     backup = fields.Selection([('db_only', 'Database Only'), ('db_and_files', 'Database and Files')], 'Backup', default='db_only')
+    files_mode = fields.Selection([('full', 'Full Archive'), ('incremental', 'Incremental')], 'Files Backup Mode',
+                                  default='full',
+                                  help="Full Archive zips all the files on every run. Incremental only uploads new or "
+                                       "changed files, stored once by content, plus a small manifest per run.")
+    verify_restore = fields.Boolean('Verify Restores',
+                                    help="Periodically download the latest database backup of this rule, check its "
+                                         "SHA-256 and restore it into a scratch database to prove it is usable.")
+    restore_jobs = fields.Integer('Restore Jobs', default=4,
+                                  help="Number of tables restored in parallel by pg_restore during the verifications.")
+    verify_tables = fields.Char('Key Tables', default='res_partner,res_users,res_company,ir_attachment',
+                                help="Comma-separated tables whose rows are counted in the restored database. A table "
+                                     "missing or empty while it has rows in this database fails the verification.")
     files_path = fields.Selection(selection=_get_abs_file_path,string='Files Path', help="Mention files path for the files, you want to take backup.")
     folder = fields.Selection(selection=_get_abs_file_path2,string='Backup Directory', help='Absolute path for storing the backups')
     foldername = fields.Char("Foldername",help='Foldername for storing the backups',default="Backups")
@@ -281,6 +381,13 @@ class DatabaseBackup(models.Model):
     s3_secret_key_id = fields.Char("AWS S3 secret key")
     s3_bucket_name = fields.Char("Bucket Name")
     
+    @api.constrains('compression')
+    def _check_compression(self):
+        for rec in self:
+            if not backup_stream.is_compression_available(rec.compression):
+                raise ValidationError(_("The python library of the %s compression is not installed on the server.")
+                                      % dict(self._fields['compression'].selection).get(rec.compression))
+
     def get_gdrive_auth_code(self):
         print()
         
@@ -328,129 +435,40 @@ class DatabaseBackup(models.Model):
             rec.write({'next_exec_dt' : mind})
 
                    
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(DatabaseBackup, self).create(vals_list)
+        if records.filtered('is_active'):
+            self._sync_backup_crons()
+        return records
+
+    def _sync_backup_crons(self):
+        """Schedule the backups of the active rules with the all destinations
+        scheduler, producing each artifact once for all their destinations.
+        The scheduler of each destination would dump the database again."""
+        cron = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_all')
+        cron.write({'active': bool(self.search_count([('is_active', '=', True)]))})
+        self.env['ir.cron'].browse([
+            self.env.ref('auto_odoo_db_and_file_backup.%s' % xmlid).id for xmlid in DESTINATION_CRONS
+        ]).filtered('active').write({'active': False})
+
     def write(self, vals):
         result = super(DatabaseBackup, self).write(vals)
         cr = self._cr
+        cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_all')
+        IrCron = self.env['ir.cron'].browse(cron_id.id)
         if "is_active" in vals:
-            if self.backup_destination == 'folder':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'active' : vals.get('is_active')})
-            elif self.backup_destination == 'g_drive':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_Gdrive')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'active' : vals.get('is_active')})
-            elif self.backup_destination == 'dropbox':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_dropbox')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'active' : vals.get('is_active')})
-            elif self.backup_destination == 'ftp':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_ftp')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'active' : vals.get('is_active')})
-            elif self.backup_destination == 'sftp':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_sftp')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'active' : vals.get('is_active')})
-            else:
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_AWSs3')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'active' : vals.get('is_active')})
+            self._sync_backup_crons()
         if "interval_number" in vals:
-            if self.backup_destination == 'folder':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_number' : vals.get('interval_number')})
-            elif self.backup_destination == 'g_drive':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_Gdrive')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_number' : vals.get('interval_number')})
-            elif self.backup_destination == 'dropbox':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_dropbox')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_number' : vals.get('interval_number')})
-            elif self.backup_destination == 'ftp':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_ftp')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_number' : vals.get('interval_number')})
-            elif self.backup_destination == 'sftp':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_sftp')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_number' : vals.get('interval_number')})
-            else:
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_AWSs3')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_number' : vals.get('interval_number')})
+            IrCron.write({'interval_number' : vals.get('interval_number')})
         if "interval_type" in vals:
-            if self.backup_destination == 'folder':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_type' : vals.get('interval_type')})
-            elif self.backup_destination == 'g_drive':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_Gdrive')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_type' : vals.get('interval_type')})
-            elif self.backup_destination == 'dropbox':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_dropbox')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_type' : vals.get('interval_type')})
-            elif self.backup_destination == 'ftp':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_ftp')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_type' : vals.get('interval_type')})
-            elif self.backup_destination == 'sftp':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_sftp')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_type' : vals.get('interval_type')})
-            else:
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_AWSs3')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                IrCron.write({'interval_type' : vals.get('interval_type')})
+            IrCron.write({'interval_type' : vals.get('interval_type')})
         if "next_exec_dt" in vals:
-            if self.backup_destination == 'folder':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                cr.execute("UPDATE ir_cron SET nextcall=%s WHERE id=%s",(
-                vals.get('next_exec_dt'),
-                cron_id.id
-            ))
-            elif self.backup_destination == 'g_drive':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_Gdrive')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                cr.execute("UPDATE ir_cron SET nextcall=%s WHERE id=%s",(
-                vals.get('next_exec_dt'),
-                cron_id.id
-            ))
-            elif self.backup_destination == 'dropbox':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_dropbox')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                cr.execute("UPDATE ir_cron SET nextcall=%s WHERE id=%s",(
-                vals.get('next_exec_dt'),
-                cron_id.id
-            ))
-            elif self.backup_destination == 'ftp':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_ftp')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                cr.execute("UPDATE ir_cron SET nextcall=%s WHERE id=%s",(
-                vals.get('next_exec_dt'),
-                cron_id.id
-            ))
-            elif self.backup_destination == 'sftp':
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_sftp')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                cr.execute("UPDATE ir_cron SET nextcall=%s WHERE id=%s",(
-                vals.get('next_exec_dt'),
-                cron_id.id
-            ))
-            else:
-                cron_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler_AWSs3')
-                IrCron = self.env['ir.cron'].browse(cron_id.id)
-                cr.execute("UPDATE ir_cron SET nextcall=%s WHERE id=%s",(
+            cr.execute("UPDATE ir_cron SET nextcall=%s WHERE id=%s",(
                 vals.get('next_exec_dt'),
                 cron_id.id
             ))
         return result
-    
     def trigger_direct(self):
         backup_destination = self.env.context.get('backup_destination')
         actid = self.env.context.get('id')
@@ -873,511 +891,227 @@ class DatabaseBackup(models.Model):
         send_mail = self.env['mail.mail'].create(values)
         send_mail.send()
             
-    @api.model
-    def schedule_auto_db_backup(self):
-        conf_ids = self.search([])
-        for rec in conf_ids:
-            if rec.is_active:
-                if rec.backup_destination == 'folder':
-                    user_tz = pytz.timezone(self.env.context.get('tz') or self.env.user.tz)
-                    date_today = pytz.utc.localize(datetime.datetime.today()).astimezone(user_tz)
-                    try:
-                        StatusObj = self.env['auto.database.backup.status']
-                        folder = rec.folder
-                        if rec.folder.endswith('/'):
-                            folder = rec.folder.strip('/')
-                        Folder_Path = folder + "/" + rec.foldername
-                        if not os.path.isdir(Folder_Path):
-                            os.makedirs(Folder_Path)
-                        # Create name for dumpfile.
-                        bkp_file = '%s_%s.%s' % ( self.env.cr.dbname,date_today.strftime('%Y-%m-%d_%H_%M_%S'), rec.backup_type)
-                        file_path = os.path.join(Folder_Path, bkp_file)
-                        bkp_folder = ""
-                        # try to backup database and write it away
-                        fp = open(file_path, 'wb')
-                        self._take_dump(self.env.cr.dbname, fp, 'database.backup',rec.backup_destination, rec.backup_type)
-                        fp.close()
-                        if rec.backup == 'db_and_files':
-                            fpath = rec.files_path.split('/')[-1]
-                            bkp_folder = '%s_%s.%s' % (fpath,date_today.strftime('%Y-%m-%d_%H_%M_%S'), "zip")
-                            bkp_folder_path  = os.path.join(Folder_Path,bkp_folder) 
-                            with tempfile.TemporaryDirectory() as dump_dirf:
-                                if os.path.exists(rec.files_path):
-                                    shutil.copytree(rec.files_path, os.path.join(dump_dirf, fpath))
-                                
-                                odoo.tools.osutil.zip_dir(dump_dirf, bkp_folder_path, include_dir=False, fnct_sort=None) 
-                            
-                        _logger.info("Backup Successfully Uploaded to Local.")
-                        StatusObj.create({'date': datetime.datetime.today(), 'name' : "Success"})
-                        if rec.backup_id.bkup_email:
-                            self.send_success_mail_notificaton(rec,bkp_file,bkp_folder) 
-                
-                    except Exception as error:
-                        _logger.debug(
-                            "Couldn't backup database %s. Bad database administrator password for server running at "
-                            % (self.env.cr.dbname,))
-                        _logger.debug("Exact error from the exception: " + str(error))
-                        StatusObj.create({'date': datetime.datetime.today(), 'name' : "Failed (Error: %s)" % (str(error))})
-                        if rec.backup_id.bkup_fail_email:
-                            self.send_fail_mail_notificaton(rec,bkp_file,bkp_folder,error) 
-                            
-                        continue
-        
-                    """
-                    Remove all old files (on local server) in case this is configured..
-                    """
-                    if rec.backup_id.autoremove:
-                        
-                        directory = Folder_Path
-                        # Loop over all files in the directory.
-                        for f in os.listdir(directory):
-                            fullpath = os.path.join(directory, f)
-                            # Only delete the ones which are from the current database
-                            # (Makes it possible to save different databases in the same folder)
-                            if self.env.cr.dbname in fullpath:
-                                timestamp = os.path.getmtime(os.path.join(directory, f)) 
-                                createtime = datetime.datetime.fromtimestamp(timestamp)
-                                now = datetime.datetime.now()
-                                delta = now.date() - createtime.date()
-                                if delta.days >= rec.backup_id.days_to_keep:
-                                    # Only delete files (which are .dump and .zip), no directories.
-                                    if os.path.isfile(fullpath) and (".dump" in f or '.zip' in f):
-                                        _logger.info("Delete local out-of-date file: " + fullpath)
-                                        os.remove(fullpath)
-                            if rec.backup == "db_and_files":
-                                fpath = rec.files_path.split('/')[-1]
-                                if fpath in fullpath:
-                                    timestamp = os.path.getmtime(os.path.join(directory, f)) 
-                                    createtime = datetime.datetime.fromtimestamp(timestamp)
-                                    now = datetime.datetime.now()
-                                    delta = now.date() - createtime.date()
-                                    if delta.days >= rec.backup_id.days_to_keep:
-                                        if os.path.isfile(fullpath) and ('.zip' in f):
-                                            _logger.info("Delete local out-of-date file: " + fullpath)
-                                            os.remove(fullpath)
-                                
-    def get_content_files(self,rec):
-        err = ""
+    def _get_backup_date(self):
         tz_value = self.env.context.get('tz') or self.env.user.tz or 'UTC'
         if not isinstance(tz_value, str):
             tz_value = 'UTC'
         user_tz = pytz.timezone(tz_value)
-        date_today = pytz.utc.localize(datetime.datetime.today()).astimezone(user_tz)
-        try:
-            # Create name for dumpfile.
-            bkp_file = '%s_%s.%s' % (self.env.cr.dbname,date_today.strftime('%Y-%m-%d_%H_%M_%S'), rec.backup_type)
-            
-            fd, patht = tempfile.mkstemp(bkp_file) #can use anything 
+        return pytz.utc.localize(datetime.datetime.today()).astimezone(user_tz)
+
+    def _get_backup_artifacts(self, rec, date_today):
+        """Return the ``(filename, kind, opener)`` of the artifacts of ``rec``.
+
+        ``opener`` returns a readable stream producing the uncompressed
+        artifact on the fly; it is only called when the destinations are ready
+        to receive it. ``filename`` already has the compression extension.
+        """
+        stamp = date_today.strftime('%Y-%m-%d_%H_%M_%S')
+        suffix = backup_stream.COMPRESSION_EXTENSIONS[rec.compression or 'none']
+        bkp_file = '%s_%s.%s%s' % (self.env.cr.dbname, stamp, backup_stream.BACKUP_EXTENSIONS[rec.backup_type], suffix)
+        # the selected codec replaces deflate inside the zip archives
+        zip_compression = zipfile.ZIP_DEFLATED if rec.compression == 'none' else zipfile.ZIP_STORED
+        artifacts = [(bkp_file, 'database', lambda: self._take_dump(
+            self.env.cr.dbname, None, 'database.backup', rec.backup_destination, rec.backup_type, jobs=rec.dump_jobs,
+            zip_compression=zip_compression))]
+        if rec.backup == 'db_and_files' and rec.files_mode != 'incremental':
+            fpath = rec.files_path.split('/')[-1]
+            bkp_folder = '%s_%s.%s%s' % (fpath, stamp, "zip", suffix)
+            artifacts.append((bkp_folder, 'files', lambda: backup_stream.zip_dir_stream(rec.files_path, fpath, zip_compression)))
+        return artifacts
+
+    def _remove_outdated_backups(self, rec, destination):
+        """Remove the backups of ``rec`` falling out of the retention policy,
+        as recorded in the artifacts catalogue."""
+        if rec.backup == 'db_and_files' and rec.files_mode == 'incremental':
+            self.env['database.backup.snapshot']._remove_outdated_snapshots(rec, destination)
+        self.env['database.backup.artifact']._remove_outdated_artifacts(rec, destination)
+
+    def _get_artifact_key(self, rec):
+        """Rules sharing this key produce identical artifacts."""
+        return (rec.backup_type, rec.dump_jobs, rec.compression, rec.compression_level, rec.compression_threads,
+                rec.backup, rec.files_path, rec.files_mode)
+
+    def _get_artifact_groups(self, rules):
+        """Group ``rules`` by the artifacts they share."""
+        groups = {}
+        for rec in rules:
+            key = self._get_artifact_key(rec)
+            groups[key] = groups.get(key, self.browse()) | rec
+        return list(groups.values())
+
+    def _get_max_parallel_uploads(self, rules):
+        """Return the number of destinations the artifacts of ``rules`` can be
+        streamed to at the same time, 0 for no limit."""
+        return min(rules.backup_id.filtered('max_parallel_uploads').mapped('max_parallel_uploads') or [0])
+
+    @api.constrains('is_active', 'backup_id', 'backup_type', 'dump_jobs', 'compression', 'compression_level',
+                    'compression_threads', 'backup', 'files_path', 'files_mode')
+    def _check_max_parallel_uploads(self):
+        # the artifacts are streamed to all their destinations at once
+        for group in self._get_artifact_groups(self.search([('is_active', '=', True)])):
+            max_uploads = self._get_max_parallel_uploads(group)
+            if max_uploads and len(group) > max_uploads:
+                raise ValidationError(_("%(count)s active rules back up the same artifacts, more than the %(max)s "
+                                        "parallel uploads allowed.") % {'count': len(group), 'max': max_uploads})
+
+    def _run_backups(self, rules):
+        """Back up ``rules``: each artifact is produced once per group of rules
+        sharing its settings and streamed to all their destinations at the
+        same time."""
+        for group in self._get_artifact_groups(rules):
+            self._run_backup_group(group)
+
+    def _run_backup_group(self, rules):
+        """Produce once the artifacts shared by ``rules``, stream them to all
+        their destinations and report the outcome of each destination in
+        ``auto.database.backup.status``.
+
+        Only the uploads run in worker threads, everything touching the ORM
+        (incremental files, retention, status, mails) stays in this thread.
+        """
+        run_date = fields.Datetime.now()
+        date_today = self._get_backup_date()
+        artifacts = self._get_backup_artifacts(rules[0], date_today)
+        bkp_file = artifacts[0][0]
+        bkp_folders = dict.fromkeys(rules.ids, artifacts[1][0] if len(artifacts) > 1 else "")
+        destinations = {}
+        errors = {}
+        metrics = {'dump_time': 0.0, 'compression_time': 0.0, 'bytes_raw': 0, 'bytes_compressed': 0}
+        upload_times = dict.fromkeys(rules.ids, 0.0)
+        cleanup_times = dict.fromkeys(rules.ids, 0.0)
+        catalogue = []
+
+        def timed_upload(rule_id, destination, filename, stream):
+            start = time.perf_counter()
             try:
-                self._take_dump(self.env.cr.dbname, patht, 'database.backup',rec.backup_destination, rec.backup_type)
-            except Exception as E:
-                print("Error: ",E)
-            
-            with open(patht, 'rb') as db_document:
-                db_content = db_document.read()
-            dbfile_content = ""
-            bkp_folder = ""
-            bkp_folder_path = ""
-            if rec.backup == 'db_and_files':
-                fpath = rec.files_path.split('/')[-1]
-                bkp_folder = '%s_%s.%s' % (fpath,date_today.strftime('%Y-%m-%d_%H_%M_%S'), "zip")
-                dump_dirf = tempfile.mkdtemp()
-                bkp_folder_path  = os.path.join(dump_dirf,bkp_folder) 
-                if os.path.exists(rec.files_path):
-                    shutil.copytree(rec.files_path, os.path.join(dump_dirf, fpath))
-                
-                odoo.tools.osutil.zip_dir(dump_dirf, bkp_folder_path, include_dir=False, fnct_sort=None)
-                with open(bkp_folder_path, 'rb') as dbfile_document:
-                    dbfile_content = dbfile_document.read()
-            return  bkp_file, patht, bkp_folder, bkp_folder_path, err, datetime.datetime.today(),db_content,dbfile_content  
-        except Exception as error:
-            _logger.debug(
-                "Couldn't backup database %s. Bad database administrator password for server running" % (
-                self.env.cr.dbname, ))
-            _logger.debug("Exact error from the exception: " + str(error)) 
-            return  "", "", "", "", error, datetime.datetime.today(),"",""
-        
+                destination.upload(stream, filename)
+            finally:
+                upload_times[rule_id] += time.perf_counter() - start
+
+        rss = backup_stream.RssMonitor().start()
+        try:
+            for rec in rules:
+                try:
+                    destination = backup_destination.get_destination(rec)
+                    destination.connect()
+                    destinations[rec.id] = destination
+                except Exception as error:
+                    errors[rec.id] = error
+            for filename, kind, opener in artifacts:
+                consumers = {
+                    rule_id: functools.partial(timed_upload, rule_id, destination, filename)
+                    for rule_id, destination in destinations.items() if rule_id not in errors
+                }
+                if not consumers:
+                    break
+                raw = backup_stream.CountingStream(opener())
+                compressed = backup_stream.compress_stream(
+                    raw, rules[0].compression, rules[0].compression_level, rules[0].compression_threads)
+                with backup_stream.CountingStream(compressed, hashlib.sha256()) as stream:
+                    errors.update(backup_stream.fan_out(
+                        stream, consumers, max_workers=self._get_max_parallel_uploads(rules)))
+                catalogue.extend({
+                    'name': filename,
+                    'rule_id': rule_id,
+                    'kind': kind,
+                    'date': run_date,
+                    'size': stream.bytes_read,
+                    'checksum': stream.digest.hexdigest(),
+                } for rule_id in consumers if rule_id not in errors)
+                metrics['dump_time'] += raw.elapsed
+                metrics['compression_time'] += getattr(compressed, 'elapsed', 0.0)
+                metrics['bytes_raw'] += raw.bytes_read
+                metrics['bytes_compressed'] += stream.bytes_read
+            self.env['database.backup.artifact'].create(catalogue)
+            for rec in rules:
+                if rec.id in errors:
+                    continue
+                try:
+                    destination = destinations[rec.id]
+                    if rec.backup == 'db_and_files' and rec.files_mode == 'incremental':
+                        bkp_folders[rec.id] = self.env['database.backup.snapshot']._backup_files(
+                            rec, destination, date_today).name
+                    _logger.info("Backup Successfully Uploaded to %s.",
+                                 dict(self._fields['backup_destination'].selection).get(rec.backup_destination))
+                    if rec.backup_id.autoremove:
+                        start = time.perf_counter()
+                        self._remove_outdated_backups(rec, destination)
+                        cleanup_times[rec.id] = time.perf_counter() - start
+                except Exception as error:
+                    errors[rec.id] = error
+        finally:
+            for destination in destinations.values():
+                try:
+                    destination.disconnect()
+                except Exception:
+                    _logger.warning("Couldn't close the connection to %s", destination.code, exc_info=True)
+            peak_rss = rss.stop()
+
+        StatusObj = self.env['auto.database.backup.status']
+        for rec in rules:
+            error = errors.get(rec.id)
+            upload_time = upload_times[rec.id]
+            values = dict(
+                metrics,
+                date=datetime.datetime.today(),
+                rule_id=rec.id,
+                upload_time=upload_time,
+                upload_speed=metrics['bytes_compressed'] / 1024.0 / 1024.0 / upload_time if upload_time else 0.0,
+                cleanup_time=cleanup_times[rec.id],
+                peak_rss=peak_rss,
+            )
+            if error:
+                _logger.error("Couldn't backup database %s to %s: %s", self.env.cr.dbname, rec.backup_destination, error)
+                StatusObj.create(dict(values, name="Failed (Error: %s)" % (str(error))))
+                if rec.backup_id.bkup_fail_email:
+                    self.send_fail_mail_notificaton(rec, bkp_file, bkp_folders[rec.id], error)
+            else:
+                StatusObj.create(dict(values, name="Success"))
+                if rec.backup_id.bkup_email:
+                    self.send_success_mail_notificaton(rec, bkp_file, bkp_folders[rec.id])
+        return not errors
+
+    def _check_gdrive_credentials(self, rules):
+        cred_fp = os.path.join(os.path.dirname(os.path.abspath(__file__))) + "/client_secrets.json"
+        if 'g_drive' in rules.mapped('backup_destination') and not os.path.exists(cred_fp):
+            raise UserError(_("client_secrets.json does not exist. First add credentials file in path auto_odoo_db_and_file_backup/models."))
+
+    def _schedule_backups(self, backup_destination):
+        rules = self.search([('is_active', '=', True), ('backup_destination', '=', backup_destination)])
+        self._check_gdrive_credentials(rules)
+        self._run_backups(rules)
+
+    @api.model
+    def schedule_auto_db_backup_all(self):
+        """Back up all the active rules in a single run, see ``_run_backups``."""
+        rules = self.search([('is_active', '=', True)])
+        self._check_gdrive_credentials(rules)
+        self._run_backups(rules)
+
+    @api.model
+    def schedule_auto_db_backup(self):
+        self._schedule_backups('folder')
+
     @api.model
     def schedule_auto_db_backup_to_Gdrive(self):
-        conf_ids = self.search([])
-        for rec in conf_ids:
-            if rec.is_active:
-                cred_fp = os.path.join(os.path.dirname(os.path.abspath(__file__))) + "/client_secrets.json"
-                if not os.path.exists(cred_fp):
-                    raise UserError(_("client_secrets.json does not exist. First add credentials file in path auto_odoo_db_and_file_backup/models."))
-                
-                StatusObj = self.env['auto.database.backup.status']
-                if rec.backup_destination == 'g_drive':
-                    bkp_file, file_path2, bkp_folder, bkp_folder_path, err, date_today,db_content, dbfile_content = self.get_content_files(rec)
-                    if err == "":
-                        status = 1
-                        self.google_drive_upload(rec, file_path2, bkp_file, bkp_file, bkp_folder, status, date_today,db_content,dbfile_content)
-                        status = 2
-                        time.sleep(3)
-                        if rec.backup == 'db_and_files':
-                            self.google_drive_upload(rec, bkp_folder_path, bkp_folder, bkp_file, bkp_folder, status, date_today,db_content,dbfile_content)
-                    else:
-                        StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(err))})
-    
+        self._schedule_backups('g_drive')
+
     @api.model
     def schedule_auto_db_backup_to_dropbox(self):
-        conf_ids = self.search([])
-        for rec in conf_ids:
-            if rec.is_active:
-                StatusObj = self.env['auto.database.backup.status']
-                if rec.backup_destination == 'dropbox':
-                    bkp_file, file_path2, bkp_folder, bkp_folder_path, err, date_today,db_content, dbfile_content = self.get_content_files(rec)
-                    if err == "":
-                        status = 1
-                        self.dropbox_upload(rec, file_path2, bkp_file,bkp_file,bkp_folder,status, date_today,db_content, dbfile_content)
-                        time.sleep(3)
-                        status = 2
-                        if rec.backup == 'db_and_files':
-                            self.dropbox_upload(rec, bkp_folder_path, bkp_folder,bkp_file,bkp_folder,status, date_today,db_content, dbfile_content )
-                    else:
-                        StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(err))})
-    
+        self._schedule_backups('dropbox')
+
     @api.model
     def schedule_auto_db_backup_to_ftp(self):
-        conf_ids = self.search([])
-        for rec in conf_ids:
-            if rec.is_active:
-                if rec.backup_destination == 'ftp':
-                    bkp_file, file_path2, bkp_folder, bkp_folder_path, err, date_today, db_content, dbfile_content = self.get_content_files(rec)
-                    self.ftp_upload(rec, file_path2, bkp_file, bkp_folder_path ,bkp_folder, err, date_today, db_content, dbfile_content)
-    
+        self._schedule_backups('ftp')
+
     @api.model
     def schedule_auto_db_backup_to_sftp(self):
-        conf_ids = self.search([])
-        for rec in conf_ids:
-            if rec.is_active:
-                if rec.backup_destination == 'sftp':
-                    bkp_file, file_path2, bkp_folder, bkp_folder_path, err, date_today,db_content,dbfile_content = self.get_content_files(rec)
-                    self.sftp_upload(rec, file_path2, bkp_file, bkp_folder_path ,bkp_folder, err, date_today,db_content,dbfile_content)
-    
+        self._schedule_backups('sftp')
+
     @api.model
     def schedule_auto_db_backup_to_AWSs3(self):
-        conf_ids = self.search([])
-        for rec in conf_ids:
-            if rec.is_active:
-                if rec.backup_destination == 'AWSs3':
-                    bkp_file, file_path2, bkp_folder, bkp_folder_path, err, date_today,db_content,dbfile_content = self.get_content_files(rec)
-                    self.AWSs3_upload(rec, file_path2, bkp_file, bkp_folder_path ,bkp_folder, err, date_today,db_content,dbfile_content)
-                                 
-    def get_datetime_format(self,date_time):
-        # convert to datetime object
-        date_time = datetime.datetime.strptime(date_time, "%Y%m%d%H%M%S").date()
-        # convert to human readable date time string
-        strdt = date_time.strftime("%Y-%m-%d")
-        return datetime.datetime.strptime(strdt, "%Y-%m-%d").date()
-    
-    def sftp_upload(self,rec, file_path, bkp_file, bkp_folder_path ,bkp_folder, err, date_today,db_content,dbfile_content):
-        StatusObj = self.env['auto.database.backup.status']
-        if err == "":
-            try:
-                if rec.is_pem_file_avail == True:
-                    cnopts = paramiko.CnOpts()
-                    cnopts.hostkeys = None
-                    with paramiko.Connection(host=rec.sftp_host, username=rec.sftp_user,
-                                           private_key=rec.sftp_keyfilepath, cnopts=cnopts) as sftp:
-                        remote = rec.sftp_file_path
-                        if remote.endswith('/'):
-                            remote = remote.strip('/')
-                        remoteFilePath = remote + "/" + bkp_file
-                        sftp.put(file_path, remoteFilePath)
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                        if rec.backup == 'db_and_files':
-                            remoteFilePath2 = remote + "/" + bkp_folder
-                            sftp.put(bkp_folder_path, remoteFilePath2)
-                            if os.path.exists(bkp_folder_path):
-                                os.remove(bkp_folder_path)
-                        _logger.info("Backup Successfully Uploaded to SFTP.")
-                        StatusObj.create({'date': date_today, 'name' : "Success"})
-                        if rec.backup_id.bkup_email:
-                            self.send_success_mail_notificaton(rec,bkp_file,bkp_folder)
-                        #remove files after x days if auto remove is true
-                        if rec.backup_id.autoremove:
-                            for entry in sftp.listdir_attr(remote):
-                                timestamp = entry.st_mtime
-                                createtime = datetime.datetime.fromtimestamp(timestamp).date()
-                                date_today1 = datetime.datetime.today().date()
-                                delta = date_today1 - createtime
-                                if delta.days >= rec.backup_id.days_to_keep:
-                                    if entry.filename.endswith(".zip") or entry.filename.endswith(".dump"):
-                                        filepath = remote + '/' + entry.filename
-                                        if self.env.cr.dbname in entry.filename:
-                                            sftp.remove(filepath)
-                                        if entry.filename.endswith(".zip") and rec.backup == 'db_and_files':
-                                            fpath = rec.files_path.split('/')[-1]
-                                            if fpath in entry.filename:
-                                                sftp.remove(filepath)
-                                        _logger.info("Delete SFTP out-of-date file.")
-                else:
-                    try:
-                        s = paramiko.SSHClient()
-                        s.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                        s.connect(rec.sftp_host, rec.sftp_port, rec.sftp_user, rec.sftp_keyfilepath, timeout=10)
-                        sftp = s.open_sftp()
-                        remote = rec.sftp_file_path
-                        if remote.endswith('/'):
-                            remote = remote.strip('/')
-                        remoteFilePath = remote + "/" + bkp_file
-                        sftp.put(file_path, remoteFilePath)
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                        if rec.backup == 'db_and_files':
-                            remoteFilePath2 = remote + "/" + bkp_folder
-                            sftp.put(bkp_folder_path, remoteFilePath2)
-                            if os.path.exists(bkp_folder_path):
-                                os.remove(bkp_folder_path)
-                        _logger.info("Backup Successfully Uploaded to SFTP.")
-                        StatusObj.create({'date': date_today, 'name' : "Success"})
-                        if rec.backup_id.bkup_email:
-                            self.send_success_mail_notificaton(rec,bkp_file,bkp_folder)
-                        #remove files after x days if auto remove is true
-                        if rec.backup_id.autoremove:
-                            for entry in sftp.listdir_attr(remote):
-                                timestamp = entry.st_mtime
-                                createtime = datetime.datetime.fromtimestamp(timestamp).date()
-                                date_today1 = datetime.datetime.today().date()
-                                delta = date_today1 - createtime
-                                if delta.days >= rec.backup_id.days_to_keep:
-                                    if entry.filename.endswith(".zip") or entry.filename.endswith(".dump"):
-                                        filepath = remote + '/' + entry.filename
-                                        if self.env.cr.dbname in entry.filename:
-                                            sftp.remove(filepath)
-                                        if entry.filename.endswith(".zip") and rec.backup == 'db_and_files':
-                                            fpath = rec.files_path.split('/')[-1]
-                                            if fpath in entry.filename:
-                                                sftp.remove(filepath)
-                                        _logger.info("Delete SFTP out-of-date file.")
-                        sftp.close()
-                    except Exception as e:
-                        _logger.critical('Error in SFTP : %s', str(e))
-                        StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(e))})
-                    finally:
-                        if s:
-                            s.close()
-            except Exception as err:
-                _logger.debug("ERROR: %s" % (err,))
-                StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(err))})
-                if rec.backup_id.bkup_fail_email:
-                    self.send_fail_mail_notificaton(rec,bkp_file,bkp_folder,err)
-        else:
-            StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(err))})
-    
-    def AWSs3_upload(self,rec, file_path, bkp_file, bkp_folder_path ,bkp_folder, err, date_today,db_content,dbfile_content):
-        StatusObj = self.env['auto.database.backup.status']
-        if err == "":
-            try:
-                s3_app_key_id = rec.s3_app_key_id
-                s3_secret_key_id = rec.s3_secret_key_id
-                client = boto3.client(
-                    's3',
-                    aws_access_key_id=s3_app_key_id,
-                    aws_secret_access_key=s3_secret_key_id
-                )
-                try:
-                    fp = open(file_path, 'rb')
-                    client.upload_fileobj(
-                        fp, rec.s3_bucket_name, bkp_file)
-                    fp.close()
-                except ClientError as e:
-                    _logger.debug("ERROR: %s" % (str(e),))
-                    StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(e))})
-                    if rec.backup_id.bkup_fail_email:
-                        self.send_fail_mail_notificaton(rec,bkp_file,bkp_folder,e)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                if rec.backup == 'db_and_files':
-                    try:
-                        fp1 = open(bkp_folder_path, 'rb')
-                        client.upload_fileobj(
-                            fp1, rec.s3_bucket_name, bkp_folder)
-                        fp1.close()
-                    except ClientError as e:
-                        _logger.debug("ERROR: %s" % (str(e),))
-                        StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(e))})
-                        if rec.backup_id.bkup_fail_email:
-                            self.send_fail_mail_notificaton(rec,bkp_file,bkp_folder,e)
-                    if os.path.exists(bkp_folder_path):
-                        os.remove(bkp_folder_path)
-                _logger.info("Backup Successfully Uploaded to AWS S3.")
-                StatusObj.create({'date': date_today, 'name' : "Success"})
-                if rec.backup_id.bkup_email:
-                    self.send_success_mail_notificaton(rec,bkp_file,bkp_folder)
-                #remove files after x days if auto remove is true
-                if rec.backup_id.autoremove:
-                    utc = pytz.UTC
-                    response = client.list_objects_v2(Bucket=rec.s3_bucket_name)
-                    KeystoDelete = []
-                    for object in response['Contents']:
-                        if self.env.cr.dbname in object['Key']:
-                            createtime = object['LastModified'].replace(tzinfo=utc).date()
-                            date_today1 = datetime.datetime.today().date()
-                            delta = date_today1 - createtime
-                            if delta.days >= rec.backup_id.days_to_keep:
-                                KeystoDelete.append({
-                                    'Key': object['Key']
-                                })
-                    
-                    if KeystoDelete:
-                        client.delete_objects(Bucket=rec.s3_bucket_name, Delete={
-                                              'Objects': KeystoDelete})
-                    if rec.backup == 'db_and_files':
-                        fpath = rec.files_path.split('/')[-1]
-                        KeystoDelete1 = []
-                        for object1 in response['Contents']:
-                            if fpath in object1['Key']:
-                                createtime1 = object1['LastModified'].replace(tzinfo=utc).date()
-                                date_today2 = datetime.datetime.today().date()
-                                delta1 = date_today2 - createtime1
-                                if delta1.days >= rec.backup_id.days_to_keep:
-                                    KeystoDelete1.append({
-                                        'Key': object1['Key']
-                                    })
-                        
-                        if KeystoDelete1:
-                            client.delete_objects(Bucket=rec.s3_bucket_name, Delete={
-                                                  'Objects': KeystoDelete1})
-                        
-                    _logger.info("Delete AWS S3 out-of-date file.")
-                    
-            except Exception as err:
-                _logger.debug("ERROR: %s" % (err,))
-                StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(err))})
-                if rec.backup_id.bkup_fail_email:
-                    self.send_fail_mail_notificaton(rec,bkp_file,bkp_folder,err)
-        else:
-            StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(err))})
-                        
-    def ftp_upload(self, rec, file_path, bkp_file, bkp_folder_path, bkp_folder,err,date_today,db_content, dbfile_content):
-        StatusObj = self.env['auto.database.backup.status']
-        if err == "":
-            try:
-                filename = bkp_file
-                ftp = ftplib.FTP(rec.ftp_address, timeout=300)
-                ftp.login(rec.ftp_usrnm, rec.ftp_pwd)
-                ftp.encoding = "utf-8"
-                ftp.cwd(rec.ftp_path)
-                os.chdir("/tmp")
-                buf=io.BytesIO(db_content)
-                buf.seek(0)
-                ftp.storbinary('STOR ' + filename, buf)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                if rec.backup == 'db_and_files':
-                    buf1=io.BytesIO(dbfile_content)
-                    buf1.seek(0)
-                    ftp.storbinary('STOR ' + bkp_folder, buf1)
-                    
-                _logger.info("Backup Successfully Uploaded to FTP.")
-                StatusObj.create({'date': date_today, 'name' : "Success"})
-                if rec.backup == 'db_and_files':    
-                    if os.path.exists(bkp_folder_path):
-                        os.remove(bkp_folder_path)
-                        
-                if rec.backup_id.bkup_email:
-                    self.send_success_mail_notificaton(rec,bkp_file,bkp_folder)
-                #remove files after x days if auto remove is true
-                if rec.backup_id.autoremove:
-                    for file_data in ftp.mlsd():
-                        file_name, meta = file_data
-                        create_date = self.get_datetime_format(meta.get("modify"))
-                        date_today1 = datetime.datetime.today().date()
-                        delta1 = date_today1 - create_date
-                        if delta1.days >= rec.backup_id.days_to_keep:
-                            if file_name.endswith(".zip") or file_name.endswith(".dump"):
-                                if self.env.cr.dbname in file_name:
-                                    ftp.delete(file_name)
-                                if file_name.endswith(".zip") and rec.backup == 'db_and_files':
-                                    fpath = rec.files_path.split('/')[-1]
-                                    if fpath in file_name:
-                                        ftp.delete(file_name)
-                                _logger.info("Delete FTP out-of-date file.")
-                ftp.quit()
-            except Exception as err:
-                _logger.debug("ERROR: %s" % (err,))
-                StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(err))})
-                if rec.backup_id.bkup_fail_email:
-                    self.send_fail_mail_notificaton(rec,bkp_file,bkp_folder,err)
-        else:
-            StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(err))})
-        
-    def dropbox_upload(self, rec, file_path, bkp_file, bkp_file2, bkp_folder,status,date_today,db_content, dbfile_content):
-        StatusObj = self.env['auto.database.backup.status']
-#         if rec.dropbox_token:
-        if rec.dropbox_refresh_token:
-#             TOKEN = rec.dropbox_token #old
-            TOKEN = rec.dropbox_refresh_token 
-            # Check for an access token
-            if (len(TOKEN) == 0):
-                _logger.debug("ERROR: Looks like you didn't add your access token. Please request again an authorization code.")
-        
-            # Create an instance of a Dropbox class, which can make requests to the API.
-#             dbx = dropbox.Dropbox(TOKEN,timeout=900) #old
-            with dropbox.Dropbox(oauth2_refresh_token=TOKEN, app_key=rec.d_app_key) as dbx:
-                # Check that the access token is valid
-                try:
-                    dbx.users_get_current_account()        
-                except AuthError as err:
-                    _logger.debug("ERROR: %s" % (err,))
-                    
-            
-                # Create a backup of the current settings file
-                with open(file_path, 'rb') as f:
-                    # We use WriteMode=overwrite to make sure that the settings in the file
-                    # are changed on upload
-                    try:
-                        dbx.files_upload(f.read(),"/"+ bkp_file, mode=WriteMode('overwrite'))
-                        _logger.info("Backup Successfully Uploaded to Dropbox.")
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                        if rec.backup == 'db_only' and status == 1:
-                            StatusObj.create({'date': date_today, 'name' : "Success"})
-                        if rec.backup == 'db_and_files' and status == 2:
-                            StatusObj.create({'date': date_today, 'name' : "Success"})
-                        if rec.backup_id.bkup_email:
-                            if rec.backup == 'db_only' and status == 1:
-                                self.send_success_mail_notificaton(rec,bkp_file,bkp_folder)
-                            if rec.backup == 'db_and_files' and status == 2:
-                                self.send_success_mail_notificaton(rec,bkp_file2,bkp_folder)
-                            
-                    except ApiError as err:
-                        # This checks for the specific error where a user doesn't have enough Dropbox space quota to upload this file
-                        if (err.error.is_path() and
-                                err.error.get_path().error.is_insufficient_space()):
-                            _logger.debug("ERROR: Cannot back up; insufficient space.")
-                        elif err.user_message_text:
-                            _logger.debug("ERROR: %s" % (err.user_message_text,))
-                            sys.exit()
-                        else:
-                            _logger.debug("ERROR: %s" % (err,))
-                            sys.exit()
-                        StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(err))})
-                        if rec.backup_id.bkup_fail_email:
-                            self.send_fail_mail_notificaton(rec,bkp_file2,bkp_folder,err)
-                
-                #remove files after x days if auto remove is true
-                if rec.backup_id.autoremove:
-                    for entry in dbx.files_list_folder('').entries:
-                        if entry.path_lower.endswith(".zip") or entry.path_lower.endswith(".dump"):
-                            date_today1 = datetime.datetime.today().date()
-                            create_date = entry.client_modified.date()
-                            delta1 = date_today1 - create_date
-                            if delta1.days >= rec.backup_id.days_to_keep:
-                                if self.env.cr.dbname in entry.name:
-                                    dbx.files_delete(entry.path_lower)
-                                if entry.path_lower.endswith(".zip") and rec.backup == 'db_and_files':
-                                    fpath = rec.files_path.split('/')[-1]
-                                    if fpath in entry.name:
-                                        dbx.files_delete(entry.path_lower)
-                                _logger.info("Delete Dropbox out-of-date file.")
-                
-        else:
-            _logger.debug("Something went wrong during the token generation. Please request again an authorization code .")
-                        
+        self._schedule_backups('AWSs3')
+
     def get_is_cred_avail(self):
         cred_fp = os.path.join(os.path.dirname(os.path.abspath(__file__))) + "/client_secrets.json"        
         for rec in self:
@@ -1434,193 +1168,11 @@ class DatabaseBackup(models.Model):
         gauth.SaveCredentialsFile(creds_fp) 
         _logger.info("Credentials saved to %s", creds_fp)
         return GoogleDrive(gauth)
-    
-    def google_drive_upload(self, rec, file_path, bkp_file,bkp_file2, bkp_folder, status, date_today,db_content,dbfile_content):
-        StatusObj = self.env['auto.database.backup.status']
-        # GOOGLE DRIVE UPLOAP
-        if rec.backup_destination == "g_drive":
-            try:
-                drive = rec.authorize_drive()
-                if status == 1: #db file
-                    db_backup_file = drive.CreateFile({'title': bkp_file})
-                    db_backup_file.SetContentFile(file_path)
-                    db_backup_file.Upload() 
-                else: #db filed & folders
-                    db_backup_file2 = drive.CreateFile({'title': bkp_folder})
-                    db_backup_file2.SetContentFile(bkp_file2)
-                    db_backup_file2.Upload() 
-                _logger.info("Backup Successfully Uploaded to Google Drive.")
-                if os.path.exists(file_path): 
-                    os.remove(file_path)
-                if rec.backup == 'db_only' and status == 1:
-                    StatusObj.create({'date': date_today, 'name' : "Success"})
-                if rec.backup == 'db_and_files' and status == 2:
-                    StatusObj.create({'date': date_today, 'name' : "Success"})
-                if rec.backup_id.bkup_email:
-                    if rec.backup == 'db_only' and status == 1:
-                        self.send_success_mail_notificaton(rec,bkp_file,bkp_folder)
-                    if rec.backup == 'db_and_files' and status == 2:
-                        self.send_success_mail_notificaton(rec,bkp_file2,bkp_folder) 
-                #AUTO REMOVE UPLOADED FILE
-                if rec.backup_id.autoremove:
-                    file_list = drive.ListFile({'q': "'root' in parents and trashed=false"}).GetList()
-                    for item in file_list:
-                        item_title = item['title']
-                        if self.env.cr.dbname in item['title']:
-                            date_today1 = datetime.datetime.today().date()
-                            create_date = datetime.datetime.strptime(str(item['createdDate'])[0:10], '%Y-%m-%d').date()
-                            delta = date_today1 - create_date
-                            if delta.days >= rec.backup_id.days_to_keep:                            
-                                #delete file from drive
-                                drive.CreateFile({'id': item['id']}).Delete()
-                                _logger.info("Deleted Google Drive out-of-date file %s." % (item_title,))                            
-                        elif rec.backup == 'db_and_files' and rec.files_path.split('/')[-1] in item['title']:
-                            date_today1 = datetime.datetime.today().date()
-                            create_date = datetime.datetime.strptime(str(item['createdDate'])[0:10], '%Y-%m-%d').date()         
-                            delta1 = date_today1 - create_date
-                            if delta1.days >= rec.backup_id.days_to_keep:
-                                #delete folders from drive
-                                drive.CreateFile({'id': item['id']}).Delete()
-                                _logger.info("Deleted Google Drive out-of-date folders %s." % (item_title,))
-                        else:
-                            continue        
-            except Exception as e:
-                _logger.debug("Backup Upload to Google drive Failed. Error: %s" % (str(e),))
-                StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(e))})
-                if rec.backup_id.bkup_fail_email:
-                    self.send_fail_mail_notificaton(rec,bkp_file2,bkp_folder,str(e))
-#     def google_drive_upload(self, rec, file_path, bkp_file,bkp_file2, bkp_folder, status, date_today,db_content,dbfile_content):
-#         StatusObj = self.env['auto.database.backup.status']
-#         g_drive = self.env['google.drive.config']
-#         access_token = self.get_access_token(rec,g_drive)
-#         # GOOGLE DRIVE UPLOAP
-#         if rec.backup_destination == "g_drive":
-#             ################
-#             headers = {"Authorization": "Bearer %s" % (access_token), 'Content-Type': 'application/json'}
-#             para1 = {
-#                 "name": "%s" % (str(bkp_file)),
-#             }
-#             fileSize = os.path.getsize(file_path)
-#             chunkSize = 4980736  # Almost 5 MB
-#             chunkTally = 0
-#             chunkData = []
-#             if status == 1:
-#                 fileData = io.BytesIO(db_content).getvalue()
-#                 # Chop data into chunks
-#                 wholeSize = fileSize
-#                 while wholeSize > 0:
-#                     if (chunkTally + 1) * chunkSize > fileSize:
-#                         chunkData.append(fileData[chunkTally * chunkSize:fileSize])
-#                     else:
-#                         chunkData.append(fileData[chunkTally * chunkSize:(chunkTally
-#                                          + 1) * chunkSize])
-#                     wholeSize -= chunkSize
-#                     chunkTally += 1
-#             else:
-#                 fileData = io.BytesIO(dbfile_content).getvalue()
-#                 # Chop data into chunks
-#                 wholeSize = fileSize
-#                 while wholeSize > 0:
-#                     if (chunkTally + 1) * chunkSize > fileSize:
-#                         chunkData.append(fileData[chunkTally * chunkSize:fileSize])
-#                     else:
-#                         chunkData.append(fileData[chunkTally * chunkSize:(chunkTally
-#                                          + 1) * chunkSize])
-#                     wholeSize -= chunkSize
-#                     chunkTally += 1
-#                     
-#             r = requests.post('https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable'
-#                 , headers=headers, data=json.dumps(para1))
-#             location = r.headers['location']
-#             
-#             chunkTally = 0
-#             for chunk in chunkData:
-#                 time.sleep(2)
-#                 if (chunkTally + 1) * chunkSize - 1 > fileSize - 1:
-#                     finalByte = fileSize - 1
-#                     chunkLength = fileSize - chunkTally * chunkSize
-#                 else:
-#                     finalByte = (chunkTally + 1) * chunkSize - 1
-#                     chunkLength = chunkSize
-#                 headers = {'Content-Length': str(chunkLength),
-#                            'Content-Range': 'bytes ' + str(chunkTally * chunkSize) \
-#                            + '-' + str(finalByte) + '/' + str(fileSize),
-#                            'Content-Type' : 'application/octet-stream'}
-#                 errr = 0
-#                 while (errr < 1):
-#                     try: 
-#                         res = requests.put(location, headers=headers, data=chunk)
-#                         errr = 1
-#                     except requests.exceptions.HTTPError as e:
-#                         StatusObj.create({'date': date_today, 'name' : "Failed (HTTPError: %s)" % (str(e))})
-#                     except requests.exceptions.ConnectionError as e:
-#                         StatusObj.create({'date': date_today, 'name' : "Failed (ConnectionError: %s)" % (str(e))})
-#                     except Exception as e:
-#                         StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(e))})
-#                         time.sleep(1)
-#                 chunkTally += 1
-#             ################
-#             if r.status_code == 200:
-#                 _logger.info("Backup Successfully Uploaded to Google Drive.")
-#                 if os.path.exists(file_path):
-#                     os.remove(file_path)
-#                 if rec.backup == 'db_only' and status == 1:
-#                     StatusObj.create({'date': date_today, 'name' : "Success"})
-#                 if rec.backup == 'db_and_files' and status == 2:
-#                     StatusObj.create({'date': date_today, 'name' : "Success"})
-#                 if rec.backup_id.bkup_email:
-#                     if rec.backup == 'db_only' and status == 1:
-#                             self.send_success_mail_notificaton(rec,bkp_file,bkp_folder)
-#                     if rec.backup == 'db_and_files' and status == 2:
-#                         self.send_success_mail_notificaton(rec,bkp_file2,bkp_folder)
-# 
-#             else:
-#                 response = r.json()
-#                 code = response['error']['code']
-#                 message = response['error']['errors'][0]['message']
-#                 reason = response['error']['errors'][0]['reason']
-#                 _logger.debug("Backup Upload to Google drive Failed. Code: %s, Message: %s, Reason: %s" % (code, message, reason))
-#                 StatusObj.create({'date': date_today, 'name' : "Failed (Error: %s)" % (str(message))})
-#                 if rec.backup_id.bkup_fail_email:
-#                     self.send_fail_mail_notificaton(rec,bkp_file2,bkp_folder,message)
-#                             
-#         # AUTO REMOVE UPLOADED FILE
-#         if rec.backup_id.autoremove:
-#             headers = {'Content-type': 'application/json', 'Accept': 'text/plain'}
-#             params = {
-#                 'access_token': access_token,
-#                 # 'q': "mimeType='application/zip'",
-#                 'fields': "nextPageToken,files(id,name, createdTime, modifiedTime, mimeType)"
-#             }
-#             url = "/drive/v3/files"
-#             status, content, ask_time = self.env['google.service']._do_request(url, params, headers, method='GET')
-#             
-#             for item in content['files']:
-#                 if self.env.cr.dbname in item['name']:
-#                     date_today1 = datetime.datetime.today().date()
-#                     create_date = datetime.datetime.strptime(str(item['createdTime'])[0:10], '%Y-%m-%d').date()
-#                     delta = date_today1 - create_date
-#                     if delta.days >= rec.backup_id.days_to_keep:
-#                         params = {
-#                             'access_token': access_token
-#                         }
-#                         url = "/drive/v3/files/%s" % (item['id'])
-#                         response = self.env['google.service']._do_request(url, params, headers, method='DELETE')
-#                 elif rec.backup == 'db_and_files' and rec.files_path.split('/')[-1] in item['name']:
-#                     date_today1 = datetime.datetime.today().date()
-#                     create_date = datetime.datetime.strptime(str(item['createdTime'])[0:10], '%Y-%m-%d').date()
-#     
-#                     delta1 = date_today1 - create_date
-#                     if delta1.days >= rec.backup_id.days_to_keep:
-#                         url1 = "/drive/v3/files/%s" % (item['id'])
-#                         response1 = self.env['google.service']._do_request(url1, params, headers, method='DELETE')
-#                 else:
-#                     continue
 
-                           
-    def _take_dump(self, db_name, stream, model, backup_destination,backup_format='zip'):
+    def _take_dump(self, db_name, stream, model, backup_destination, backup_format='zip', jobs=1,
+                   zip_compression=zipfile.ZIP_DEFLATED):
         """Dump database `db` into file-like object `stream` if stream is None
-        return a file object with the dump """
+        return a readable stream producing the dump on the fly """
 
         cron_user_id = self.env.ref('auto_odoo_db_and_file_backup.auto_db_backup_scheduler').user_id.id
         if self._name != 'database.backup' or cron_user_id != self.env.user.id:
@@ -1629,41 +1181,20 @@ class DatabaseBackup(models.Model):
 
         _logger.info('DUMP DB: %s format %s', db_name, backup_format)
 
-        cmd = ['pg_dump', '--no-owner']
-        cmd.append(db_name)
-
         if backup_format == 'zip':
-            with tempfile.TemporaryDirectory() as dump_dir:
-                filestore = odoo.tools.config.filestore(db_name)
-                if os.path.exists(filestore):
-                    shutil.copytree(filestore, os.path.join(dump_dir, 'filestore'))
-                with open(os.path.join(dump_dir, 'manifest.json'), 'w') as fh:
-                    db = odoo.sql_db.db_connect(db_name)
-                    with db.cursor() as cr:
-                        json.dump(self._dump_db_manifest(cr), fh, indent=4)
-                cmd.insert(-1, '--file=' + os.path.join(dump_dir, 'dump.sql'))
-                odoo.tools.exec_pg_command(*cmd)
-                if stream:
-                    odoo.tools.osutil.zip_dir(dump_dir, stream, include_dir=False, fnct_sort=lambda file_name: file_name != 'dump.sql')
-                else:
-                    t=tempfile.TemporaryFile()
-                    odoo.tools.osutil.zip_dir(dump_dir, t, include_dir=False, fnct_sort=lambda file_name: file_name != 'dump.sql')
-                    t.seek(0)
-                    return t
+            db = odoo.sql_db.db_connect(db_name)
+            with db.cursor() as cr:
+                manifest = self._dump_db_manifest(cr)
+            dump = backup_stream.odoo_zip_stream(db_name, manifest, odoo.tools.config.filestore(db_name), zip_compression)
+        elif backup_format == 'directory':
+            dump = backup_stream.pg_dump_directory_stream(db_name, jobs)
         else:
-            cmd.insert(-1, '--format=c')
-            stdin, stdout = odoo.tools.exec_pg_command_pipe(*cmd)
-            if stream:
-                if backup_destination == "folder":
-                    shutil.copyfileobj(stdout, stream)
-                else:
-                    try:
-                        with open(stream, 'wb') as f:
-                            f.write(stdout.read())
-                    except Exception as e:
-                        print("Error: ",e)
-            else:
-                return stdout
+            dump = backup_stream.pg_dump_stream(db_name, 'custom')
+        if stream:
+            with dump:
+                shutil.copyfileobj(dump, stream, backup_stream.CHUNK_SIZE)
+        else:
+            return dump
 
     def _dump_db_manifest(self, cr):
         pg_version = "%d.%d" % divmod(cr._obj.connection.server_version / 100, 100)
@@ -1 +1,2 @@
-from . import wiz
\ No newline at end of file
+from . import wiz
+from . import restore_wiz
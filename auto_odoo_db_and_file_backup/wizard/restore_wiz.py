@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+
+import odoo
+from odoo import fields, models, _
+from odoo.exceptions import AccessDenied, UserError
+
+from ..models import backup_stream
+
+_logger = logging.getLogger(__name__)
+
+
+class DatabaseRestoreWizard(models.TransientModel):
+    _name = 'database.restore.wiz'
+    _description = "Restore Database Backup Wizard"
+
+    backup_file_path = fields.Char("Backup File", required=True,
+                                   help="Absolute path on the server of a Dump or Directory backup, compressed or "
+                                        "not, e.g. /odoo/Backups/mydb_2024-01-01_00_00_00.tar.zst")
+    db_name = fields.Char("New Database Name", required=True)
+    restore_jobs = fields.Integer("Restore Jobs", default=4,
+                                  help="Number of tables restored in parallel by pg_restore.")
+    master_pwd = fields.Char("Master Password", required=True)
+
+    def action_restore(self):
+        self.ensure_one()
+        try:
+            odoo.service.db.check_super(self.master_pwd)
+        except AccessDenied:
+            raise UserError(_("Wrong master password."))
+        if not os.path.isfile(self.backup_file_path):
+            raise UserError(_("Backup file %s does not exist.") % self.backup_file_path)
+        if '.zip' in os.path.basename(self.backup_file_path):
+            raise UserError(_("Zip backups are restored from the database manager."))
+        if odoo.service.db.exp_db_exist(self.db_name):
+            raise UserError(_("Database %s already exists.") % self.db_name)
+
+        _logger.info('RESTORE DB: %s from %s with %s jobs', self.db_name, self.backup_file_path, self.restore_jobs)
+        odoo.service.db._create_empty_database(self.db_name)
+        try:
+            backup_stream.pg_restore(self.backup_file_path, self.db_name, self.restore_jobs)
+        except Exception as e:
+            odoo.service.db.exp_drop(self.db_name)
+            raise UserError(_("Restore failed: %s") % e)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'message': _("Database %s successfully restored.") % self.db_name,
+                'type': 'success',
+                'sticky': False,
+            }
+        }
@@ -44,6 +44,7 @@
         "views/res_partner_view.xml",
         "views/res_config_settings.xml",
         "views/contract_terminate_reason.xml",
+        "views/contract_invoicing_run.xml",
         "views/contract_portal_templates.xml",
     ],
     # "assets": {
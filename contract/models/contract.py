@@ -7,10 +7,12 @@
 # Copyright 2021 Tecnativa - Víctor Martínez
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 import logging
+from collections import defaultdict
+
+from markupsafe import Markup
 
 from odoo import Command, api, fields, models
 from odoo.exceptions import UserError, ValidationError
-from odoo.osv import expression
 from odoo.tools.translate import _
 
 _logger = logging.getLogger(__name__)
@@ -411,13 +413,7 @@ class ContractContract(models.Model):
             journal = (
                 self.journal_id
                 if self.journal_id.type == self.contract_type
-                else self.env["account.journal"].search(
-                    [
-                        ("type", "=", self.contract_type),
-                        ("company_id", "=", self.company_id.id),
-                    ],
-                    limit=1,
-                )
+                else self._get_default_journal(self.contract_type, self.company_id)
             )
         if not journal:
             raise ValidationError(
@@ -464,6 +460,18 @@ class ContractContract(models.Model):
             )
         return vals
 
+    @api.model
+    def _get_default_journal(self, contract_type, company):
+        """Return the journal of the documents of the contracts of
+        ``contract_type`` having no journal of this type."""
+        return self.env["account.journal"].search(
+            [
+                ("type", "=", contract_type),
+                ("company_id", "=", company.id),
+            ],
+            limit=1,
+        )
+
     def action_contract_send(self):
         self.ensure_one()
         template = self.env.ref("contract.email_contract_template", False)
@@ -516,29 +524,32 @@ class ContractContract(models.Model):
                 and contract_line.recurring_next_date <= date_ref
             )
 
-        lines2invoice = previous = self.env["contract.line"]
+        # ids of the lines to invoice, a recordset growing by union being
+        # quadratic in the number of lines
+        line_ids = []
+        previous_id = None
         current_section = current_note = False
         for line in self.contract_line_ids:
             if line.display_type == "line_section":
                 current_section = line
             elif line.display_type == "line_note" and not line.is_recurring_note:
                 if line.note_invoicing_mode == "with_previous_line":
-                    if previous in lines2invoice:
-                        lines2invoice |= line
+                    if line_ids and line_ids[-1] == previous_id:
+                        line_ids.append(line.id)
                     current_note = False
                 elif line.note_invoicing_mode == "with_next_line":
                     current_note = line
             elif line.is_recurring_note or not line.display_type:
                 if can_be_invoiced(line):
                     if current_section:
-                        lines2invoice |= current_section
+                        line_ids.append(current_section.id)
                         current_section = False
                     if current_note:
-                        lines2invoice |= current_note
-                    lines2invoice |= line
+                        line_ids.append(current_note.id)
+                    line_ids.append(line.id)
                     current_note = False
-            previous = line
-        return lines2invoice.sorted()
+            previous_id = line.id
+        return self.env["contract.line"].browse(line_ids).sorted()
 
     def _prepare_recurring_invoices_values(self, date_ref=False):
         """
@@ -548,6 +559,11 @@ class ContractContract(models.Model):
         :return: list of dictionaries (invoices values)
         """
         invoices_values = []
+        lines_to_update = []
+        # default journal of each contract type and company
+        journals = {}
+        # read the lines of all the contracts at once
+        self.fetch(["contract_line_ids"])
         for contract in self:
             if not date_ref:
                 date_ref = contract.recurring_next_date
@@ -558,7 +574,13 @@ class ContractContract(models.Model):
             contract_lines = contract._get_lines_to_invoice(date_ref)
             if not contract_lines:
                 continue
-            invoice_vals = contract._prepare_invoice(date_ref)
+            journal = contract.journal_id
+            if journal.type != contract.contract_type:
+                key = (contract.contract_type, contract.company_id)
+                if key not in journals:
+                    journals[key] = self._get_default_journal(*key)
+                journal = journals[key]
+            invoice_vals = contract._prepare_invoice(date_ref, journal=journal)
             invoice_vals["invoice_line_ids"] = []
             for line in contract_lines:
                 invoice_line_vals = line._prepare_invoice_line()
@@ -573,8 +595,9 @@ class ContractContract(models.Model):
                         Command.create(invoice_line_vals)
                     )
             invoices_values.append(invoice_vals)
-            # Force the recomputation of journal items
-            contract_lines._update_recurring_next_date()
+            lines_to_update.append(contract_lines)
+        # Force the recomputation of journal items
+        self.env["contract.line"].concat(*lines_to_update)._update_recurring_next_date()
         return invoices_values
 
     def recurring_create_invoice(self):
@@ -583,60 +606,100 @@ class ContractContract(models.Model):
         even if their next invoicing date is in the future.
         """
         invoices = self._recurring_create_invoice()
-        for invoice in invoices:
-            self.message_post(
-                body=_(
-                    "Contract manually invoiced: "
-                    "<a"
-                    '    href="#" data-oe-model="%(model_name)s" '
-                    '    data-oe-id="%(rec_id)s"'
-                    ">Invoice"
-                    "</a>"
+        bodies = {}
+        for contract, contract_invoices in self._get_invoices_by_contract(
+            invoices
+        ).items():
+            bodies[contract.id] = Markup("<br/>").join(
+                Markup(
+                    _(
+                        "Contract manually invoiced: "
+                        "<a"
+                        '    href="#" data-oe-model="%(model_name)s" '
+                        '    data-oe-id="%(rec_id)s"'
+                        ">Invoice"
+                        "</a>"
+                    )
                 )
                 % {
                     "model_name": invoice._name,
                     "rec_id": invoice.id,
                 }
+                for invoice in contract_invoices
             )
+        self.browse(bodies)._message_log_batch(bodies)
         return invoices
 
+    def _get_invoices_by_contract(self, invoices):
+        """Group ``invoices``, created from the contracts in self, by
+        contract, without searching the invoices of each contract.
+
+        :return: dictionary {contract: invoices}
+        """
+        contract_ids = set(self.ids)
+        invoices_by_contract = defaultdict(lambda: self.env["account.move"])
+        for invoice in invoices:
+            for contract in invoice.invoice_line_ids.contract_line_id.contract_id:
+                if contract.id in contract_ids:
+                    invoices_by_contract[contract] |= invoice
+        return invoices_by_contract
+
     @api.model
     def _invoice_followers(self, invoices):
         invoice_create_subtype = self.env.ref(
             "contract.mail_message_subtype_invoice_created"
         )
-        for item in self:
-            partner_ids = item.message_follower_ids.filtered(
-                lambda x: invoice_create_subtype in x.subtype_ids
-            ).mapped("partner_id")
+        followers = self.env["mail.followers"].search(
+            [
+                ("res_model", "=", self._name),
+                ("res_id", "in", self.ids),
+                ("subtype_ids", "in", invoice_create_subtype.id),
+            ]
+        )
+        partners_by_contract = defaultdict(set)
+        for follower in followers.filtered("partner_id"):
+            partners_by_contract[follower.res_id].add(follower.partner_id.id)
+        # the invoices having the same followers are subscribed together
+        invoices_by_partners = defaultdict(list)
+        for item, item_invoices in self._get_invoices_by_contract(invoices).items():
+            partner_ids = partners_by_contract.get(item.id)
             if partner_ids:
-                (invoices & item._get_related_invoices()).message_subscribe(
-                    partner_ids=partner_ids.ids
-                )
+                invoices_by_partners[frozenset(partner_ids)] += item_invoices.ids
+        for partner_ids, invoice_ids in invoices_by_partners.items():
+            invoices.browse(invoice_ids).message_subscribe(
+                partner_ids=list(partner_ids)
+            )
 
     @api.model
     def _add_contract_origin(self, invoices):
-        for item in self:
-            for move in invoices & item._get_related_invoices():
-                move.message_post(
-                    body=(
-                        _(
-                            (
-                                "%(msg)s by contract <a href=# data-oe-model=contract.contract"
-                                " data-oe-id=%(contract_id)d>%(contract)s</a>."
-                            ),
-                            msg=move._creation_message(),
-                            contract_id=item.id,
-                            contract=item.display_name,
-                        )
+        bodies = {}
+        for item, item_invoices in self._get_invoices_by_contract(invoices).items():
+            for move in item_invoices:
+                bodies[move.id] = Markup(
+                    _(
+                        "%(msg)s by contract <a href=# data-oe-model=contract.contract"
+                        " data-oe-id=%(contract_id)d>%(contract)s</a>."
                     )
-                )
+                ) % {
+                    "msg": move._creation_message(),
+                    "contract_id": item.id,
+                    "contract": item.display_name,
+                }
+        # all the messages are created at once
+        invoices.browse(bodies)._message_log_batch(bodies)
 
     def _recurring_create_invoice(self, date_ref=False):
+        """Create the next invoices of the contracts.
+
+        The origin messages and the followers of the invoices are not added
+        with the ``contract_no_invoice_chatter`` key of the context, for
+        the caller to add them later or not at all.
+        """
         invoices_values = self._prepare_recurring_invoices_values(date_ref)
         moves = self.env["account.move"].create(invoices_values)
-        self._add_contract_origin(moves)
-        self._invoice_followers(moves)
+        if not self.env.context.get("contract_no_invoice_chatter"):
+            self._add_contract_origin(moves)
+            self._invoice_followers(moves)
         self._compute_recurring_next_date()
         return moves
 
@@ -650,37 +713,26 @@ class ContractContract(models.Model):
             return self.__class__._recurring_create_invoice
 
     @api.model
-    def _cron_recurring_create(self, date_ref=False, create_type="invoice"):
+    def _cron_recurring_create(
+        self, date_ref=False, create_type="invoice", chunk_size=None
+    ):
         """
         The cron function in order to create recurrent documents
-        from contracts.
+        from contracts. The contracts are processed by chunks of
+        ``chunk_size``, committed one by one, in a run resumed if interrupted.
         """
-        _recurring_create_func = self._get_recurring_create_func(
-            create_type=create_type
-        )
         if not date_ref:
             date_ref = fields.Date.context_today(self)
-        domain = self._get_contracts_to_invoice_domain(date_ref)
-        domain = expression.AND(
-            [
-                domain,
-                [("generation_type", "=", create_type)],
-            ]
+        run = self.env["contract.invoicing.run"]._get_run(
+            date_ref, create_type=create_type, chunk_size=chunk_size
         )
-        contracts = self.search(domain)
-        companies = set(contracts.mapped("company_id"))
-        # Invoice by companies, so assignation emails get correct context
-        for company in companies:
-            contracts_to_invoice = contracts.filtered(
-                lambda c: c.company_id == company
-                and (not c.date_end or c.recurring_next_date <= c.date_end)
-            ).with_company(company)
-            _recurring_create_func(contracts_to_invoice, date_ref)
-        return True
+        return run._run()
 
     @api.model
-    def cron_recurring_create_invoice(self, date_ref=None):
-        return self._cron_recurring_create(date_ref, create_type="invoice")
+    def cron_recurring_create_invoice(self, date_ref=None, chunk_size=None):
+        return self._cron_recurring_create(
+            date_ref, create_type="invoice", chunk_size=chunk_size
+        )
 
     def action_terminate_contract(self):
         self.ensure_one()
@@ -0,0 +1,330 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
+import logging
+from collections import defaultdict
+
+import psycopg2
+
+from odoo import api, fields, models
+from odoo.osv import expression
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 100
+CHATTER_MODES = [
+    ("post", "Post"),
+    ("defer", "Defer"),
+    ("skip", "Skip"),
+]
+
+
+class ContractInvoicingRun(models.Model):
+    """Log of a run of the recurring invoicing cron.
+
+    The contracts to invoice are claimed by chunks, each chunk being
+    committed on its own, so that a failure only rolls back its chunk and an
+    interrupted run is resumed where it stopped. Several cron workers can
+    process the same run, the chunks being claimed with
+    ``FOR UPDATE SKIP LOCKED`` and their outcome logged in lines of the run,
+    the run itself being only written when it is done.
+    """
+
+    _name = "contract.invoicing.run"
+    _description = "Contract Invoicing Run"
+    _order = "id desc"
+
+    name = fields.Char(required=True, readonly=True)
+    date_ref = fields.Date(required=True, readonly=True)
+    create_type = fields.Char(required=True, readonly=True, default="invoice")
+    state = fields.Selection(
+        [("running", "Running"), ("done", "Done")],
+        default="running",
+        required=True,
+        readonly=True,
+    )
+    chunk_size = fields.Integer(default=DEFAULT_CHUNK_SIZE, readonly=True)
+    chatter = fields.Selection(
+        CHATTER_MODES,
+        default="post",
+        required=True,
+        readonly=True,
+        help="Post the origin messages and the followers of the documents with "
+        "them, after the commit of their chunk or not at all. The tracking of "
+        "the documents is disabled unless they are posted with them.",
+    )
+    date_start = fields.Datetime(default=fields.Datetime.now, readonly=True)
+    date_done = fields.Datetime(readonly=True)
+    line_ids = fields.One2many(
+        comodel_name="contract.invoicing.run.line",
+        inverse_name="run_id",
+        readonly=True,
+    )
+    done_count = fields.Integer(string="Processed", compute="_compute_counts")
+    failed_count = fields.Integer(string="Failed", compute="_compute_counts")
+    move_count = fields.Integer(string="Documents", compute="_compute_counts")
+
+    @api.depends("line_ids.state", "line_ids.move_count")
+    def _compute_counts(self):
+        counts = defaultdict(lambda: {"done": 0, "failed": 0, "moves": 0})
+        for run, state, count, move_count in self.env[
+            "contract.invoicing.run.line"
+        ]._read_group(
+            [("run_id", "in", self.ids)],
+            groupby=["run_id", "state"],
+            aggregates=["__count", "move_count:sum"],
+        ):
+            counts[run.id][state] = count
+            counts[run.id]["moves"] += move_count
+        for run in self:
+            run.done_count = counts[run.id]["done"]
+            run.failed_count = counts[run.id]["failed"]
+            run.move_count = counts[run.id]["moves"]
+
+    @api.model
+    def _get_run(self, date_ref, create_type="invoice", chunk_size=None):
+        """Return the running run of ``date_ref``, to resume it, or a new
+        one.
+
+        The runs left running from an earlier date are closed, the contracts
+        they did not process being due at ``date_ref`` too.
+        """
+        self.search(
+            [
+                ("date_ref", "<", date_ref),
+                ("create_type", "=", create_type),
+                ("state", "=", "running"),
+            ]
+        )._close()
+        run = self.search(
+            [
+                ("date_ref", "=", date_ref),
+                ("create_type", "=", create_type),
+                ("state", "=", "running"),
+            ],
+            limit=1,
+        )
+        if run:
+            return run
+        ICP = self.env["ir.config_parameter"].sudo()
+        if not chunk_size:
+            chunk_size = int(
+                ICP.get_param("contract.invoicing_chunk_size", DEFAULT_CHUNK_SIZE)
+            )
+        return self.create(
+            {
+                "name": f"{create_type} {date_ref}",
+                "date_ref": date_ref,
+                "create_type": create_type,
+                "chunk_size": chunk_size,
+                "chatter": ICP.get_param("contract.invoicing_chatter") or "post",
+            }
+        )
+
+    def _commit(self):
+        # the tests run in a single transaction
+        if not self.env.registry.in_test_mode():
+            self.env.cr.commit()
+
+    def _claim_chunk(self):
+        """Lock the next chunk of contracts to process, skipping the ones
+        locked by the other workers."""
+        self.ensure_one()
+        Contract = self.env["contract.contract"]
+        query = Contract._search(
+            expression.AND(
+                [
+                    Contract._get_contracts_to_invoice_domain(self.date_ref),
+                    [("generation_type", "=", self.create_type)],
+                ]
+            )
+        )
+        table = query.table
+        query.add_where(
+            SQL(
+                """NOT EXISTS (
+                    SELECT 1 FROM contract_invoicing_run_line line
+                    WHERE line.run_id = %(run_id)s AND line.contract_id = %(id)s
+                )""",
+                run_id=self.id,
+                id=SQL.identifier(table, "id"),
+            )
+        )
+        query.order = SQL(
+            "%s, %s",
+            SQL.identifier(table, "company_id"),
+            SQL.identifier(table, "id"),
+        )
+        query.limit = self.chunk_size
+        self.env.cr.execute(
+            SQL(
+                "%s FOR UPDATE OF %s SKIP LOCKED",
+                query.select(SQL.identifier(table, "id")),
+                SQL.identifier(table),
+            )
+        )
+        return Contract.browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _process_contracts(self, contracts):
+        """Create the documents of ``contracts`` company by company, so that
+        assignation emails get the correct context.
+
+        :return: the documents created
+        """
+        create_func = self.env["contract.contract"]._get_recurring_create_func(
+            create_type=self.create_type
+        )
+        context = {}
+        if self.chatter != "post":
+            context = {
+                "contract_no_invoice_chatter": True,
+                "mail_create_nolog": True,
+                "mail_notrack": True,
+            }
+        by_company = defaultdict(lambda: self.env["contract.contract"])
+        for contract in contracts:
+            if (
+                not contract.date_end
+                or contract.recurring_next_date <= contract.date_end
+            ):
+                by_company[contract.company_id] |= contract
+        moves = self.env["account.move"]
+        for company, company_contracts in by_company.items():
+            moves |= create_func(
+                company_contracts.with_company(company).with_context(**context),
+                self.date_ref,
+            )
+        return moves
+
+    def _post_chatter(self, contracts, moves):
+        """Post the origin messages and the followers of ``moves``, created
+        from ``contracts``, after the commit of their chunk."""
+        try:
+            with self.env.cr.savepoint():
+                contracts._add_contract_origin(moves)
+                contracts._invoice_followers(moves)
+        except Exception:
+            _logger.exception("Chatter of the documents of run %s failed", self.name)
+
+    def _run_chunk(self, contracts):
+        """Process a chunk of contracts and, if it fails, its contracts one
+        by one so that only the faulty ones are skipped."""
+        try:
+            with self.env.cr.savepoint():
+                moves = self._process_contracts(contracts)
+            done, errors = contracts, []
+        except Exception:
+            _logger.info(
+                "Chunk of run %s failed, processing its contracts one by one",
+                self.name,
+                exc_info=True,
+            )
+            moves = self.env["account.move"]
+            done = contracts.browse()
+            errors = []
+            for contract in contracts:
+                try:
+                    with self.env.cr.savepoint():
+                        moves |= self._process_contracts(contract)
+                    done |= contract
+                except Exception as e:
+                    _logger.exception("Recurring creation of %s failed", contract)
+                    errors.append((contract, str(e)))
+        # the run row is left untouched, as written by the other workers
+        moves_by_contract = {}
+        if moves._name == "account.move":
+            moves_by_contract = done._get_invoices_by_contract(moves)
+        self.env["contract.invoicing.run.line"].create(
+            [
+                {
+                    "run_id": self.id,
+                    "contract_id": contract.id,
+                    "state": "done",
+                    "move_count": len(moves_by_contract.get(contract, ())),
+                }
+                for contract in done
+            ]
+            + [
+                {
+                    "run_id": self.id,
+                    "contract_id": contract.id,
+                    "state": "failed",
+                    "error": error,
+                }
+                for contract, error in errors
+            ]
+        )
+        return done, moves
+
+    def _run(self):
+        """Process the contracts of the run until none is left to claim."""
+        self.ensure_one()
+        while self.state == "running":
+            contracts = self._claim_chunk()
+            if not contracts:
+                break
+            done, moves = self._run_chunk(contracts)
+            self._commit()
+            if moves and self.chatter == "defer":
+                self._post_chatter(done, moves)
+                self._commit()
+            self.env.invalidate_all()
+        self._close()
+        return True
+
+    def _close(self):
+        """Mark the running runs of ``self`` as done, unless another worker
+        already did."""
+        for run in self.filtered(lambda run: run.state == "running"):
+            try:
+                with self.env.cr.savepoint():
+                    run.write({"state": "done", "date_done": fields.Datetime.now()})
+            except psycopg2.errors.SerializationFailure:
+                _logger.info("Run %s already closed by another worker", run.name)
+                run.invalidate_recordset()
+                continue
+            run._commit()
+
+    @api.model
+    def _cron_run_worker(self, create_type="invoice"):
+        """Help the workers processing the running runs."""
+        for run in self.search(
+            [("state", "=", "running"), ("create_type", "=", create_type)]
+        ):
+            run._run()
+
+
+class ContractInvoicingRunLine(models.Model):
+    """Outcome of the processing of a contract by an invoicing run."""
+
+    _name = "contract.invoicing.run.line"
+    _description = "Contract Invoicing Run Line"
+    _order = "id"
+
+    run_id = fields.Many2one(
+        comodel_name="contract.invoicing.run",
+        required=True,
+        ondelete="cascade",
+        readonly=True,
+    )
+    contract_id = fields.Many2one(
+        comodel_name="contract.contract",
+        required=True,
+        ondelete="cascade",
+        index=True,
+        readonly=True,
+    )
+    state = fields.Selection(
+        [("done", "Processed"), ("failed", "Failed")],
+        required=True,
+        readonly=True,
+    )
+    move_count = fields.Integer(string="Documents", readonly=True)
+    error = fields.Text(readonly=True)
+
+    _sql_constraints = [
+        (
+            "run_contract_uniq",
+            "unique(run_id, contract_id)",
+            "A contract is processed once per invoicing run.",
+        )
+    ]
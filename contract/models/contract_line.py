@@ -3,15 +3,22 @@
 # Copyright 2020 Tecnativa - Pedro M. Baeza
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
+from collections import defaultdict
 from datetime import timedelta
 
 from dateutil.relativedelta import relativedelta
 
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
+from odoo.tools import SQL, ormcache, split_every
 
 from .contract_line_constraints import get_allowed
 
+# Number of lines recomputed at once by the state rollover
+ROLLOVER_BATCH_SIZE = 1000
+# Number of months of the forecast periods kept on the lines
+FORECAST_MONTHS = 24
+
 
 class ContractLine(models.Model):
     _name = "contract.line"
@@ -68,18 +75,23 @@ class ContractLine(models.Model):
         "and temporary one for which a user is not able to plan a"
         "successor in advance",
     )
+    # The state and the allowed actions depend on the date of the day: they
+    # are recomputed by cron_rollover_state for the lines whose dates are
+    # crossed by the date of the day.
     is_plan_successor_allowed = fields.Boolean(
-        string="Plan successor allowed?", compute="_compute_allowed"
+        string="Plan successor allowed?", compute="_compute_allowed", store=True
     )
     is_stop_plan_successor_allowed = fields.Boolean(
-        string="Stop/Plan successor allowed?", compute="_compute_allowed"
+        string="Stop/Plan successor allowed?", compute="_compute_allowed", store=True
+    )
+    is_stop_allowed = fields.Boolean(
+        string="Stop allowed?", compute="_compute_allowed", store=True
     )
-    is_stop_allowed = fields.Boolean(string="Stop allowed?", compute="_compute_allowed")
     is_cancel_allowed = fields.Boolean(
-        string="Cancel allowed?", compute="_compute_allowed"
+        string="Cancel allowed?", compute="_compute_allowed", store=True
     )
     is_un_cancel_allowed = fields.Boolean(
-        string="Un-Cancel allowed?", compute="_compute_allowed"
+        string="Un-Cancel allowed?", compute="_compute_allowed", store=True
     )
     state = fields.Selection(
         selection=[
@@ -91,7 +103,8 @@ class ContractLine(models.Model):
             ("canceled", "Canceled"),
         ],
         compute="_compute_state",
-        search="_search_state",
+        store=True,
+        index=True,
     )
     active = fields.Boolean(
         string="Active",
@@ -99,6 +112,13 @@ class ContractLine(models.Model):
         store=True,
         readonly=True,
     )
+    forecast_periods = fields.Json(
+        compute="_compute_forecast_periods",
+        store=True,
+        copy=False,
+        help="Currency and periods of the line to invoice in the next months, "
+        "each as [invoice date, period start, period end, amount].",
+    )
 
     @api.depends(
         "last_date_invoiced",
@@ -146,6 +166,7 @@ class ContractLine(models.Model):
                 rec.termination_notice_date = False
 
     @api.depends(
+        "display_type",
         "is_canceled",
         "date_start",
         "date_end",
@@ -195,119 +216,13 @@ class ContractLine(models.Model):
                 else:
                     rec.state = "closed"
 
-    @api.model
-    def _get_state_domain(self, state):
-        today = fields.Date.context_today(self)
-        if state == "upcoming":
-            return [
-                "&",
-                ("date_start", ">", today),
-                ("is_canceled", "=", False),
-            ]
-        if state == "in-progress":
-            return [
-                "&",
-                "&",
-                "&",
-                ("date_start", "<=", today),
-                ("is_canceled", "=", False),
-                "|",
-                ("date_end", ">=", today),
-                ("date_end", "=", False),
-                "|",
-                ("is_auto_renew", "=", True),
-                "&",
-                ("is_auto_renew", "=", False),
-                ("termination_notice_date", ">", today),
-            ]
-        if state == "to-renew":
-            return [
-                "&",
-                "&",
-                ("is_canceled", "=", False),
-                ("date_end", "<", today),
-                "|",
-                "&",
-                ("manual_renew_needed", "=", True),
-                ("successor_contract_line_id", "=", False),
-                ("is_auto_renew", "=", True),
-            ]
-        if state == "upcoming-close":
-            return [
-                "&",
-                "&",
-                "&",
-                "&",
-                "&",
-                ("date_start", "<=", today),
-                ("is_auto_renew", "=", False),
-                ("manual_renew_needed", "=", False),
-                ("is_canceled", "=", False),
-                ("termination_notice_date", "<", today),
-                ("date_end", ">=", today),
-            ]
-        if state == "closed":
-            return [
-                "&",
-                "&",
-                "&",
-                ("is_canceled", "=", False),
-                ("date_end", "<", today),
-                ("is_auto_renew", "=", False),
-                "|",
-                "&",
-                ("manual_renew_needed", "=", True),
-                ("successor_contract_line_id", "!=", False),
-                ("manual_renew_needed", "=", False),
-            ]
-        if state == "canceled":
-            return [("is_canceled", "=", True)]
-        if not state:
-            return [("display_type", "!=", False)]
-
-    @api.model
-    def _search_state(self, operator, value):
-        states = [
-            "upcoming",
-            "in-progress",
-            "to-renew",
-            "upcoming-close",
-            "closed",
-            "canceled",
-            False,
-        ]
-        if operator == "=":
-            return self._get_state_domain(value)
-        if operator == "!=":
-            domain = []
-            for state in states:
-                if state != value:
-                    if domain:
-                        domain.insert(0, "|")
-                    domain.extend(self._get_state_domain(state))
-            return domain
-        if operator == "in":
-            domain = []
-            for state in value:
-                if domain:
-                    domain.insert(0, "|")
-                domain.extend(self._get_state_domain(state))
-            return domain
-
-        if operator == "not in":
-            if set(value) == set(states):
-                return [("id", "=", False)]
-            return self._search_state(
-                "in", [state for state in states if state not in value]
-            )
-
     @api.depends(
         "date_start",
         "date_end",
         "last_date_invoiced",
         "is_auto_renew",
         "successor_contract_line_id",
-        "predecessor_contract_line_id",
+        "predecessor_contract_line_id.successor_contract_line_id",
         "is_canceled",
         "contract_id.is_terminated",
     )
@@ -347,6 +262,46 @@ class ContractLine(models.Model):
                         }
                     )
 
+    @api.depends(
+        "display_type",
+        "is_canceled",
+        "is_auto_renew",
+        "next_period_date_start",
+        "recurring_next_date",
+        "recurring_invoicing_type",
+        "recurring_invoicing_offset",
+        "recurring_rule_type",
+        "recurring_interval",
+        "date_end",
+        "price_subtotal",
+        "currency_id",
+    )
+    def _compute_forecast_periods(self):
+        for rec in self:
+            if rec.display_type or rec.is_canceled or not rec.recurring_next_date:
+                rec.forecast_periods = False
+                continue
+            schedule = self.get_recurrence_schedule(
+                rec.next_period_date_start,
+                rec.recurring_invoicing_type,
+                rec.recurring_invoicing_offset,
+                rec.recurring_rule_type,
+                rec.recurring_interval,
+                # the renewals of the line are forecast too
+                max_date_end=not rec.is_auto_renew and rec.date_end,
+                date_until=rec.recurring_next_date
+                + relativedelta(months=FORECAST_MONTHS),
+                next_invoice_date=rec.recurring_next_date,
+            )
+            rec.forecast_periods = {
+                "currency_id": rec.currency_id.id,
+                "periods": [
+                    [fields.Date.to_string(date) for date in period]
+                    + [rec.price_subtotal]
+                    for period in schedule
+                ],
+            }
+
     @api.constrains("is_auto_renew", "successor_contract_line_id", "date_end")
     def _check_allowed(self):
         """
@@ -592,11 +547,17 @@ class ContractLine(models.Model):
         )
         return first_date_invoiced, last_date_invoiced, recurring_next_date
 
+    @api.model
+    @ormcache("lang")
+    def _get_lang_date_format(self, lang):
+        return self.env["res.lang"].search([("code", "=", lang)]).date_format
+
     def _insert_markers(self, first_date_invoiced, last_date_invoiced):
         self.ensure_one()
-        lang_obj = self.env["res.lang"]
-        lang = lang_obj.search([("code", "=", self.contract_id.partner_id.lang)])
-        date_format = lang.date_format or "%m/%d/%Y"
+        date_format = (
+            self._get_lang_date_format(self.contract_id.partner_id.lang)
+            or "%m/%d/%Y"
+        )
         name = self.name
         name = name.replace("#START#", first_date_invoiced.strftime(date_format))
         name = name.replace("#END#", last_date_invoiced.strftime(date_format))
@@ -605,9 +566,12 @@ class ContractLine(models.Model):
     def _update_recurring_next_date(self):
         # FIXME: Change method name according to real updated field
         # e.g.: _update_last_date_invoiced()
+        # the lines having the same new date are written together
+        lines_by_date = defaultdict(list)
         for rec in self:
-            last_date_invoiced = rec.next_period_date_end
-            rec.write(
+            lines_by_date[rec.next_period_date_end].append(rec.id)
+        for last_date_invoiced, line_ids in lines_by_date.items():
+            self.browse(line_ids).write(
                 {
                     "last_date_invoiced": last_date_invoiced,
                 }
@@ -1062,12 +1026,151 @@ class ContractLine(models.Model):
             ("termination_notice_date", "<=", fields.Date.context_today(self)),
         ]
 
+    @api.model
+    def _get_state_rollover_domain(self, date_from, date_to):
+        """
+        This method builds the domain of the lines whose state or allowed
+        actions may change when the date of the day moves from ``date_from``
+        to ``date_to``: the lines starting, ending or reaching their
+        termination notice date in between.
+        :return: list (domain) usable on contract.line
+        """
+        return [
+            "|",
+            "|",
+            "&",
+            ("date_start", ">", date_from),
+            ("date_start", "<=", date_to),
+            "&",
+            ("date_end", ">=", date_from),
+            ("date_end", "<", date_to),
+            "&",
+            ("termination_notice_date", ">=", date_from),
+            ("termination_notice_date", "<", date_to),
+        ]
+
+    @api.model
+    def cron_rollover_state(self):
+        """Recompute the state and the allowed actions of the lines whose
+        dates were crossed since the last run, or of all the lines on the
+        first run."""
+        ICP = self.env["ir.config_parameter"].sudo()
+        today = fields.Date.context_today(self)
+        last_date = fields.Date.to_date(ICP.get_param("contract.line_state_date"))
+        if last_date == today:
+            return
+        domain = []
+        if last_date and last_date < today:
+            domain = self._get_state_rollover_domain(last_date, today)
+        line_ids = self.with_context(active_test=False).search(domain).ids
+        fnames = [
+            "state",
+            "is_plan_successor_allowed",
+            "is_stop_plan_successor_allowed",
+            "is_stop_allowed",
+            "is_cancel_allowed",
+            "is_un_cancel_allowed",
+        ]
+        for ids in split_every(ROLLOVER_BATCH_SIZE, line_ids):
+            lines = self.browse(ids)
+            for fname in fnames:
+                self.env.add_to_compute(self._fields[fname], lines)
+            lines.flush_recordset(fnames)
+            self.env.invalidate_all()
+        ICP.set_param("contract.line_state_date", fields.Date.to_string(today))
+
     @api.model
     def cron_renew_contract_line(self):
         domain = self._contract_line_to_renew_domain()
         to_renew = self.search(domain)
         to_renew.renew()
 
+    @api.model
+    def get_revenue_forecast(
+        self, months=12, groupby=("month",), domain=None, date_from=None
+    ):
+        """
+        Sum the amounts to invoice by the lines in the next months, from the
+        forecast periods kept on the lines rather than by simulating the
+        invoicing.
+        :param months: number of months forecast, up to FORECAST_MONTHS
+        :param groupby: keys of the groups among month, product_id,
+          partner_id, contract_id and company_id, the amounts being always
+          grouped by currency
+        :param domain: optional domain of the lines to forecast
+        :param date_from: optional first day of the forecast instead of today
+        :return: list of dictionaries, one per group, with the keys of the
+          group, currency_id and amount
+        """
+        self.browse().check_access("read")
+        self.flush_model(
+            ["forecast_periods", "product_id", "contract_id", "company_id"]
+        )
+        self.env["contract.contract"].flush_model(["partner_id"])
+        if not date_from:
+            date_from = fields.Date.context_today(self)
+        date_from = fields.Date.to_date(date_from)
+        date_to = date_from + relativedelta(months=min(months, FORECAST_MONTHS))
+        query = self._search(domain or [])
+        query.order = None
+        table = query.table
+        contract_alias = query.make_alias(table, "contract_id")
+        query.add_join(
+            "JOIN",
+            contract_alias,
+            "contract_contract",
+            SQL(
+                "%s = %s",
+                SQL.identifier(table, "contract_id"),
+                SQL.identifier(contract_alias, "id"),
+            ),
+        )
+        query.add_join(
+            "JOIN",
+            "period",
+            SQL(
+                "jsonb_array_elements(%s -> 'periods')",
+                SQL.identifier(table, "forecast_periods"),
+            ),
+            SQL("TRUE"),
+        )
+        invoice_date = SQL("(%s ->> 0)::date", SQL.identifier("period"))
+        query.add_where(
+            SQL("%s >= %s AND %s < %s", invoice_date, date_from, invoice_date, date_to)
+        )
+        columns = {
+            "month": SQL("date_trunc('month', %s)::date", invoice_date),
+            "product_id": SQL.identifier(table, "product_id"),
+            "partner_id": SQL.identifier(contract_alias, "partner_id"),
+            "contract_id": SQL.identifier(table, "contract_id"),
+            "company_id": SQL.identifier(table, "company_id"),
+            "currency_id": SQL(
+                "(%s ->> 'currency_id')::int",
+                SQL.identifier(table, "forecast_periods"),
+            ),
+        }
+        groupby = [key for key in groupby if key != "currency_id"]
+        unknown = set(groupby) - set(columns)
+        if unknown:
+            raise ValueError(f"Invalid groupby: {', '.join(sorted(unknown))}")
+        keys = [*groupby, "currency_id"]
+        group_columns = [columns[key] for key in keys]
+        rows = self.env.execute_query(
+            SQL(
+                "%s GROUP BY %s ORDER BY %s",
+                query.select(
+                    *group_columns,
+                    SQL("SUM((%s ->> 3)::numeric)", SQL.identifier("period")),
+                ),
+                SQL(", ").join(group_columns),
+                SQL(", ").join(group_columns),
+            )
+        )
+        return [
+            dict(zip(keys, row[:-1], strict=True), amount=float(row[-1]))
+            for row in rows
+        ]
+
     @api.model
     def get_view(self, view_id=None, view_type="form", **options):
         default_contract_type = self.env.context.get("default_contract_type")
@@ -237,3 +237,57 @@ class ContractRecurrencyMixin(models.AbstractModel):
                 days=recurring_invoicing_offset
             )
         return recurring_next_date
+
+    @api.model
+    def get_recurrence_schedule(
+        self,
+        next_period_date_start,
+        recurring_invoicing_type,
+        recurring_invoicing_offset,
+        recurring_rule_type,
+        recurring_interval,
+        max_date_end,
+        date_until,
+        next_invoice_date=False,
+    ):
+        """Expand a recurrence into its next periods, as they will be
+        invoiced one after the other.
+
+        The next invoice date, if given, is the one of the first period, the
+        following ones being computed from the recurrence options only.
+
+        :return: list of tuples (invoice date, period start, period end) of
+          the periods invoiced until ``date_until``
+        """
+        schedule = []
+        date_start = next_period_date_start
+        while date_start:
+            if not next_invoice_date:
+                next_invoice_date = self.get_next_invoice_date(
+                    date_start,
+                    recurring_invoicing_type,
+                    recurring_invoicing_offset,
+                    recurring_rule_type,
+                    recurring_interval,
+                    max_date_end=max_date_end,
+                )
+            date_end = self.get_next_period_date_end(
+                date_start,
+                recurring_rule_type,
+                recurring_interval,
+                max_date_end=max_date_end,
+                next_invoice_date=next_invoice_date,
+                recurring_invoicing_type=recurring_invoicing_type,
+                recurring_invoicing_offset=recurring_invoicing_offset,
+            )
+            if (
+                not next_invoice_date
+                or not date_end
+                or date_end < date_start
+                or next_invoice_date > date_until
+            ):
+                break
+            schedule.append((next_invoice_date, date_start, date_end))
+            date_start = date_end + relativedelta(days=1)
+            next_invoice_date = False
+        return schedule
@@ -3,6 +3,8 @@
 
 from odoo import fields, models
 
+from .contract_invoicing_run import CHATTER_MODES
+
 
 class ResConfigSettings(models.TransientModel):
 
@@ -17,3 +19,13 @@ class ResConfigSettings(models.TransientModel):
         "behavior is to extend the end date of the contract by a new "
         "subscription period",
     )
+    contract_invoicing_chatter = fields.Selection(
+        CHATTER_MODES,
+        string="Chatter Of The Recurring Invoices",
+        config_parameter="contract.invoicing_chatter",
+        default="post",
+        help="Whether the recurring invoicing cron posts the origin messages "
+        "and the followers of the invoices with them, after each chunk of "
+        "contracts is committed, or not at all. Deferring or skipping them "
+        "also disables the tracking of the invoices created by the cron.",
+    )
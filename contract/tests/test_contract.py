@@ -8,6 +8,7 @@ from collections import namedtuple
 from datetime import timedelta
 
 from dateutil.relativedelta import relativedelta
+from freezegun import freeze_time
 
 from odoo import fields
 from odoo.exceptions import UserError, ValidationError
@@ -298,6 +299,39 @@ class TestContract(TestContractBase):
         self.assertTrue(invoice_daily)
         self.assertTrue(self.contract.partner_id in invoice_daily.message_partner_ids)
 
+    def test_contract_invoice_origin(self):
+        invoice = self.contract.recurring_create_invoice()
+        self.assertIn(self.contract.display_name, invoice.message_ids[0].body)
+        self.assertIn("Contract manually invoiced", self.contract.message_ids[0].body)
+
+    def _get_origin_messages(self, invoices, contract):
+        return invoices.message_ids.filtered(
+            lambda message: contract.display_name in message.body
+        )
+
+    def test_cron_recurring_create_invoice_chatter(self):
+        subtype = self.env.ref("contract.mail_message_subtype_invoice_created")
+        self.contract.message_subscribe(
+            partner_ids=self.contract.partner_id.ids, subtype_ids=subtype.ids
+        )
+        ICP = self.env["ir.config_parameter"].sudo()
+        ICP.set_param("contract.invoicing_chatter", "skip")
+        self.env["contract.contract"].cron_recurring_create_invoice()
+        invoice = self.contract._get_related_invoices()
+        self.assertTrue(invoice)
+        self.assertFalse(self._get_origin_messages(invoice, self.contract))
+        self.assertNotIn(self.contract.partner_id, invoice.message_partner_ids)
+        contract = self.contract.copy()
+        contract.message_subscribe(
+            partner_ids=contract.partner_id.ids, subtype_ids=subtype.ids
+        )
+        ICP.set_param("contract.invoicing_chatter", "defer")
+        self.env["contract.contract"].cron_recurring_create_invoice()
+        invoice = contract._get_related_invoices()
+        self.assertTrue(invoice)
+        self.assertTrue(self._get_origin_messages(invoice, contract))
+        self.assertIn(contract.partner_id, invoice.message_partner_ids)
+
     def test_contract_invoice_salesperson(self):
         self.acct_line.recurring_next_date = "2018-02-23"
         self.acct_line.recurring_rule_type = "daily"
@@ -1744,6 +1778,64 @@ class TestContract(TestContractBase):
             len(invoice_lines),
         )
 
+    def test_cron_recurring_create_invoice_chunks(self):
+        self.acct_line.date_start = "2018-01-01"
+        self.acct_line.recurring_invoicing_type = "post-paid"
+        self.acct_line.date_end = "2018-03-15"
+        contracts = self.contract2
+        for _i in range(10):
+            contracts |= self.contract.copy()
+        self.env["contract.contract"].cron_recurring_create_invoice(chunk_size=3)
+        run = self.env["contract.invoicing.run"].search([], limit=1)
+        self.assertEqual(run.state, "done")
+        self.assertEqual(run.chunk_size, 3)
+        self.assertFalse(run.failed_count)
+        self.assertTrue(contracts <= run.line_ids.contract_id)
+        self.assertEqual(run.done_count, len(run.line_ids))
+        self.assertEqual(run.move_count, sum(run.line_ids.mapped("move_count")))
+        self.assertEqual(
+            run.line_ids.filtered(lambda line: line.contract_id in contracts).mapped(
+                "move_count"
+            ),
+            [1] * len(contracts),
+        )
+        invoice_lines = self.env["account.move.line"].search(
+            [("contract_line_id", "in", contracts.mapped("contract_line_ids").ids)]
+        )
+        self.assertEqual(
+            len(contracts.mapped("contract_line_ids")),
+            len(invoice_lines),
+        )
+
+    def test_cron_recurring_create_invoice_stale_run(self):
+        Run = self.env["contract.invoicing.run"]
+        stale_run = Run._get_run(to_date("2018-01-01"))
+        self.assertEqual(stale_run.state, "running")
+        self.assertEqual(Run._get_run(to_date("2018-01-01")), stale_run)
+        run = Run._get_run(to_date("2018-02-01"))
+        self.assertNotEqual(run, stale_run)
+        self.assertEqual(stale_run.state, "done")
+        self.assertEqual(run.state, "running")
+
+    def test_recurring_create_invoice_several_contracts(self):
+        contracts = self.contract
+        for _i in range(3):
+            contracts |= self.contract.copy()
+        lines = contracts.contract_line_ids.filtered(lambda line: not line.display_type)
+        next_dates = {line: line.next_period_date_end for line in lines}
+        invoices = contracts._recurring_create_invoice()
+        self.assertEqual(len(invoices), len(contracts))
+        for contract in contracts:
+            invoice = invoices & contract._get_related_invoices()
+            self.assertEqual(
+                invoice.invoice_line_ids.contract_line_id,
+                contract.contract_line_ids.filtered(
+                    lambda line: not line.display_type
+                ),
+            )
+        for line, next_date in next_dates.items():
+            self.assertEqual(line.last_date_invoiced, next_date)
+
     def test_get_period_to_invoice_monthlylastday_postpaid(self):
         self.acct_line.date_start = "2018-01-05"
         self.acct_line.recurring_invoicing_type = "post-paid"
@@ -2057,8 +2149,6 @@ class TestContract(TestContractBase):
         self.assertEqual(set(lines.mapped("state")), set(states))
         lines = self.env["contract.line"].search([("state", "in", [])])
         self.assertFalse(lines.mapped("state"))
-        with self.assertRaises(TypeError):
-            self.env["contract.line"].search([("state", "in", "upcoming")])
         lines = self.env["contract.line"].search([("state", "not in", [])])
         self.assertEqual(set(lines.mapped("state")), set(states))
         lines = self.env["contract.line"].search([("state", "not in", states)])
@@ -2067,6 +2157,118 @@ class TestContract(TestContractBase):
         lines = self.env["contract.line"].search([("state", "not in", state2)])
         self.assertEqual(set(lines.mapped("state")), set(states) - set(state2))
 
+    def test_contract_line_state_rollover(self):
+        line = self.acct_line.copy(
+            {
+                "date_start": self.today + relativedelta(days=1),
+                "recurring_next_date": self.today + relativedelta(days=1),
+                "date_end": self.today + relativedelta(months=5),
+            }
+        )
+        closing_line = self.acct_line.copy(
+            {
+                "date_start": self.today - relativedelta(months=5),
+                "recurring_next_date": self.today - relativedelta(months=5),
+                "date_end": self.today,
+                "is_auto_renew": False,
+            }
+        )
+        self.assertEqual(line.state, "upcoming")
+        self.assertEqual(closing_line.state, "upcoming-close")
+        ICP = self.env["ir.config_parameter"].sudo()
+        ICP.set_param("contract.line_state_date", fields.Date.to_string(self.today))
+        tomorrow = self.today + relativedelta(days=1)
+        with freeze_time(tomorrow):
+            self.env["contract.line"].cron_rollover_state()
+            self.assertEqual(line.state, "in-progress")
+            self.assertEqual(closing_line.state, "closed")
+            self.assertEqual(
+                self.env["contract.line"].search([("state", "=", "closed")])
+                & closing_line,
+                closing_line,
+            )
+        self.assertEqual(
+            ICP.get_param("contract.line_state_date"), fields.Date.to_string(tomorrow)
+        )
+
+    def test_get_recurrence_schedule(self):
+        schedule = self.env["contract.line"].get_recurrence_schedule(
+            to_date("2018-01-01"),
+            "pre-paid",
+            0,
+            "monthly",
+            1,
+            max_date_end=False,
+            date_until=to_date("2018-03-15"),
+        )
+        self.assertEqual(
+            schedule,
+            [
+                (to_date("2018-01-01"), to_date("2018-01-01"), to_date("2018-01-31")),
+                (to_date("2018-02-01"), to_date("2018-02-01"), to_date("2018-02-28")),
+                (to_date("2018-03-01"), to_date("2018-03-01"), to_date("2018-03-31")),
+            ],
+        )
+        schedule = self.env["contract.line"].get_recurrence_schedule(
+            to_date("2018-01-01"),
+            "post-paid",
+            0,
+            "monthly",
+            1,
+            max_date_end=to_date("2018-02-15"),
+            date_until=to_date("2018-12-31"),
+        )
+        self.assertEqual(
+            schedule,
+            [
+                (to_date("2018-01-31"), to_date("2018-01-01"), to_date("2018-01-31")),
+                (to_date("2018-02-15"), to_date("2018-02-01"), to_date("2018-02-15")),
+            ],
+        )
+
+    def test_get_revenue_forecast(self):
+        Line = self.env["contract.line"]
+        domain = [("id", "=", self.acct_line.id)]
+        self.assertEqual(
+            len(self.acct_line.forecast_periods["periods"]),
+            len(
+                Line.get_recurrence_schedule(
+                    self.acct_line.next_period_date_start,
+                    self.acct_line.recurring_invoicing_type,
+                    self.acct_line.recurring_invoicing_offset,
+                    self.acct_line.recurring_rule_type,
+                    self.acct_line.recurring_interval,
+                    max_date_end=False,
+                    date_until=self.acct_line.recurring_next_date
+                    + relativedelta(months=24),
+                    next_invoice_date=self.acct_line.recurring_next_date,
+                )
+            ),
+        )
+        forecast = Line.get_revenue_forecast(
+            months=3, domain=domain, date_from="2018-01-01"
+        )
+        self.assertEqual(
+            [group["month"] for group in forecast],
+            [to_date("2018-01-01"), to_date("2018-02-01"), to_date("2018-03-01")],
+        )
+        self.assertEqual(
+            {group["amount"] for group in forecast}, {self.acct_line.price_subtotal}
+        )
+        self.acct_line.quantity = 2
+        forecast = Line.get_revenue_forecast(
+            months=3,
+            groupby=["partner_id", "product_id"],
+            domain=domain,
+            date_from="2018-01-01",
+        )
+        self.assertEqual(len(forecast), 1)
+        self.assertEqual(forecast[0]["partner_id"], self.contract.partner_id.id)
+        self.assertEqual(forecast[0]["product_id"], self.acct_line.product_id.id)
+        self.assertEqual(forecast[0]["amount"], 3 * self.acct_line.price_subtotal)
+        with self.assertRaises(ValueError):
+            Line.get_revenue_forecast(groupby=["name"])
+
     def test_check_auto_renew_contract_line_with_successor(self):
         """
         A contract line with a successor can't be set to auto-renew
@@ -1,3 +1,5 @@
 # -*- coding: utf-8 -*-
 
 from . import models
+from . import svcmgmt_outbox
+from . import svcmgmt_reconciliation
@@ -3,13 +3,16 @@ from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from datetime import datetime, timedelta
 import json
-import requests
 import logging
 
 _logger = logging.getLogger(__name__)
-from werkzeug.urls import url_join
 from odoo.addons.payment import utils as payment_utils
 
+from ..utils.client import SvcmgmtClient, SvcmgmtError
+
+# Fields sent to the service management API
+SVCMGMT_FIELDS = {'name', 'enabled', 'activated', 'partner_id', 'recurring_next_date', 'ip_address'}
+
 class ContractSettings(models.TransientModel):
     _inherit = 'res.config.settings'
     
@@ -36,20 +39,20 @@ class ContractContractInherited(models.Model):
                 sequence_value = self.env['ir.sequence'].next_by_code('contract.contract.sequence') or '/'
                 vals['name'] = sequence_value
         records = super(ContractContractInherited, self).create(vals_list)
+        self.env['contract.svcmgmt.outbox']._enqueue(records, 'create')
         for record in records:
-            self.call_external_api(record, 'create')
             record.recurring_create_invoice()
         return records
 
     def write(self, vals):
         res = super(ContractContractInherited, self).write(vals)
-        for record in self:
-            self.call_external_api(record, 'update')
+        # the values read from the account are not sent back to it
+        if SVCMGMT_FIELDS & set(vals) and not self.env.context.get('svcmgmt_synchronize'):
+            self.env['contract.svcmgmt.outbox']._enqueue(self, 'update')
         return res
 
     def unlink(self):
-        for record in self:
-            self.call_external_api(record, 'delete')
+        self.env['contract.svcmgmt.outbox']._enqueue(self, 'delete')
         return super(ContractContractInherited, self).unlink()
 
     def sync_data(self):
@@ -57,91 +60,65 @@ class ContractContractInherited(models.Model):
             self.call_external_api(record, 'synchronize')
         return True
 
+    def _get_svcmgmt_payload(self):
+        """Values of the service management account of the contract."""
+        self.ensure_one()
+        return {
+            "id": f"{self.name}",
+            "enabled": self.enabled,
+            "activated": self.activated,
+            "fullname": f"{self.partner_id.name}",
+            "company": f"{self.partner_id.company_id.name}",
+            "phone": f"{self.partner_id.phone}",
+            "mobile": f"{self.partner_id.mobile}",
+            "address": f"{self.partner_id.contact_address}",
+            "comment": f"{self.name}",
+            "gpslat": "0",
+            "gpslong": "0",
+            "expiration": f"{self.recurring_next_date.strftime('%Y-%m-%dT%H:%M') if self.recurring_next_date else ''}",
+            "staticip": f"{self.ip_address}",
+            "ipsubnet": "0",
+            "createdby": 1,
+            "nasid": "1",
+            "email": f"{self.partner_id.email}",
+            "downrate": "0",
+            "uprate": "0",
+            "enableburst": False,
+            "dlburstlimit": "0",
+            "ulburstlimit": "0",
+            "dlburstthreshold": "0",
+            "ulburstthreshold": "0",
+            "dlbursttime": "0",
+            "ulbursttime": "0",
+            "priority": "0"
+        }
 
     def call_external_api(self, record, operation):
-        api_enabled = self.env['ir.config_parameter'].sudo().get_param('contract_kkon_svcmgmt.api_enabled')
-        if api_enabled:
-            auth_token = ''
-            base_url = self.env['ir.config_parameter'].sudo().get_param('contract_kkon_svcmgmt.api_url')
-
-            try:
-                endpoint = "api/auth"
-                auth_url = url_join(base_url, endpoint)
-                auth_payload = {"email": self.env['ir.config_parameter'].sudo().get_param('contract_kkon_svcmgmt.api_username'), 
-                    "password": self.env['ir.config_parameter'].sudo().get_param('contract_kkon_svcmgmt.api_password')}
-                auth_response = requests.post(auth_url, json=auth_payload)
-                if auth_response.status_code == 200:
-                    auth_token = auth_response.text
+        """Create, update or delete the account of ``record`` through the
+        outbox, or synchronize the contract with its account at once."""
+        if operation in ('create', 'update', 'delete'):
+            self.env['contract.svcmgmt.outbox']._enqueue(record, operation)
+            return
+        client = SvcmgmtClient.from_env(self.env)
+        if not client:
+            return
+        try:
+            if operation == 'update_api_credentials':
+                client.clear_token()
+                client.get_token()
+            elif operation == 'synchronize':
+                response = client.request('GET', f"api/account/{record.name}", json={})
+                if response.status_code == 200:
+                    json_response = response.json()
+                    record.with_context(svcmgmt_synchronize=True).write({
+                        'enabled': json_response['enabled'],
+                        'activated': json_response['activated'],
+                        'ip_address': json_response['staticip']
+                    })
                 else:
-                    _logger.exception(f"Error: Request failed with status code {auth_response.status_code}")
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
-                _logger.exception("Unable to reach endpoint at %s", auth_url)
-
-            try:
-                endpoint = "api/account"
-                url = url_join(base_url, endpoint)
-                headers = {'x-auth-token': auth_token}
-                payload = {
-                    "id": f"{record.name}",
-                    "enabled": record.enabled,
-                    "activated": record.activated,
-                    "fullname": f"{record.partner_id.name}",
-                    "company": f"{record.partner_id.company_id.name}",
-                    "phone": f"{record.partner_id.phone}",
-                    "mobile": f"{record.partner_id.mobile}",
-                    "address": f"{record.partner_id.contact_address}",
-                    "comment": f"{record.name}",
-                    "gpslat": "0",
-                    "gpslong": "0",
-                    "expiration": f"{record.recurring_next_date.strftime('%Y-%m-%dT%H:%M')}",
-                    "staticip": f"{record.ip_address}",
-                    "ipsubnet": "0",
-                    "createdby": 1,
-                    "nasid": "1",
-                    "email": f"{record.partner_id.email}",
-                    "downrate": "0",
-                    "uprate": "0",
-                    "enableburst": False,
-                    "dlburstlimit": "0",
-                    "ulburstlimit": "0",
-                    "dlburstthreshold": "0",
-                    "ulburstthreshold": "0",
-                    "dlbursttime": "0",
-                    "ulbursttime": "0",
-                    "priority": "0"
-                }
-
-                if operation == 'create':
-                    response = requests.post(url, json=payload, headers=headers, timeout=10)
-                    if response.status_code == 200:
-                        pass
-                    else:
-                        _logger.exception(f"Error: Request failed with status code {response.status_code}")
-                elif operation == 'update':
-                    url = f"{url}/{record.name}"
-                    response = requests.put(url, json=payload, headers=headers, timeout=10)
-                    if response.status_code != 200:
-                        _logger.exception(f"Error: Request failed with status code {response.status_code}")
-                elif operation == 'synchronize':
-                    url = f"{url}/{ record.name}"
-                    payload={}
-                    response = requests.get(url, json=payload, headers=headers, timeout=10)
-                    if response.status_code == 200:
-                        json_response = response.json()
-                        self.write({
-                            'enabled': json_response['enabled'], 
-                            'activated': json_response['activated'], 
-                            'ip_address': json_response['staticip']
-                        })
-                    else:
-                        _logger.exception(f"Error: Request failed with status code {response.status_code}")
-                elif operation == 'delete':
-                    url = f"{url}/{record.name}"
-                    response = requests.delete(url, json=payload, headers=headers, timeout=10)
-                    if response.status_code != 200:
-                        _logger.exception(f"Error: Request failed with status code {response.status_code}")
-            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
-                _logger.exception("Unable to reach endpoint at %s", url)
+                    _logger.error(f"Error: Request failed with status code {response.status_code}")
+        except SvcmgmtError:
+            _logger.exception("Service management API call failed")
 
     def _generate_recurring_invoice(self):
         invoices = super(ContractContractInherited, self)._generate_recurring_invoice()
@@ -0,0 +1,158 @@
+from collections import defaultdict
+from datetime import timedelta
+import logging
+
+from odoo import models, fields, api
+
+from ..utils.client import SvcmgmtClient, SvcmgmtError
+
+_logger = logging.getLogger(__name__)
+
+# Number of operations delivered per transaction of the worker
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 8
+# Delay before the first retry, doubled at each attempt
+RETRY_DELAY = timedelta(minutes=1)
+MAX_RETRY_DELAY = timedelta(hours=6)
+
+
+class ContractSvcmgmtOutbox(models.Model):
+    """Operation on the service management account of a contract, saved
+    with the change of the contract and delivered by a cron once committed.
+
+    The operations pending for a service are delivered together: the account
+    is created, updated or deleted once, with the values of the contract at
+    the time of the delivery.
+    """
+    _name = 'contract.svcmgmt.outbox'
+    _description = 'Service Management API Outbox'
+    _order = 'id'
+
+    service_id = fields.Char(string='Service ID', required=True, index=True, readonly=True)
+    contract_id = fields.Many2one('contract.contract', ondelete='set null', readonly=True)
+    operation = fields.Selection(
+        [('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')],
+        required=True,
+        readonly=True,
+    )
+    payload = fields.Json(readonly=True, help='Values sent with a deletion, the contract being deleted.')
+    state = fields.Selection(
+        [('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')],
+        default='pending',
+        required=True,
+        readonly=True,
+    )
+    attempts = fields.Integer(readonly=True)
+    next_attempt = fields.Datetime(default=fields.Datetime.now, readonly=True)
+    date_done = fields.Datetime(readonly=True)
+    error = fields.Text(readonly=True)
+
+    def init(self):
+        self._cr.execute("""
+            CREATE INDEX IF NOT EXISTS contract_svcmgmt_outbox_pending_index
+            ON contract_svcmgmt_outbox (next_attempt, id) WHERE state = 'pending'
+        """)
+
+    @api.model
+    def _enqueue(self, contracts, operation):
+        """Queue ``operation`` for the accounts of ``contracts``."""
+        if not contracts or not SvcmgmtClient.from_env(self.env):
+            return
+        self.sudo().create([{
+            'service_id': contract.name,
+            'contract_id': contract.id if operation != 'delete' else False,
+            'operation': operation,
+            'payload': contract._get_svcmgmt_payload() if operation == 'delete' else False,
+        } for contract in contracts if contract.name])
+        self.env.ref('contract_kkon_svcmgmt.ir_cron_svcmgmt_outbox')._trigger()
+
+    def _deliver(self, client):
+        """Deliver the operations of one service, ``self`` being all its
+        pending operations."""
+        operations = self.mapped('operation')
+        service_id = self[0].service_id
+        contract = self.contract_id[-1:]
+        endpoint = f"api/account/{service_id}"
+        if 'delete' in operations:
+            if operations[0] == 'create':
+                # the account was never created
+                return
+            payload = self.filtered(lambda op: op.operation == 'delete')[-1].payload
+            response = client.request('DELETE', endpoint, json=payload)
+            if response.status_code == 404:
+                return
+        elif not contract.exists():
+            return
+        elif 'create' in operations:
+            response = client.request('POST', 'api/account', json=contract._get_svcmgmt_payload())
+        else:
+            response = client.request('PUT', endpoint, json=contract._get_svcmgmt_payload())
+        if response.status_code != 200:
+            raise SvcmgmtError(f"Request failed with status code {response.status_code}")
+
+    def _fetch_batch(self):
+        """Lock the pending operations of the next services due.
+
+        A service with an operation backing off waits for it, the operations
+        queued since being delivered with it in order.
+        """
+        self.env.cr.execute("""
+            SELECT id FROM contract_svcmgmt_outbox
+            WHERE state = 'pending' AND service_id IN (
+                SELECT service_id FROM contract_svcmgmt_outbox due
+                WHERE state = 'pending' AND next_attempt <= now() at time zone 'UTC'
+                AND NOT EXISTS (
+                    SELECT 1 FROM contract_svcmgmt_outbox backoff
+                    WHERE backoff.service_id = due.service_id AND backoff.state = 'pending'
+                    AND backoff.next_attempt > now() at time zone 'UTC'
+                )
+                ORDER BY next_attempt, id
+                LIMIT %s
+            )
+            ORDER BY id
+            FOR UPDATE SKIP LOCKED
+        """, [BATCH_SIZE])
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _cron_deliver(self):
+        client = SvcmgmtClient.from_env(self.env)
+        if not client:
+            return
+        while True:
+            batch = self._fetch_batch()
+            if not batch:
+                break
+            by_service = defaultdict(lambda: self.browse())
+            for operation in batch:
+                by_service[operation.service_id] |= operation
+            for operations in by_service.values():
+                try:
+                    operations._deliver(client)
+                except Exception as e:
+                    _logger.warning("Delivery of service %s failed", operations[0].service_id, exc_info=True)
+                    operations._retry_later(str(e))
+                else:
+                    operations.write({'state': 'done', 'date_done': fields.Datetime.now(), 'error': False})
+            # the deliveries are not sent again if the worker is killed
+            self.env.cr.commit()
+
+    def _retry_later(self, error):
+        now = fields.Datetime.now()
+        for operation in self:
+            attempts = operation.attempts + 1
+            delay = min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+            operation.write({
+                'attempts': attempts,
+                'next_attempt': now + delay,
+                'state': 'failed' if attempts >= MAX_ATTEMPTS else 'pending',
+                'error': error,
+            })
+
+    def action_retry(self):
+        self.filtered(lambda op: op.state == 'failed').write({
+            'state': 'pending',
+            'attempts': 0,
+            'next_attempt': fields.Datetime.now(),
+        })
+        self.env.ref('contract_kkon_svcmgmt.ir_cron_svcmgmt_outbox')._trigger()
@@ -0,0 +1,164 @@
+from collections import defaultdict
+import logging
+
+from odoo import models, fields, api
+from odoo.tools import split_every
+
+from ..utils.client import SvcmgmtClient
+
+_logger = logging.getLogger(__name__)
+
+# Fields of the contract read from the account, and the account key of each
+ACCOUNT_FIELDS = {
+    'enabled': 'enabled',
+    'activated': 'activated',
+    'ip_address': 'staticip',
+}
+# Number of contracts read at once
+CONTRACT_BATCH_SIZE = 1000
+
+
+class ContractSvcmgmtReconciliation(models.Model):
+    """Comparison of the contracts with the accounts of the service
+    management platform.
+
+    The status and IP address of the accounts are copied to their contracts,
+    and the accounts whose expiration differs from the next invoice date of
+    their contract are updated through the outbox. The differences found are
+    kept as the drift report of the reconciliation.
+    """
+    _name = 'contract.svcmgmt.reconciliation'
+    _description = 'Service Management Reconciliation'
+    _order = 'id desc'
+
+    name = fields.Char(required=True, readonly=True, default=lambda self: fields.Datetime.to_string(fields.Datetime.now()))
+    state = fields.Selection(
+        [('draft', 'Draft'), ('done', 'Done'), ('failed', 'Failed')],
+        default='draft',
+        required=True,
+        readonly=True,
+    )
+    apply = fields.Boolean(default=True, help='Apply the differences found, else only report them.')
+    account_count = fields.Integer(readonly=True)
+    contract_count = fields.Integer(readonly=True)
+    line_ids = fields.One2many('contract.svcmgmt.reconciliation.line', 'reconciliation_id', readonly=True)
+    error = fields.Text(readonly=True)
+
+    def _index_accounts(self, accounts):
+        """Index the accounts by service ID."""
+        return {str(account['id']): account for account in accounts if account.get('id')}
+
+    def _diff(self, contract_values, account):
+        """Return the differences between a contract and its account, as
+        ``{field: (contract value, account value)}``."""
+        diff = {}
+        for field, key in ACCOUNT_FIELDS.items():
+            value = account.get(key)
+            if field == 'ip_address':
+                value = value or False
+            if key in account and contract_values[field] != value:
+                diff[field] = (contract_values[field], value)
+        expiration = (account.get('expiration') or '')[:10]
+        next_date = contract_values['recurring_next_date']
+        next_date = next_date.isoformat() if next_date else ''
+        if 'expiration' in account and expiration != next_date:
+            diff['recurring_next_date'] = (next_date, expiration)
+        return diff
+
+    def _reconcile(self, accounts):
+        """Compare ``accounts``, the accounts of the platform, with the
+        contracts, and apply the differences."""
+        self.ensure_one()
+        Contract = self.env['contract.contract'].with_context(active_test=False)
+        index = self._index_accounts(accounts)
+        line_vals = []
+        # contracts with the same values to copy are written together
+        to_write = defaultdict(list)
+        to_update = []
+        seen = set()
+        contract_ids = Contract.search([('name', '!=', False)], order='id').ids
+        for ids in split_every(CONTRACT_BATCH_SIZE, contract_ids):
+            fnames = ['name', 'recurring_next_date', *ACCOUNT_FIELDS]
+            for values in Contract.browse(ids).read(fnames):
+                service_id = values['name']
+                account = index.get(service_id)
+                if account is None:
+                    line_vals.append({
+                        'service_id': service_id,
+                        'contract_id': values['id'],
+                        'kind': 'missing_account',
+                    })
+                    continue
+                seen.add(service_id)
+                diff = self._diff(values, account)
+                for field, (contract_value, account_value) in diff.items():
+                    line_vals.append({
+                        'service_id': service_id,
+                        'contract_id': values['id'],
+                        'kind': 'drift',
+                        'field': field,
+                        'contract_value': str(contract_value),
+                        'account_value': str(account_value),
+                    })
+                write_vals = tuple(
+                    (field, diff[field][1]) for field in ACCOUNT_FIELDS if field in diff
+                )
+                if write_vals:
+                    to_write[write_vals].append(values['id'])
+                if 'recurring_next_date' in diff:
+                    to_update.append(values['id'])
+            self.env.invalidate_all()
+        line_vals += [{
+            'service_id': service_id,
+            'kind': 'missing_contract',
+        } for service_id in index if service_id not in seen]
+        if self.apply:
+            for write_vals, ids in to_write.items():
+                Contract.browse(ids).with_context(svcmgmt_synchronize=True).write(dict(write_vals))
+            self.env['contract.svcmgmt.outbox']._enqueue(Contract.browse(to_update), 'update')
+        self.write({
+            'account_count': len(index),
+            'contract_count': len(contract_ids),
+            'line_ids': [(0, 0, vals) for vals in line_vals],
+            'state': 'done',
+        })
+
+    def action_run(self):
+        client = SvcmgmtClient.from_env(self.env)
+        for reconciliation in self.filtered(lambda rec: rec.state != 'done'):
+            if not client:
+                reconciliation.write({'state': 'failed', 'error': 'The service management API is disabled.'})
+                continue
+            try:
+                accounts = client.list_accounts()
+            except Exception as e:
+                _logger.exception("Reconciliation %s failed", reconciliation.name)
+                reconciliation.write({'state': 'failed', 'error': str(e)})
+                continue
+            reconciliation._reconcile(accounts)
+        return True
+
+    @api.model
+    def _cron_reconcile(self):
+        self.create({}).action_run()
+
+
+class ContractSvcmgmtReconciliationLine(models.Model):
+    _name = 'contract.svcmgmt.reconciliation.line'
+    _description = 'Service Management Reconciliation Difference'
+
+    reconciliation_id = fields.Many2one('contract.svcmgmt.reconciliation', required=True, ondelete='cascade', index=True)
+    service_id = fields.Char(string='Service ID', readonly=True)
+    contract_id = fields.Many2one('contract.contract', ondelete='set null', readonly=True)
+    kind = fields.Selection(
+        [
+            ('drift', 'Different'),
+            ('missing_account', 'No Account'),
+            ('missing_contract', 'No Contract'),
+        ],
+        required=True,
+        readonly=True,
+    )
+    field = fields.Char(readonly=True)
+    contract_value = fields.Char(readonly=True)
+    account_value = fields.Char(readonly=True)
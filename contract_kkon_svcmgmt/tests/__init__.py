@@ -0,0 +1,2 @@
+from . import test_svcmgmt_reconciliation
+from . import test_svcmgmt_outbox
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSvcmgmtOutbox(TransactionCase):
+
+    def test_fetch_batch_backoff(self):
+        Outbox = self.env['contract.svcmgmt.outbox']
+        # before the start of the transaction, now() in SQL
+        now = fields.Datetime.now() - timedelta(minutes=5)
+        backoff, update, other = Outbox.create([
+            {'service_id': 'SVC-OUTBOX-1', 'operation': 'update', 'attempts': 2,
+             'next_attempt': now + timedelta(hours=1)},
+            {'service_id': 'SVC-OUTBOX-1', 'operation': 'update', 'next_attempt': now},
+            {'service_id': 'SVC-OUTBOX-2', 'operation': 'update', 'next_attempt': now},
+        ])
+        self.env.flush_all()
+        batch = Outbox._fetch_batch()
+        self.assertIn(other, batch)
+        # the service waits for the operation backing off
+        self.assertNotIn(update, batch)
+        self.assertNotIn(backoff, batch)
+        backoff.next_attempt = now
+        self.env.flush_all()
+        batch = Outbox._fetch_batch()
+        self.assertIn(update, batch)
+        self.assertIn(backoff, batch)
@@ -0,0 +1,137 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+from urllib.parse import parse_qs, urlparse
+
+from odoo.tests import TransactionCase, tagged
+
+from ..utils.client import SvcmgmtClient
+
+
+class SvcmgmtStubHandler(BaseHTTPRequestHandler):
+    """Stub of the service management API serving ``server.accounts``."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path == '/api/auth':
+            self._send(200, 'token', 'text/plain')
+        else:
+            self._send(404, '{}')
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/api/account':
+            return self._send(404, '{}')
+        if self.headers.get('x-auth-token') != 'token':
+            return self._send(401, '{}')
+        accounts = self.server.accounts
+        if self.server.paginate:
+            params = parse_qs(url.query)
+            limit = int(params['limit'][0])
+            offset = (int(params['page'][0]) - 1) * limit
+            accounts = accounts[offset:offset + limit]
+        self.server.requests += 1
+        self._send(200, json.dumps({'data': accounts}))
+
+
+@tagged('post_install', '-at_install')
+class TestSvcmgmtReconciliation(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), SvcmgmtStubHandler)
+        cls.server.accounts = []
+        cls.server.paginate = True
+        cls.server.requests = 0
+        thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        thread.start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+        params = cls.env['ir.config_parameter'].sudo()
+        params.set_param('contract_kkon_svcmgmt.api_url', f'http://127.0.0.1:{cls.server.server_port}/')
+        params.set_param('contract_kkon_svcmgmt.api_username', 'user')
+        params.set_param('contract_kkon_svcmgmt.api_password', 'password')
+        partner = cls.env['res.partner'].create({'name': 'Subscriber'})
+        cls.contracts = cls.env['contract.contract'].create([{
+            'name': name,
+            'partner_id': partner.id,
+        } for name in ('SVC-TEST-1', 'SVC-TEST-2', 'SVC-TEST-3')])
+        # the contracts are created before enabling the API, out of the outbox
+        params.set_param('contract_kkon_svcmgmt.api_enabled', 'True')
+
+    def setUp(self):
+        super().setUp()
+        self.server.accounts = []
+        self.server.paginate = True
+        self.server.requests = 0
+
+    def _account(self, service_id, **values):
+        return dict({
+            'id': service_id,
+            'enabled': False,
+            'activated': False,
+            'staticip': None,
+            'expiration': '',
+        }, **values)
+
+    def test_list_accounts(self):
+        self.server.accounts = [self._account(f'SVC-{index}') for index in range(7)]
+        client = SvcmgmtClient.from_env(self.env)
+        accounts = client.list_accounts(page_size=2, max_workers=2)
+        self.assertEqual([account['id'] for account in accounts], [f'SVC-{index}' for index in range(7)])
+        # all the accounts returned on every page
+        self.server.paginate = False
+        self.server.requests = 0
+        accounts = client.list_accounts(page_size=2, max_workers=2)
+        self.assertEqual(len(accounts), 7)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_reconcile(self):
+        self.server.accounts = [
+            self._account('SVC-TEST-1', enabled=True, activated=True, staticip='10.0.0.1'),
+            self._account('SVC-TEST-2'),
+            self._account('SVC-TEST-3', expiration='2030-01-01T00:00'),
+            self._account('SVC-TEST-4'),
+        ]
+        reconciliation = self.env['contract.svcmgmt.reconciliation'].create({})
+        reconciliation.action_run()
+        self.assertEqual(reconciliation.state, 'done')
+        self.assertEqual(reconciliation.account_count, 4)
+        lines = reconciliation.line_ids.filtered(
+            lambda line: line.service_id.startswith('SVC-TEST-'))
+        drifts = {
+            (line.service_id, line.field): line.account_value
+            for line in lines.filtered(lambda line: line.kind == 'drift')
+        }
+        self.assertEqual(drifts, {
+            ('SVC-TEST-1', 'enabled'): 'True',
+            ('SVC-TEST-1', 'activated'): 'True',
+            ('SVC-TEST-1', 'ip_address'): '10.0.0.1',
+            ('SVC-TEST-3', 'recurring_next_date'): '2030-01-01',
+        })
+        self.assertEqual(
+            lines.filtered(lambda line: line.kind == 'missing_contract').mapped('service_id'),
+            ['SVC-TEST-4'],
+        )
+        self.assertFalse(lines.filtered(lambda line: line.kind == 'missing_account'))
+        contract_1, contract_2, contract_3 = self.contracts
+        self.assertTrue(contract_1.enabled)
+        self.assertTrue(contract_1.activated)
+        self.assertEqual(contract_1.ip_address, '10.0.0.1')
+        self.assertFalse(contract_2.enabled)
+        # the expiration of the account is updated from the contract
+        outbox = self.env['contract.svcmgmt.outbox'].search([('contract_id', 'in', self.contracts.ids)])
+        self.assertEqual(outbox.mapped('service_id'), ['SVC-TEST-3'])
+        self.assertEqual(outbox.operation, 'update')
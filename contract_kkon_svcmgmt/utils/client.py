@@ -0,0 +1,158 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import requests
+from werkzeug.urls import url_join
+
+_logger = logging.getLogger(__name__)
+
+TIMEOUT = 10
+# Seconds an auth token is reused before authenticating again
+TOKEN_LIFETIME = 30 * 60
+# Pages of accounts fetched at most, the listing failing beyond
+MAX_PAGES = 1000
+
+# Shared by the workers of the process: one connection pool per API URL, and
+# the auth token of each account
+_sessions = {}
+_tokens = {}
+_lock = threading.Lock()
+
+
+class SvcmgmtError(Exception):
+    """The service management API could not be reached or refused a call."""
+
+
+class SvcmgmtClient:
+    """Client of the service management API.
+
+    The HTTP connections are pooled in a session per API URL, and the auth
+    token is reused until it expires or is refused.
+    """
+
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+
+    @classmethod
+    def from_env(cls, env):
+        """Return the client of the configured API, None if it is disabled."""
+        params = env['ir.config_parameter'].sudo()
+        if not params.get_param('contract_kkon_svcmgmt.api_enabled'):
+            return None
+        return cls(
+            params.get_param('contract_kkon_svcmgmt.api_url'),
+            params.get_param('contract_kkon_svcmgmt.api_username'),
+            params.get_param('contract_kkon_svcmgmt.api_password'),
+        )
+
+    @property
+    def session(self):
+        with _lock:
+            if self.base_url not in _sessions:
+                _sessions[self.base_url] = requests.Session()
+            return _sessions[self.base_url]
+
+    @property
+    def _token_key(self):
+        return (self.base_url, self.username, self.password)
+
+    def get_token(self, refresh=False):
+        token, expiration = _tokens.get(self._token_key, (None, 0))
+        if token and not refresh and expiration > time.monotonic():
+            return token
+        url = url_join(self.base_url, 'api/auth')
+        try:
+            response = self.session.post(
+                url,
+                json={'email': self.username, 'password': self.password},
+                timeout=TIMEOUT,
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            raise SvcmgmtError(f"Unable to reach endpoint at {url}") from e
+        if response.status_code != 200:
+            raise SvcmgmtError(
+                f"Authentication failed with status code {response.status_code}"
+            )
+        _tokens[self._token_key] = (
+            response.text,
+            time.monotonic() + TOKEN_LIFETIME,
+        )
+        return response.text
+
+    def clear_token(self):
+        _tokens.pop(self._token_key, None)
+
+    def request(self, method, endpoint, **kwargs):
+        """Call the API, authenticating again once if the token is refused.
+
+        :param str method: HTTP method
+        :param str endpoint: path of the endpoint, e.g. ``api/account``
+        :return: the response, whatever its status code
+        :raise SvcmgmtError: if the API can't be reached
+        """
+        url = url_join(self.base_url, endpoint)
+        kwargs.setdefault('timeout', TIMEOUT)
+        for refresh in (False, True):
+            headers = {'x-auth-token': self.get_token(refresh=refresh)}
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as e:
+                raise SvcmgmtError(f"Unable to reach endpoint at {url}") from e
+            if response.status_code not in (401, 403):
+                break
+        return response
+
+    def list_accounts(self, page_size=500, max_workers=4):
+        """Fetch all the accounts, ``max_workers`` pages at a time.
+
+        The listing stops on a page shorter than ``page_size``, empty, or
+        only made of accounts already fetched, e.g. if the API ignores the
+        paging parameters and returns all the accounts on every page.
+
+        :param int page_size: number of accounts per page
+        :param int max_workers: number of pages fetched concurrently
+        :return: the accounts, as returned by the API
+        :rtype: list
+        :raise SvcmgmtError: if a page can't be fetched, or if there are
+          more than ``MAX_PAGES`` pages
+        """
+        # authenticate once before the concurrent requests
+        self.get_token()
+
+        def fetch(page):
+            response = self.request(
+                'GET', 'api/account', params={'page': page, 'limit': page_size}
+            )
+            if response.status_code != 200:
+                raise SvcmgmtError(
+                    f"Page {page} failed with status code {response.status_code}"
+                )
+            data = response.json()
+            return data.get('data', []) if isinstance(data, dict) else data
+
+        accounts = []
+        seen = set()
+        page = 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while page <= MAX_PAGES:
+                last_page = min(page + max_workers, MAX_PAGES + 1)
+                for page_accounts in executor.map(fetch, range(page, last_page)):
+                    new_accounts = [
+                        account for account in page_accounts
+                        if account.get('id') is None or account['id'] not in seen
+                    ]
+                    if not new_accounts:
+                        return accounts
+                    seen.update(account.get('id') for account in new_accounts)
+                    accounts += new_accounts
+                    if len(page_accounts) < page_size:
+                        return accounts
+                page = last_page
+        raise SvcmgmtError(f"More than {MAX_PAGES} pages of accounts")
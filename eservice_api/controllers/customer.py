@@ -3,6 +3,7 @@ from odoo import http
 from odoo.http import request
 from odoo.addons.api_auth.util.helper import validate_token
 from ..utils.main import get_eservice_default_company
+from ..utils.pagination import PAGE_PARAMS, read_page, stream_records
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -18,6 +19,20 @@ PARTNER_FIELDS = [
     "country_id",
 ]
 
+# Name of the partner field of each field of the list endpoints
+CUSTOMER_LIST_FIELDS = {
+    "name": "name",
+    "customer_id": "x_studio_partner_id",
+    "email": "email",
+    "phone": "phone",
+    "street": "street",
+    "city": "city",
+    "state_id": "state_id",
+    "country_id": "country_id",
+    "write_date": "write_date",
+}
+CUSTOMER_LIST_DEFAULT_FIELDS = ["name", "customer_id", "email", "phone"]
+
 
 class CustomerHome(http.Controller):
 
@@ -30,13 +45,28 @@ class CustomerHome(http.Controller):
         cors="*",
     )
     def get_customers_json(self):
-        """Get a list of partners on the system."""
+        """Get a list of partners on the system.
+
+        Sending any of `limit`, `cursor`, `updated_since` or `fields` returns
+        a page of customers instead of all of them: the next page is read by
+        sending the `next_cursor` of the page as `cursor`, with the same
+        parameters.
+        """
+        json_data = request.get_json_data() or {}
         domain = [("customer_rank", ">", 0)]
-        if (
-            customer_id := request.get_json_data()
-            and request.get_json_data().get("customer_id")
-        ):
+        if customer_id := json_data.get("customer_id"):
             domain += [("x_studio_partner_id", "=", customer_id)]
+        if any(json_data.get(param) for param in PAGE_PARAMS):
+            try:
+                return read_page(
+                    request.env["res.partner"].sudo(),
+                    domain,
+                    json_data,
+                    CUSTOMER_LIST_FIELDS,
+                    CUSTOMER_LIST_DEFAULT_FIELDS,
+                )
+            except ValueError as e:
+                return {"code": -32602, "error": "Invalid params", "message": str(e)}
         records = request.env["res.partner"].sudo().search(domain)
         response_data = [
             dict(
@@ -49,6 +79,43 @@ class CustomerHome(http.Controller):
         ]
         return response_data
 
+    @validate_token
+    @http.route(
+        "/fb_api/customers/stream",
+        auth="public",
+        methods=["GET"],
+        type="http",
+        csrf=False,
+        cors="*",
+    )
+    def stream_customers(self, updated_since=None, fields=None, **kwargs):
+        """Stream all the customers on the system as a JSON array.
+
+        Args:
+            updated_since (str): Only return the customers updated since this
+              date.
+            fields (str): Fields to return, separated by commas.
+
+        Returns:
+            Response: Streamed list of serialized customers.
+        """
+        try:
+            chunks = stream_records(
+                request.db,
+                "res.partner",
+                [("customer_rank", ">", 0)],
+                {"updated_since": updated_since, "fields": fields},
+                CUSTOMER_LIST_FIELDS,
+                CUSTOMER_LIST_DEFAULT_FIELDS,
+            )
+        except ValueError as e:
+            return request.make_json_response(
+                {"error": "Invalid params", "message": str(e)}, status=400
+            )
+        return request.make_response(
+            chunks, headers=[("Content-Type", "application/json")]
+        )
+
     @validate_token
     @http.route(
         "/fb_api/create_customers/json",
@@ -77,11 +144,65 @@ class CustomerHome(http.Controller):
         )
         return res
 
-    def _get_cleaned_customer_create_values(self, json_data={}):
+    @validate_token
+    @http.route(
+        "/fb_api/create_customers/batch/json",
+        auth="public",
+        type="json",
+        csrf=False,
+        cors="*",
+    )
+    def add_customers_batch_json(self):
+        """Create the customers of several documents on the system
+
+        Each document takes the values of `/fb_api/create_customers/json` and
+        an optional `idempotency_key`: a document sent again with the same key
+        returns the customer created the first time.
+        """
+        documents = request.get_json_data().get("documents", [])
+        return (
+            request.env["eservice.api.request"]
+            .sudo()
+            ._process(
+                "/fb_api/create_customers/batch/json",
+                documents,
+                self._create_batch_customers,
+            )
+        )
+
+    def _create_batch_customers(self, documents):
+        """Create the customers of the documents together"""
+        eservice_company_id = (
+            request.env["res.company"]
+            .sudo()
+            .browse(int(get_eservice_default_company(request._cr)))
+        )
+        vals_list = [
+            self._get_cleaned_customer_create_values(json_data, eservice_company_id)
+            for json_data in documents
+        ]
+        customers = (
+            request.env["res.partner"]
+            .sudo()
+            .with_company(eservice_company_id)
+            .create(vals_list)
+        )
+        res = []
+        for customer_data in customers.read(PARTNER_FIELDS):
+            customer_data["customer_id"] = customer_data.pop(
+                "x_studio_partner_id", None
+            )
+            res.append([customer_data])
+        return res
+
+    def _get_cleaned_customer_create_values(
+        self, json_data={}, eservice_company_id=None
+    ):
         """Clean up values coming from the other system"""
         cleaned_data = {}
-        eservice_company_id_int = get_eservice_default_company(request._cr)
-        eservice_company_id = request.env['res.company'].sudo().search([('id', '=', int(eservice_company_id_int))], limit=1)
+        if eservice_company_id is None:
+            eservice_company_id_int = get_eservice_default_company(request._cr)
+            eservice_company_id = request.env['res.company'].sudo().search([('id', '=', int(eservice_company_id_int))], limit=1)
         cleaned_data.setdefault("property_payment_term_id", eservice_company_id.payment_term_id.id)
         for field in json_data:
             if field in PARTNER_FIELDS:
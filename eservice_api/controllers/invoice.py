@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import copy
 import logging
 from dateutil.relativedelta import relativedelta
 from odoo import http, fields
@@ -137,38 +138,12 @@ class InvoiceHome(http.Controller):
         deferred_revenue_account_id = get_eservice_deferred_revenue_account_id(
             request._cr
         )
-        """The next block of code is used to manage multiple invoices. We use the total
-        invoice amount to determine if there are deferred invoices and how many they are.
-        """
-        try:
-            number_of_invoices = int(
-                # Get the sum of the total amount passed per line. This will tell if and how many
-                # deferred invoices there should be.
-                float(
-                    sum(
-                        [
-                            line["amount"]
-                            for line in request.get_json_data().get("order_lines")
-                        ]
-                    )
-                )
-                //
-                # Get the sum of the invoice lines using the unit price x quantity
-                sum(
-                    [
-                        request.env["product.product"]
-                        ._get_product_from_code(line.get("code"))
-                        .lst_price
-                        * line.get("quantity", 1)
-                        for line in request.get_json_data().get("order_lines")
-                    ]
-                )
-            )
-        except ZeroDivisionError:
-            number_of_invoices = NUMBER_OF_INVOICES
+        json_data = request.get_json_data()
+        lookups = self._get_batch_invoice_lookups([json_data])
+        number_of_invoices = self._get_number_of_invoices(json_data, lookups)
         invoices = AccountInvoice
         invoice_vals = []
-        cleaned_data = self._get_cleaned_invoice_create_values(request.get_json_data())
+        cleaned_data = self._get_cleaned_invoice_create_values(json_data, lookups)
         invoices += AccountInvoice.create(cleaned_data.copy())
         for _ in range(1, number_of_invoices):
             recognition_date = fields.Date.from_string(
@@ -185,9 +160,7 @@ class InvoiceHome(http.Controller):
         receivable_line_id = invoices.mapped("line_ids").filtered(
             lambda line: line.debit
         )
-        if receivable_account_id := request.get_json_data().get(
-            "receivable_account_id"
-        ):
+        if receivable_account_id := json_data.get("receivable_account_id"):
             receivable_line_id.update({"account_id": receivable_account_id})
         invoices.action_post()
         res = []
@@ -199,7 +172,182 @@ class InvoiceHome(http.Controller):
             res.append(invoice_dict)
         return res
 
-    def _get_cleaned_invoice_create_values(self, json_data={}):
+    @validate_token
+    @http.route(
+        "/fb_api/create_invoices/batch/json",
+        auth="public",
+        type="json",
+        csrf=False,
+        cors="*",
+    )
+    def add_invoices_batch_json(self):
+        """Create the invoices of several documents on the system
+
+        Each document takes the values of `/fb_api/create_invoices/json` and
+        an optional `idempotency_key`: a document sent again with the same key
+        returns the invoices created the first time.
+
+        Args:
+            None
+
+        Returns:
+            list: Result of each document, the `data` of a document being the
+              list of its serialized invoices.
+        """
+        documents = request.get_json_data().get("documents", [])
+        return (
+            request.env["eservice.api.request"]
+            .sudo()
+            ._process(
+                "/fb_api/create_invoices/batch/json",
+                documents,
+                self._create_batch_invoices,
+            )
+        )
+
+    def _create_batch_invoices(self, documents):
+        """Create and post the invoices of the documents together.
+
+        Args:
+            documents (list): Documents of a batch request.
+
+        Returns:
+            list: List of serialized invoices of each document.
+        """
+        AccountInvoice = request.env["account.move"].sudo()
+        lookups = self._get_batch_invoice_lookups(documents)
+        deferred_revenue_account_id = int(
+            get_eservice_deferred_revenue_account_id(request._cr) or 0
+        )
+        invoice_vals = []
+        document_indexes = []
+        for index, json_data in enumerate(documents):
+            number_of_invoices = self._get_number_of_invoices(json_data, lookups)
+            cleaned_data = self._get_cleaned_invoice_create_values(json_data, lookups)
+            invoice_vals.append(cleaned_data)
+            document_indexes.append(index)
+            for _ in range(1, number_of_invoices):
+                vals = copy.deepcopy(cleaned_data)
+                vals["is_deferred"] = True
+                vals["recognition_date"] = vals["invoice_date"] + relativedelta(
+                    months=1
+                )
+                for line in vals["invoice_line_ids"]:
+                    line[2].update({"account_id": deferred_revenue_account_id})
+                invoice_vals.append(vals)
+                document_indexes.append(index)
+        invoices = AccountInvoice.create(invoice_vals)
+        document_invoices = [AccountInvoice] * len(documents)
+        for index, invoice in zip(document_indexes, invoices):
+            document_invoices[index] += invoice
+        for json_data, doc_invoices in zip(documents, document_invoices):
+            if receivable_account_id := json_data.get("receivable_account_id"):
+                doc_invoices.line_ids.filtered(lambda line: line.debit).update(
+                    {"account_id": receivable_account_id}
+                )
+        invoices.action_post()
+        invoice_dicts = {
+            invoice_dict["id"]: invoice_dict
+            for invoice_dict in invoices.read(INVOICE_READ_FIELDS)
+        }
+        partner_dicts = {
+            partner_dict["id"]: partner_dict
+            for partner_dict in invoices.partner_id.read(
+                ["name", "email", "phone", "x_studio_partner_id"]
+            )
+        }
+        res = []
+        for doc_invoices in document_invoices:
+            doc_res = []
+            for invoice in doc_invoices:
+                invoice_dict = invoice_dicts[invoice.id]
+                invoice_dict["customer"] = partner_dicts.get(invoice.partner_id.id)
+                doc_res.append(invoice_dict)
+            res.append(doc_res)
+        return res
+
+    def _get_number_of_invoices(self, json_data, lookups):
+        """Get the number of invoices of a document.
+
+        The sum of the amounts of the lines over the sum of their prices
+        tells if and how many deferred invoices there should be.
+
+        Args:
+            json_data (dict): Dictonary of data coming from client system.
+            lookups (dict): Records fetched for the request, see
+              `_get_batch_invoice_lookups`.
+
+        Returns:
+            int: Number of invoices, the first one and the deferred ones.
+        """
+        order_lines = json_data.get("order_lines", [])
+        total_price = 0
+        for line in order_lines:
+            product = lookups["products"].get(line.get("code"))
+            total_price += (product.lst_price if product else 0) * line.get(
+                "quantity", 1
+            )
+        try:
+            return int(
+                float(sum(line["amount"] for line in order_lines)) // total_price
+            )
+        except ZeroDivisionError:
+            return NUMBER_OF_INVOICES
+
+    def _get_batch_invoice_lookups(self, documents):
+        """Fetch the records referenced by the documents of a batch.
+
+        Args:
+            documents (list): Documents of a batch request.
+
+        Returns:
+            dict: Records by their eService reference:
+                company_id (int): Database id of the eService company.
+                partners (dict): Customers by FOBID.
+                journals (dict): Sale journals by eService code.
+                products (dict): Products by eService code.
+                payment_term (recordset): Payment term of the invoices.
+        """
+        env = request.env(su=True)
+        eservice_company_id = int(get_eservice_default_company(request._cr))
+        customer_ids = {json_data["customer_id"] for json_data in documents}
+        journal_codes = {json_data["journal"] for json_data in documents}
+        product_codes = {
+            line.get("code")
+            for json_data in documents
+            for line in json_data.get("order_lines", [])
+            if line.get("code")
+        }
+        partners = env["res.partner"].search(
+            [("x_studio_partner_id", "in", list(customer_ids))]
+        )
+        Journal = env["account.journal"]
+        Product = env["product.product"]
+        journals = {
+            code: Journal.browse(
+                Journal._get_eservice_sale_journal_id(code, eservice_company_id)
+            )
+            for code in journal_codes
+        }
+        products = {
+            code: Product._get_product_from_code(code)[:1] for code in product_codes
+        }
+        return {
+            "company_id": eservice_company_id,
+            # The first customer matching a FOBID is kept, as in a single search
+            "partners": {
+                partner.x_studio_partner_id: partner for partner in partners[::-1]
+            },
+            "journals": {
+                code: journal for code, journal in journals.items() if journal
+            },
+            "products": {
+                code: product for code, product in products.items() if product
+            },
+            "payment_term": env["account.payment.term"].search([], limit=1),
+        }
+
+    def _get_cleaned_invoice_create_values(self, json_data={}, lookups=None):
         """Return cleaned json_data.
 
         The values passed into the function are not necessarily the values required to the create the invoice record and thus
@@ -225,6 +373,8 @@ class InvoiceHome(http.Controller):
                         unit_price (float): Unit price of product
                         source (str): Source sales order document coming from
                           eService
+            lookups (dict): Records fetched for a batch of documents, see
+              `_get_batch_invoice_lookups`.
 
         Returns:
             dict: Dictionary of cleaned data.
@@ -243,68 +393,47 @@ class InvoiceHome(http.Controller):
                     quantity (int): Quantity of product to add to the invoice.
                     price_unit: Unit price of product.
         """
+        if lookups is None:
+            lookups = self._get_batch_invoice_lookups([json_data])
         cleaned_data = {}
-        ResPartner = request.env["res.partner"].sudo()
         for field in json_data:
             if field in INVOICE_CREATE_FIELDS:
                 cleaned_data[field] = json_data[field]
-        eservice_company_id = get_eservice_default_company(request._cr)
         cleaned_data["invoice_date"] = fields.Date.from_string(json_data["date"])
-        cleaned_data.setdefault("company_id", int(eservice_company_id))
+        cleaned_data.setdefault("company_id", lookups["company_id"])
         cleaned_data["invoice_date_due"] = fields.Date.from_string(json_data["date"])
-        partner = ResPartner.search(
-            [("x_studio_partner_id", "=", json_data["customer_id"])],
-            limit=1,
-        )
-        journal = (
-            request.env["account.journal"]
-            .sudo()
-            .search(
-                [
-                    ("type", "=", "sale"),
-                    ("eservice_code", "=", json_data["journal"]),
-                    ("company_id", "=", int(eservice_company_id)),
-                ],
-                limit=1,
-            )
-        )
-        payment_term = request.env["account.payment.term"].sudo().search([], limit=1)
-        cleaned_data["partner_id"] = partner.id
-        cleaned_data["journal_id"] = journal and journal.id
-        cleaned_data["invoice_payment_term_id"] = payment_term.id
+        partner = lookups["partners"].get(json_data["customer_id"])
+        journal = lookups["journals"].get(json_data["journal"])
+        cleaned_data["partner_id"] = partner.id if partner else False
+        cleaned_data["journal_id"] = journal.id if journal else False
+        cleaned_data["invoice_payment_term_id"] = lookups["payment_term"].id
         cleaned_data["move_type"] = "out_invoice"
 
-        def _get_line_product_id(product_code=""):
-            """Get product details from line"""
-            product_id = request.env["product.product"]._get_product_from_code(
-                product_code
-            )
-            return product_id
-
-        cleaned_data["invoice_line_ids"] = [
-            (
-                0,
-                0,
-                {
-                    "product_id": _get_line_product_id(line.get("code"))
-                    and _get_line_product_id(line.get("code")).id,
-                    "quantity": line.get("quantity"),
-                    "account_id": line.get(
-                        "income_account_id",
-                        (
-                            request.env["product.product"]._get_product_income_account(
-                                line.get("code")
-                            )
-                            and request.env["product.product"]
-                            ._get_product_income_account(line.get("code"))
-                            .id
+        def _get_line_income_account_id(product):
+            """Get the income account of the product of a line"""
+            if not product:
+                return False
+            income_account = product.categ_id.property_account_income_categ_id
+            if product.property_account_income_id:
+                income_account = product.property_account_income_id
+            return income_account.id
+
+        cleaned_data["invoice_line_ids"] = []
+        for line in clean_up_invoice_lines(json_data.get("order_lines", [])):
+            product = lookups["products"].get(line.get("code"))
+            cleaned_data["invoice_line_ids"].append(
+                (
+                    0,
+                    0,
+                    {
+                        "product_id": product.id if product else False,
+                        "quantity": line.get("quantity"),
+                        "account_id": line.get(
+                            "income_account_id", _get_line_income_account_id(product)
                         ),
-                    ),
-                    "price_unit": _get_line_product_id(line.get("code"))
-                    and _get_line_product_id(line.get("code")).list_price,
-                    "discount": line.get("discount", 0),
-                },
+                        "price_unit": product.list_price if product else False,
+                        "discount": line.get("discount", 0),
+                    },
+                )
             )
-            for line in clean_up_invoice_lines(json_data.get("order_lines", []))
-        ]
         return cleaned_data
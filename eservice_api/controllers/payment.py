@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 import json
 from odoo import http, fields, _
+from odoo.exceptions import ValidationError
 from odoo.http import request, Response
 import logging
 from odoo.addons.api_auth.util.helper import validate_token
 from ..utils.main import get_eservice_default_company
+from ..utils.pagination import PAGE_PARAMS, read_page, stream_records
 
 _logger = logging.getLogger(__name__)
 
@@ -21,6 +23,11 @@ PAYMENT_CREATE_FIELDS = PAYMENT_READ_FIELDS + [
     "journal_id",
 ]
 
+# Fields of the list endpoints, named as the payment fields
+PAYMENT_LIST_FIELDS = {
+    field: field for field in PAYMENT_CREATE_FIELDS + ["state", "write_date"]
+}
+
 
 class PaymentHome(http.Controller):
 
@@ -33,8 +40,75 @@ class PaymentHome(http.Controller):
         cors="*",
     )
     def get_payments_json(self):
-        """Get a list of partners on the system."""
-        domain = [
+        """Get a list of partners on the system.
+
+        Sending any of `limit`, `cursor`, `updated_since` or `fields` returns
+        a page of payments instead of all of them: the next page is read by
+        sending the `next_cursor` of the page as `cursor`, with the same
+        parameters.
+        """
+        json_data = request.get_json_data() or {}
+        domain = self._get_payments_domain()
+        partner_id = json_data.get("customer_id")
+        invoice_number = json_data.get("invoice_number")
+        if partner_id:
+            domain += [("x_studio_partner_id", "=", partner_id)]
+        if invoice_number:
+            domain += [("ref", "=", invoice_number)]
+        if any(json_data.get(param) for param in PAGE_PARAMS):
+            try:
+                return read_page(
+                    request.env["account.payment"].sudo(),
+                    domain,
+                    json_data,
+                    PAYMENT_LIST_FIELDS,
+                    PAYMENT_READ_FIELDS,
+                )
+            except ValueError as e:
+                return {"code": -32602, "error": "Invalid params", "message": str(e)}
+        records = request.env["account.payment"].sudo().search(domain)
+        return records.read(PAYMENT_READ_FIELDS)
+
+    @validate_token
+    @http.route(
+        "/fb_api/payments/stream",
+        auth="public",
+        methods=["GET"],
+        type="http",
+        csrf=False,
+        cors="*",
+    )
+    def stream_payments(self, updated_since=None, fields=None, **kwargs):
+        """Stream all the payments on the system as a JSON array.
+
+        Args:
+            updated_since (str): Only return the payments updated since this
+              date.
+            fields (str): Fields to return, separated by commas.
+
+        Returns:
+            Response: Streamed list of serialized payments.
+        """
+        try:
+            chunks = stream_records(
+                request.db,
+                "account.payment",
+                self._get_payments_domain(),
+                {"updated_since": updated_since, "fields": fields},
+                PAYMENT_LIST_FIELDS,
+                PAYMENT_READ_FIELDS,
+            )
+        except ValueError as e:
+            return request.make_json_response(
+                {"error": "Invalid params", "message": str(e)}, status=400
+            )
+        return request.make_response(
+            chunks, headers=[("Content-Type", "application/json")]
+        )
+
+    def _get_payments_domain(self):
+        """Get the domain of the payments of the list endpoints"""
+        return [
             ("payment_type", "=", "inbound"),
             (
                 "company_id",
@@ -42,14 +116,6 @@ class PaymentHome(http.Controller):
                 get_eservice_default_company(request._cr),
             ),
         ]
-        partner_id = request.get_json_data().get("customer_id")
-        invoice_number = request.get_json_data().get("invoice_number")
-        if partner_id:
-            domain += [("x_studio_partner_id", "=", partner_id)]
-        if invoice_number:
-            domain += [("ref", "=", invoice_number)]
-        records = request.env["account.payment"].sudo().search(domain)
-        return records.read(PAYMENT_READ_FIELDS)
 
     @http.route(
         "/fb_api/create_payments/json",
@@ -89,23 +155,69 @@ class PaymentHome(http.Controller):
         )
         return payment.read(PAYMENT_READ_FIELDS)
 
-    def _get_cleaned_payment_create_values(self, json_data={}):
-        """Clean up values coming from the other system"""
-        cleaned_data = {}
-        partner = (
-            request.env["res.partner"]
+    @validate_token
+    @http.route(
+        "/fb_api/create_payments/batch/json",
+        auth="public",
+        type="json",
+        csrf=False,
+        cors="*",
+    )
+    def add_payments_batch_json(self):
+        """Create the payments of several documents on the system
+
+        Each document takes the values of `/fb_api/create_payments/json` and
+        an optional `idempotency_key`: a document sent again with the same key
+        returns the payment created the first time.
+        """
+        documents = request.get_json_data().get("documents", [])
+        return (
+            request.env["eservice.api.request"]
             .sudo()
-            .search(
-                [
-                    (
-                        "x_studio_partner_id",
-                        "=",
-                        json_data.get("customer_id"),
-                    )
-                ],
-                limit=1,
+            ._process(
+                "/fb_api/create_payments/batch/json",
+                documents,
+                self._create_batch_payments,
             )
         )
+
+    def _create_batch_payments(self, documents):
+        """Create the payments of the documents together"""
+        lookups = self._get_batch_payment_lookups(documents)
+        vals_list = []
+        for json_data in documents:
+            cleaned_data = self._get_cleaned_payment_create_values(json_data, lookups)
+            invalid_fields = [
+                field
+                for field in PAYMENT_CREATE_FIELDS
+                if not cleaned_data.get(field)
+            ]
+            if invalid_fields:
+                raise ValidationError(
+                    _("Invalid params: %s", ", ".join(invalid_fields))
+                )
+            vals_list.append(cleaned_data)
+        company = (
+            request.env["res.company"]
+            .sudo()
+            .browse([get_eservice_default_company(request._cr)])
+        )
+        payments = (
+            request.env["account.payment"]
+            .sudo()
+            .with_company(company)
+            .create(vals_list)
+        )
+        return [[payment_dict] for payment_dict in payments.read(PAYMENT_READ_FIELDS)]
+
+    def _get_batch_payment_lookups(self, documents):
+        """Fetch the customers and the bank journal of a batch of documents"""
+        customer_ids = {json_data.get("customer_id") for json_data in documents}
+        partners = (
+            request.env["res.partner"]
+            .sudo()
+            .search([("x_studio_partner_id", "in", list(customer_ids))])
+        )
         journal = (
             request.env["account.journal"]
             .sudo()
@@ -114,6 +226,23 @@ class PaymentHome(http.Controller):
                 limit=1,
             )
         )
+        return {
+            # The first customer matching a FOBID is kept
+            "partners": {
+                partner.x_studio_partner_id: partner for partner in partners[::-1]
+            },
+            "journal": journal,
+        }
+
+    def _get_cleaned_payment_create_values(self, json_data={}, lookups=None):
+        """Clean up values coming from the other system"""
+        if lookups is None:
+            lookups = self._get_batch_payment_lookups([json_data])
+        cleaned_data = {}
+        partner = lookups["partners"].get(
+            json_data.get("customer_id"), request.env["res.partner"]
+        )
+        journal = lookups["journal"]
 
         for field in json_data:
             if field in PAYMENT_CREATE_FIELDS:
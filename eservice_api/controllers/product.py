@@ -3,6 +3,7 @@ from odoo import http
 from odoo.http import request
 import logging
 from odoo.addons.api_auth.util.helper import validate_token
+from ..utils.pagination import read_page, stream_records
 
 _logger = logging.getLogger(__name__)
 
@@ -12,6 +13,15 @@ PRODUCT_READ_FIELDS = [
     "eservice_code",
 ]
 
+# Name of the product field of each field of the list endpoints
+PRODUCT_LIST_FIELDS = {
+    "name": "name",
+    "selling_price": "lst_price",
+    "eservice_code": "eservice_code",
+    "write_date": "write_date",
+}
+PRODUCT_LIST_DEFAULT_FIELDS = ["name", "selling_price", "eservice_code"]
+
 
 class ProductHome(http.Controller):
 
@@ -23,11 +33,43 @@ class ProductHome(http.Controller):
         type="http",
         csrf=False,
     )
-    def get_products(self, filter_is_eservice=False, limit=None):
-        """Return a list of eservice products on the system."""
+    def get_products(
+        self,
+        filter_is_eservice=False,
+        limit=None,
+        cursor=None,
+        updated_since=None,
+        fields=None,
+    ):
+        """Return a list of eservice products on the system.
+
+        Sending any of `cursor`, `updated_since` or `fields` returns a page of
+        `limit` products: the next page is read by sending the `next_cursor`
+        of the page as `cursor`, with the same parameters.
+        """
         domain = []
         if filter_is_eservice:
             domain = [("eservice_code", "!=", False)]
+        if cursor or updated_since or fields:
+            params = {
+                "limit": limit,
+                "cursor": cursor,
+                "updated_since": updated_since,
+                "fields": fields,
+            }
+            try:
+                page = read_page(
+                    request.env["product.product"].sudo(),
+                    domain,
+                    params,
+                    PRODUCT_LIST_FIELDS,
+                    PRODUCT_LIST_DEFAULT_FIELDS,
+                )
+            except ValueError as e:
+                return request.make_json_response(
+                    {"error": "Invalid params", "message": str(e)}, status=400
+                )
+            return request.make_json_response(page)
         limit = limit
         records = (
             request.env["product.product"]
@@ -46,3 +88,35 @@ class ProductHome(http.Controller):
             for prd in res
         ]
         return request.make_json_response(res)
+
+    @validate_token
+    @http.route(
+        "/fb_api/products/stream",
+        auth="public",
+        methods=["GET"],
+        type="http",
+        csrf=False,
+    )
+    def stream_products(
+        self, filter_is_eservice=False, updated_since=None, fields=None, **kwargs
+    ):
+        """Stream all the products on the system as a JSON array."""
+        domain = []
+        if filter_is_eservice:
+            domain = [("eservice_code", "!=", False)]
+        try:
+            chunks = stream_records(
+                request.db,
+                "product.product",
+                domain,
+                {"updated_since": updated_since, "fields": fields},
+                PRODUCT_LIST_FIELDS,
+                PRODUCT_LIST_DEFAULT_FIELDS,
+            )
+        except ValueError as e:
+            return request.make_json_response(
+                {"error": "Invalid params", "message": str(e)}, status=400
+            )
+        return request.make_response(
+            chunks, headers=[("Content-Type", "application/json")]
+        )
@@ -6,3 +6,6 @@ from . import account_move
 from . import res_config_settings
 from . import sale_order
 from . import res_company
+from . import res_partner
+from . import account_payment
+from . import eservice_api_request
@@ -1,4 +1,7 @@
-from odoo import models, fields
+from odoo import api, models, fields, tools
+
+# Fields changing which journal an eService code resolves to
+ESERVICE_CODE_FIELDS = {"eservice_code", "type", "company_id", "active"}
 
 
 class AccountJournal(models.Model):
@@ -6,3 +9,48 @@ class AccountJournal(models.Model):
 
     eservice_code = fields.Char("eService Reference")
     deferred_revenue_reversal = fields.Boolean("Deferred Reversal")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        journals = super().create(vals_list)
+        if any(vals.get("eservice_code") for vals in vals_list):
+            self.env.registry.clear_cache()
+        return journals
+
+    def write(self, vals):
+        res = super().write(vals)
+        if ESERVICE_CODE_FIELDS & set(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        has_code = any(self.mapped("eservice_code"))
+        res = super().unlink()
+        if has_code:
+            self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache("code", "company_id")
+    def _get_eservice_sale_journal_id(self, code, company_id):
+        """Get the id of the sale journal of an eService code in a company,
+        cached until a journal changes code.
+
+        :param str code: eService code of the journal
+        :param int company_id: id of the company of the journal
+        :return: id of the matching journal, False if none
+        :rtype: int
+        """
+        journal = (
+            self.env["account.journal"]
+            .sudo()
+            .search(
+                [
+                    ("type", "=", "sale"),
+                    ("eservice_code", "=", code),
+                    ("company_id", "=", company_id),
+                ],
+                limit=1,
+            )
+        )
+        return journal.id
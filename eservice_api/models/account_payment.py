@@ -0,0 +1,15 @@
+from odoo import models
+from odoo.tools.sql import create_index
+
+
+class AccountPayment(models.Model):
+    _inherit = "account.payment"
+
+    def init(self):
+        # Keyset pagination of the payments updated since a date
+        create_index(
+            self._cr,
+            "account_payment_write_date_id_index",
+            self._table,
+            ["write_date", "id"],
+        )
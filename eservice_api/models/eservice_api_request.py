@@ -0,0 +1,178 @@
+import json
+import logging
+from datetime import timedelta
+
+from odoo import _, api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Number of days an idempotency key is remembered
+IDEMPOTENCY_KEY_DAYS = 30
+
+
+class EserviceApiRequest(models.Model):
+    """Result of a document sent to a batch endpoint with an idempotency key.
+
+    The key is claimed before the document is processed and its result saved
+    in the same transaction, so that a batch sent again, or sent twice at the
+    same time, doesn't create the document twice. The keys of the documents
+    that failed are released, to be retried.
+    """
+
+    _name = "eservice.api.request"
+    _description = "eService API Request"
+
+    endpoint = fields.Char(required=True, readonly=True)
+    idempotency_key = fields.Char(required=True, readonly=True)
+    response = fields.Json(readonly=True)
+
+    _sql_constraints = [
+        (
+            "endpoint_idempotency_key_uniq",
+            "unique(endpoint, idempotency_key)",
+            "The idempotency key was already used on this endpoint.",
+        ),
+    ]
+
+    @api.model
+    def _claim(self, endpoint, keys):
+        """Claim the idempotency keys not used yet on the endpoint.
+
+        A key being claimed by a concurrent request is waited for.
+
+        Args:
+            endpoint (str): Route of the batch endpoint.
+            keys (set): Idempotency keys of the documents of the batch.
+
+        Returns:
+            dict: Saved response of the keys already used, by key.
+        """
+        if not keys:
+            return {}
+        self.env.cr.execute(
+            """
+            INSERT INTO eservice_api_request (
+                endpoint, idempotency_key, create_uid, create_date,
+                write_uid, write_date
+            )
+            SELECT %(endpoint)s, key, %(uid)s, now() at time zone 'UTC',
+                %(uid)s, now() at time zone 'UTC'
+            FROM unnest(%(keys)s::varchar[]) AS key
+            ON CONFLICT (endpoint, idempotency_key) DO NOTHING
+            RETURNING idempotency_key
+            """,
+            {"endpoint": endpoint, "uid": self.env.uid, "keys": list(keys)},
+        )
+        used_keys = keys - {key for [key] in self.env.cr.fetchall()}
+        if not used_keys:
+            return {}
+        self.env.cr.execute(
+            """
+            SELECT idempotency_key, response FROM eservice_api_request
+            WHERE endpoint = %s AND idempotency_key = ANY(%s)
+            """,
+            [endpoint, list(used_keys)],
+        )
+        return {key: response or {} for key, response in self.env.cr.fetchall()}
+
+    @api.model
+    def _process(self, endpoint, documents, create_records):
+        """Process the documents of a batch request.
+
+        The documents are processed together with ``create_records`` and, if
+        that fails, one by one so that the error of a document doesn't fail
+        the others.
+
+        Args:
+            endpoint (str): Route of the batch endpoint.
+            documents (list): Documents sent, each with an optional
+              ``idempotency_key``.
+            create_records (function): Function creating the records of a
+              list of documents and returning the serialized result of each.
+
+        Returns:
+            list: Result of each document, in order:
+                index (int): Position of the document in the batch.
+                idempotency_key (str): Idempotency key of the document.
+                status (str): ``created``, ``duplicate`` if the key was
+                  already used, or ``error``.
+                data: Serialized result of the document, if not in error.
+                error (str): Error message, if in error.
+        """
+        keys = [document.get("idempotency_key") or None for document in documents]
+        saved = self._claim(endpoint, {key for key in keys if key})
+        results = [None] * len(documents)
+        pending = []
+        seen = set()
+        for index, key in enumerate(keys):
+            if key in saved:
+                results[index] = dict(saved[key], status="duplicate")
+            elif key in seen:
+                results[index] = {
+                    "status": "error",
+                    "error": _("The idempotency key is repeated in the batch."),
+                }
+            else:
+                if key:
+                    seen.add(key)
+                pending.append(index)
+        if pending:
+            try:
+                with self.env.cr.savepoint():
+                    data = create_records([documents[index] for index in pending])
+                for index, values in zip(pending, data):
+                    results[index] = {"status": "created", "data": values}
+            except Exception:
+                _logger.info(
+                    "Batch on %s failed, processing its documents one by one",
+                    endpoint,
+                    exc_info=True,
+                )
+                for index in pending:
+                    try:
+                        with self.env.cr.savepoint():
+                            [values] = create_records([documents[index]])
+                    except Exception as e:
+                        results[index] = {"status": "error", "error": str(e)}
+                    else:
+                        results[index] = {"status": "created", "data": values}
+        failed_keys = []
+        for index in pending:
+            # Dates are saved as they are sent back
+            results[index] = json.loads(json.dumps(results[index], default=str))
+            if not keys[index]:
+                continue
+            if results[index]["status"] == "error":
+                failed_keys.append(keys[index])
+                continue
+            self.env.cr.execute(
+                """
+                UPDATE eservice_api_request SET response = %s
+                WHERE endpoint = %s AND idempotency_key = %s
+                """,
+                [json.dumps(results[index]), endpoint, keys[index]],
+            )
+        if failed_keys:
+            self.env.cr.execute(
+                """
+                DELETE FROM eservice_api_request
+                WHERE endpoint = %s AND idempotency_key = ANY(%s)
+                """,
+                [endpoint, failed_keys],
+            )
+        return [
+            dict(result, index=index, idempotency_key=key)
+            for index, (result, key) in enumerate(zip(results, keys))
+        ]
+
+    @api.autovacuum
+    def _gc_requests(self):
+        self.search(
+            [
+                (
+                    "create_date",
+                    "<",
+                    fields.Datetime.now() - timedelta(days=IDEMPOTENCY_KEY_DAYS),
+                )
+            ]
+        ).unlink()
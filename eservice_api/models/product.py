@@ -1,4 +1,9 @@
-from odoo import models, fields
+from odoo import api, models, fields, tools
+from odoo.tools import SQL
+from odoo.tools.sql import create_index
+
+# Fields changing which products an eService code resolves to
+ESERVICE_CODE_FIELDS = {"eservice_code", "active", "product_tmpl_id"}
 
 
 class ProductTemplate(models.Model):
@@ -7,11 +12,91 @@ class ProductTemplate(models.Model):
 
     eservice_code = fields.Char("eService Reference")
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        templates = super().create(vals_list)
+        if any(vals.get("eservice_code") for vals in vals_list):
+            self.env.registry.clear_cache()
+        return templates
+
+    def write(self, vals):
+        res = super().write(vals)
+        if ESERVICE_CODE_FIELDS & set(vals):
+            self.env.registry.clear_cache()
+        if vals and self.ids:
+            self._touch_variants()
+        return res
+
+    def _touch_variants(self):
+        """Update the date of the variants of the templates, for the products
+        updated since a date to include the fields of their template."""
+        Product = self.env["product.product"]
+        Product.flush_model(["write_date", "write_uid"])
+        self.env.cr.execute(
+            SQL(
+                """UPDATE product_product SET write_date = %s, write_uid = %s
+                WHERE product_tmpl_id IN %s""",
+                self.env.cr.now(),
+                self.env.uid,
+                tuple(self.ids),
+            )
+        )
+        Product.invalidate_model(["write_date", "write_uid"])
+
+    def unlink(self):
+        has_code = any(self.mapped("eservice_code"))
+        res = super().unlink()
+        if has_code:
+            self.env.registry.clear_cache()
+        return res
+
 
 class Product(models.Model):
 
     _inherit = "product.product"
 
+    def init(self):
+        # Keyset pagination of the products updated since a date
+        create_index(
+            self._cr,
+            "product_product_write_date_id_index",
+            self._table,
+            ["write_date", "id"],
+        )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        products = super().create(vals_list)
+        if any(products.mapped("eservice_code")):
+            self.env.registry.clear_cache()
+        return products
+
+    def write(self, vals):
+        res = super().write(vals)
+        if ESERVICE_CODE_FIELDS & set(vals):
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        has_code = any(self.mapped("eservice_code"))
+        res = super().unlink()
+        if has_code:
+            self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache("code")
+    def _get_product_ids_from_code(self, code):
+        """Get the ids of the products of a code, cached until a product
+        changes code.
+
+        :param str code: code to use to search for product
+        :return: ids of the matching products
+        :rtype: tuple
+        """
+        domain = [("eservice_code", "=", code)]
+        return tuple(self.env["product.product"].sudo().search(domain).ids)
+
     def _get_product_from_code(self, code):
         """Get product from code.
 
@@ -22,8 +107,7 @@ class Product(models.Model):
         product = Product = self.env["product.product"].sudo()
         if not code:
             return product
-        domain = [("eservice_code", "=", code)]
-        product = Product.search(domain)
+        product = Product.browse(self._get_product_ids_from_code(code))
         return product
 
     def _get_product_income_account(self, code):
@@ -33,11 +117,10 @@ class Product(models.Model):
         :return: An matching product record
         :rtype: recordset of `product.product`
         """
-        product = Product = self.env["product.product"].sudo()
+        product = self.env["product.product"].sudo()
         if not code:
             return product
-        domain = [("eservice_code", "=", code)]
-        product = Product.search(domain)
+        product = self._get_product_from_code(code)
         income_account = product.categ_id.property_account_income_categ_id
         if product.property_account_income_id:
             income_account = product.property_account_income_id
@@ -1,7 +1,6 @@
 import logging
 from odoo import models
-
-from ..constants import PARTNER_FIELDS, get_cleaned_create_values
+from odoo.tools.sql import create_index
 
 _logger = logging.getLogger(__name__)
 
@@ -9,6 +8,15 @@ _logger = logging.getLogger(__name__)
 class ResPartner(models.Model):
     _inherit = "res.partner"
 
+    def init(self):
+        # Keyset pagination of the customers updated since a date
+        create_index(
+            self._cr,
+            "res_partner_write_date_id_index",
+            self._table,
+            ["write_date", "id"],
+        )
+
     # def _find_or_create_partner(self, partner_id=""):
     #     """ Fetch or Create Partner Record
 
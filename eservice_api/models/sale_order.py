@@ -1,7 +1,7 @@
 from odoo import models, fields, api
+from ..utils.main import get_eservice_config_id
 
 
-RES_CONFIG_SETTINGS = "res.config.settings"
 IR_PROPERTY = "ir.property"
 
 
@@ -13,15 +13,11 @@ class MakeDeferred(models.AbstractModel):
 
     def _get_deferred_income_account_id(self):
         """Get deferred income account."""
-        rcs = self.env[RES_CONFIG_SETTINGS].sudo().get_values()
-        deferred_revenue_account_id = rcs.get("deferred_revenue_account_id", False)
-        return deferred_revenue_account_id
+        return get_eservice_config_id(self._cr, "deferred_revenue_account_id") or False
 
     def _get_advance_account_id(self):
         """Get advance account."""
-        rcs = self.env[RES_CONFIG_SETTINGS].sudo().get_values()
-        advance_account_id = rcs.get("advance_account_id", False)
-        return advance_account_id
+        return get_eservice_config_id(self._cr, "advance_account_id") or False
 
     def _get_receivable_account_id(self):
         """Get receivable account."""
@@ -0,0 +1,107 @@
+import json
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase, tagged
+
+from ..utils import pagination
+
+
+@tagged("post_install", "-at_install")
+class TestPagination(TransactionCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.partners = cls.env["res.partner"].create(
+            [{"name": f"Pagination Partner {index}"} for index in range(5)]
+        )
+        cls.domain = [("id", "in", cls.partners.ids)]
+        cls.field_map = {"name": "name"}
+
+    def _read_all_pages(self, params):
+        names = []
+        cursor = None
+        pages = 0
+        while True:
+            page = pagination.read_page(
+                self.env["res.partner"],
+                self.domain,
+                dict(params, cursor=cursor, limit=2),
+                self.field_map,
+                ["name"],
+            )
+            pages += 1
+            names += [values["name"] for values in page["records"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                return names, pages
+
+    def test_cursor(self):
+        write_date = self.partners[0].write_date.replace(microsecond=123456)
+        cursor = pagination.encode_cursor(self.partners[0].id, write_date)
+        self.assertEqual(
+            pagination.decode_cursor(cursor), (self.partners[0].id, write_date)
+        )
+        cursor = pagination.encode_cursor(self.partners[0].id, None)
+        self.assertEqual(pagination.decode_cursor(cursor), (self.partners[0].id, None))
+        with self.assertRaises(ValueError):
+            pagination.decode_cursor("invalid")
+
+    def test_read_pages(self):
+        names, pages = self._read_all_pages({})
+        self.assertEqual(names, self.partners.mapped("name"))
+        self.assertEqual(pages, 3)
+        # the partners share the update date of the transaction
+        names, pages = self._read_all_pages({"updated_since": "2000-01-01 00:00:00"})
+        self.assertEqual(names, self.partners.mapped("name"))
+        self.assertEqual(pages, 3)
+
+    def test_read_pages_template_update(self):
+        product = self.env["product.product"].create({"name": "Pagination Product"})
+        self.env.flush_all()
+        self.env.cr.execute(
+            "UPDATE product_product SET write_date = '2000-01-01' WHERE id = %s",
+            [product.id],
+        )
+        product.invalidate_recordset(["write_date"])
+        updated_since = "2001-01-01 00:00:00"
+        domain = [("id", "=", product.id)]
+        page = pagination.read_page(
+            self.env["product.product"],
+            domain,
+            {"updated_since": updated_since},
+            self.field_map,
+            ["name"],
+        )
+        self.assertFalse(page["records"])
+        # the name is written on the template
+        product.product_tmpl_id.name = "Renamed Pagination Product"
+        page = pagination.read_page(
+            self.env["product.product"],
+            domain,
+            {"updated_since": updated_since},
+            self.field_map,
+            ["name"],
+        )
+        self.assertEqual(
+            [values["name"] for values in page["records"]],
+            ["Renamed Pagination Product"],
+        )
+
+    def test_stream_records(self):
+        self.env.flush_all()
+        # the stream reads the records with a cursor of its own
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        with patch.object(pagination, "STREAM_BATCH_SIZE", 2):
+            chunks = pagination.stream_records(
+                self.env.cr.dbname,
+                "res.partner",
+                self.domain,
+                {},
+                self.field_map,
+                ["name"],
+            )
+            records = json.loads(b"".join(chunks))
+        self.assertEqual(
+            [values["name"] for values in records], self.partners.mapped("name")
+        )
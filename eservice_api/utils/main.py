@@ -1,21 +1,30 @@
 from odoo import api, SUPERUSER_ID
 
 
+def get_eservice_config_id(cr, name):
+    """Get the id of a record set in the eService settings.
+
+    The settings are read from their config parameter, cached until it is
+    written, rather than from ``res.config.settings.get_values()`` which
+    computes every setting of every module.
+
+    Args:
+        cr: Database cursor.
+        name (str): Name of the setting, e.g. `eservice_company_id`.
+
+    Returns:
+        int: Database id of the record, 0 if not set.
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    value = env["ir.config_parameter"].get_param(f"eservice_api.{name}")
+    return int(value or 0)
+
+
 def get_eservice_default_company(cr):
     env = api.Environment(cr, SUPERUSER_ID, {})
-    default_company = (
-        env["res.config.settings"]
-        .get_values()
-        .get("eservice_company_id", 0)
-    )
+    default_company = get_eservice_config_id(cr, "eservice_company_id")
     return default_company or int(env.company)
 
 
 def get_eservice_deferred_revenue_account_id(cr):
-    env = api.Environment(cr, SUPERUSER_ID, {})
-    config_settings = (
-        env["res.config.settings"]
-        .get_values()
-        .get("deferred_revenue_account_id", 0)
-    )
-    return config_settings
+    return get_eservice_config_id(cr, "deferred_revenue_account_id")
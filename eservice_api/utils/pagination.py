@@ -0,0 +1,220 @@
+import base64
+import json
+from datetime import datetime
+
+from odoo import api, fields, SUPERUSER_ID
+from odoo.modules.registry import Registry
+from odoo.tools import SQL, json_default
+
+# Parameters of the list endpoints turning their result into a page
+PAGE_PARAMS = ("limit", "cursor", "updated_since", "fields")
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+# Number of records read at once by the streamed endpoints
+STREAM_BATCH_SIZE = 1000
+
+
+def encode_cursor(record_id, write_date):
+    """Encode the position of the last record of a page.
+
+    The update date keeps its microseconds, for the next page to start
+    exactly after the record.
+    """
+    position = json.dumps([record_id, write_date and write_date.isoformat()])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into the id and the update date of a record.
+
+    Raises:
+        ValueError: If the cursor is invalid.
+    """
+    try:
+        record_id, write_date = json.loads(base64.urlsafe_b64decode(cursor))
+        return int(record_id), write_date and datetime.fromisoformat(write_date)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def get_projection(requested_fields, field_map, default_fields):
+    """Get the fields to read for the fields requested by the client.
+
+    Args:
+        requested_fields (list|str): Names of the fields, as a list or
+          separated by commas.
+        field_map (dict): Name of the model field of each API field.
+        default_fields (list): API fields returned when none is requested.
+
+    Returns:
+        dict: Name of the model field of each requested API field.
+
+    Raises:
+        ValueError: If a requested field is unknown.
+    """
+    if isinstance(requested_fields, str):
+        requested_fields = [name.strip() for name in requested_fields.split(",")]
+    requested_fields = [name for name in requested_fields or [] if name]
+    unknown_fields = set(requested_fields) - set(field_map)
+    if unknown_fields:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown_fields))}")
+    return {name: field_map[name] for name in requested_fields or default_fields}
+
+
+def search_page(model, domain, limit, cursor=None, updated_since=None):
+    """Search a page of records after a cursor.
+
+    The records are ordered by id or, to sync the records updated since a
+    date, by update date and id, so that a page starts where the previous
+    one stopped however many records were created or updated since.
+
+    Args:
+        model: Model to search.
+        domain (list): Domain of the records.
+        limit (int): Number of records of the page.
+        cursor (str): Cursor returned with the previous page.
+        updated_since (datetime): Date since which the records were updated.
+
+    Returns:
+        tuple: The records of the page, and the cursor of the next page or
+          None if this page is the last one.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    records, next_position = _search_page(
+        model, domain, limit, position, updated_since
+    )
+    next_cursor = encode_cursor(*next_position) if next_position else None
+    return records, next_cursor
+
+
+def _search_page(model, domain, limit, position=None, updated_since=None):
+    """Search a page of records after a position, see ``search_page``.
+
+    Returns:
+        tuple: The records of the page, and the position (id, write_date)
+          of its last record or None if this page is the last one.
+    """
+    query = model._search(domain)
+    id_column = SQL.identifier(query.table, "id")
+    write_date_column = SQL.identifier(query.table, "write_date")
+    if updated_since:
+        query.add_where(SQL("%s >= %s", write_date_column, updated_since))
+        if position:
+            query.add_where(
+                SQL(
+                    "(%s, %s) > (%s, %s)",
+                    write_date_column,
+                    id_column,
+                    position[1],
+                    position[0],
+                )
+            )
+        query.order = SQL("%s, %s", write_date_column, id_column)
+    else:
+        if position:
+            query.add_where(SQL("%s > %s", id_column, position[0]))
+        query.order = id_column
+    query.limit = limit
+    rows = model.env.execute_query(query.select(id_column, write_date_column))
+    records = model.browse([record_id for record_id, _write_date in rows])
+    next_position = None
+    if rows and len(rows) == limit:
+        next_position = rows[-1]
+    return records, next_position
+
+
+def read_projection(records, projection):
+    """Serialize records with the fields of a projection."""
+    return [
+        dict(
+            id=values["id"],
+            **{name: values[field] for name, field in projection.items()},
+        )
+        for values in records.read(list(set(projection.values())))
+    ]
+
+
+def read_page(model, domain, params, field_map, default_fields):
+    """Read a page of records with the parameters of a list endpoint.
+
+    Args:
+        model: Model to read.
+        domain (list): Domain of the records.
+        params (dict): Parameters sent by the client:
+            limit (int): Number of records of the page.
+            cursor (str): Cursor returned with the previous page.
+            updated_since (str): Date since which the records were updated.
+            fields (list|str): Fields to return.
+        field_map (dict): Name of the model field of each API field.
+        default_fields (list): API fields returned when none is requested.
+
+    Returns:
+        dict: The page:
+            records (list): Serialized records.
+            next_cursor (str): Cursor of the next page, None on the last page.
+
+    Raises:
+        ValueError: If a parameter is invalid.
+    """
+    projection = get_projection(params.get("fields"), field_map, default_fields)
+    limit = min(int(params.get("limit") or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+    if limit <= 0:
+        raise ValueError("The limit must be positive")
+    updated_since = fields.Datetime.to_datetime(params.get("updated_since"))
+    records, next_cursor = search_page(
+        model, domain, limit, params.get("cursor"), updated_since
+    )
+    return {
+        "records": read_projection(records, projection),
+        "next_cursor": next_cursor,
+    }
+
+
+def stream_records(dbname, model_name, domain, params, field_map, default_fields):
+    """Stream all the records of a list endpoint as a JSON array.
+
+    The records are read by batches in a cursor of their own, the response
+    being written after the cursor of the request is closed.
+
+    Args:
+        dbname (str): Name of the database.
+        model_name (str): Name of the model to read.
+        domain (list): Domain of the records.
+        params (dict): Parameters sent by the client:
+            updated_since (str): Date since which the records were updated.
+            fields (list|str): Fields to return.
+        field_map (dict): Name of the model field of each API field.
+        default_fields (list): API fields returned when none is requested.
+
+    Returns:
+        generator: Chunks of the JSON array.
+
+    Raises:
+        ValueError: If a parameter is invalid.
+    """
+    projection = get_projection(params.get("fields"), field_map, default_fields)
+    updated_since = fields.Datetime.to_datetime(params.get("updated_since"))
+
+    def generate():
+        yield b"["
+        position = None
+        separator = b""
+        with Registry(dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            while True:
+                records, position = _search_page(
+                    env[model_name],
+                    domain,
+                    STREAM_BATCH_SIZE,
+                    position,
+                    updated_since,
+                )
+                for values in read_projection(records, projection):
+                    yield separator + json.dumps(values, default=json_default).encode()
+                    separator = b","
+                env.invalidate_all()
+                if not position:
+                    break
+        yield b"]"
+
+    return generate()
@@ -33,18 +33,6 @@ class ContractContractInheritedExtended(models.Model):
             else:
                 record.partner_full_address = False
 
-    def _prepare_recurring_invoices_values(self, date_ref=False):
-        """Override to replace name with address during initial creation"""
-        values_list = super()._prepare_recurring_invoices_values(date_ref)
-        
-        for values in values_list:
-            if values.get('invoice_line_ids') and self.partner_full_address:
-                for line_command in values['invoice_line_ids']:
-                    if line_command[0] == 0:  # creation command
-                        line_command[2]['name'] = self.partner_full_address
-        
-        return values_list
-
 class ContractLineExtended(models.Model):
     _inherit = 'contract.line'
 
@@ -4,8 +4,10 @@
 
 import json
 import logging
+import os
 
 from werkzeug.urls import url_decode
+from werkzeug.wsgi import wrap_file
 
 from odoo.http import (
     content_disposition,
@@ -36,18 +38,27 @@ class ReportController(ReportController):
             if data.get("context"):
                 data["context"] = json.loads(data["context"])
                 context.update(data["context"])
-            xlsx = report.with_context(**context)._render_xlsx(
+            xlsx = report.with_context(**context)._render_xlsx_file(
                 reportname, docids, data=data
             )[0]
+            xlsx.seek(0, os.SEEK_END)
+            xlsx_size = xlsx.tell()
+            xlsx.seek(0)
             xlsxhttpheaders = [
                 (
                     "Content-Type",
                     "application/vnd.openxmlformats-"
                     "officedocument.spreadsheetml.sheet",
                 ),
-                ("Content-Length", len(xlsx)),
+                ("Content-Length", xlsx_size),
             ]
-            return request.make_response(xlsx, headers=xlsxhttpheaders)
+            # Stream the file by chunks, it is closed with the response
+            response = request.make_response(
+                wrap_file(request.httprequest.environ, xlsx),
+                headers=xlsxhttpheaders,
+            )
+            response.direct_passthrough = True
+            return response
         return super().report_routes(reportname, docids, converter, **data)
 
     @route()
@@ -2,6 +2,7 @@
 # License AGPL-3.0 or later (https://www.gnu.org/licenses/agpl.html).
 
 import logging
+from io import BytesIO
 
 from odoo import api, exceptions, fields, models
 from odoo.tools.safe_eval import safe_eval, time
@@ -30,6 +31,22 @@ class ReportAction(models.Model):
             report_sudo.save_xlsx_report_attachment(docids, ret[0])
         return ret
 
+    @api.model
+    def _render_xlsx_file(self, report_ref, docids, data):
+        """Render the report like ``_render_xlsx`` but return an open file
+        object instead of bytes. The workbook is written to a temporary file,
+        unless the report is saved as an attachment, which needs its bytes."""
+        report_sudo = self._get_report(report_ref)
+        if report_sudo.attachment:
+            content, report_type = self._render_xlsx(report_ref, docids, data)
+            return BytesIO(content), report_type
+        report_model = self.env[f"report.{report_sudo.report_name}"]
+        return (
+            report_model.with_context(active_model=report_sudo.model)
+            .sudo(False)
+            .create_xlsx_report_file(docids, data)
+        )
+
     @api.model
     def _get_report_from_name(self, report_name):
         res = super()._get_report_from_name(report_name)
@@ -3,6 +3,7 @@
 
 import logging
 import re
+import tempfile
 from io import BytesIO
 
 from odoo import models
@@ -99,13 +100,32 @@ class ReportXlsxAbstract(models.AbstractModel):
         return f"{f'{s_before}'}#,##0.{'0' * currency.decimal_places}{f'{s_after}'}"
 
     def create_xlsx_report(self, docids, data):
-        objs = self._get_objs_for_report(docids, data)
         file_data = BytesIO()
+        self._write_xlsx_report(file_data, docids, data)
+        file_data.seek(0)
+        return file_data.read(), "xlsx"
+
+    def create_xlsx_report_file(self, docids, data):
+        """
+        Same as ``create_xlsx_report`` but the document is written to an
+        anonymous temporary file, returned open and rewound, so that it is
+        never held in memory. The caller must close it.
+        :return: A tuple (file object, "xlsx")
+        """
+        file_data = tempfile.TemporaryFile()
+        try:
+            self._write_xlsx_report(file_data, docids, data)
+        except Exception:
+            file_data.close()
+            raise
+        file_data.seek(0)
+        return file_data, "xlsx"
+
+    def _write_xlsx_report(self, file_data, docids, data):
+        objs = self._get_objs_for_report(docids, data)
         workbook = xlsxwriter.Workbook(file_data, self.get_workbook_options())
         self.generate_xlsx_report(workbook, data, objs)
         workbook.close()
-        file_data.seek(0)
-        return file_data.read(), "xlsx"
 
     def get_workbook_options(self):
         """
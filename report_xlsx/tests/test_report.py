@@ -32,6 +32,16 @@ class TestReport(common.TransactionCase):
         sheet = wb.sheet_by_index(0)
         self.assertEqual(sheet.cell(0, 0).value, self.docs.name)
 
+    def test_report_file(self):
+        xlsx, report_type = self.report_object._render_xlsx_file(
+            self.report_name, self.docs.ids, {}
+        )
+        self.assertEqual(report_type, "xlsx")
+        with xlsx:
+            wb = open_workbook(file_contents=xlsx.read())
+        sheet = wb.sheet_by_index(0)
+        self.assertEqual(sheet.cell(0, 0).value, self.docs.name)
+
     def test_save_attachment(self):
         self.report.attachment = 'object.name + ".xlsx"'
         self.report_object._render(self.report_name, self.docs.ids, {})